@@ -1,23 +1,54 @@
 #!/usr/bin/env python3
-from flask import request, make_response, session, redirect, jsonify
+import click
+from flask import Blueprint, Flask, Response, request, make_response, session, redirect, jsonify
+from flask.cli import ScriptInfo
 import json
-from flask_restful import Resource
+from flask_cors import CORS
+from flask_restful import Api, Resource
 from sqlalchemy.exc import IntegrityError
-from config import app, db, api
-from datetime import datetime, timedelta, timezone
-from models import Student, Teacher, Lesson, Enrollment, Feedback, Payment, LessonCreditHistory
-import stripe
+from sqlalchemy.orm import selectinload
+from config import db, bcrypt
+from datetime import date, datetime, timedelta, timezone
+from models import (Student, Teacher, Lesson, Enrollment, Feedback, Payment, LessonCreditHistory,
+                    ArchivedLesson, ArchivedEnrollment, ArchivedFeedback)
+import availability
+import batch
+import gateway
+import events
+import metrics
+import nplusone
+import readmodels
+from dashboard import teacher_dashboard, PERIOD_FORMATS
+from reconcile import reconcile_command
+from rollups import rollups_cli, revenue_report
+from search import search_lessons
+from inbox import teacher_inbox
+from roster import teacher_roster, SORTS as ROSTER_SORTS
+from recommendations import recommendations_cli, recommended_lessons
+from calendars import token_for, revoke_token, owner_of, calendar_feed
+import jobs
+from jobs import jobs_cli
+from archive import archive_cli
+from sync import changes_since, parse_cursor, DEFAULT_LIMIT as SYNC_LIMIT, MAX_LIMIT as SYNC_MAX_LIMIT
+from pagination import page_args, paginated
+from grading import lock_lesson, update_enrollments, MAX_UPDATES as GRADING_MAX_UPDATES
+from uow import unit_of_work
 import os
-from dotenv import load_dotenv, find_dotenv
+import weakref
 from decimal import Decimal
 
-load_dotenv(find_dotenv())
 credit_price = os.getenv('PRICE')
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-stripe.api_version = "2022-11-15"
+api = Api()
+cors = CORS()
+views = Blueprint('views', __name__)
+
+
+def include_archived():
+    return request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
 
 
 class Signup(Resource):
+    @unit_of_work
     def post(self):
         user_input = request.get_json()
         required_fields = ['username', 'email', 'first_name', 'last_name', 'password']
@@ -41,7 +72,7 @@ class Signup(Resource):
 
             user.password_hash = user_input.get('password')
             db.session.add(user)
-            db.session.commit()
+            db.session.flush()
             session['user_id'] = user.id
             session['role'] = role
             return user.to_dict(), 201
@@ -93,9 +124,7 @@ class Logout(Resource):
 
 class Teachers(Resource):
     def get(self):
-        teachers = Teacher.query.all()
-        teachers_serialized = [teacher.to_dict() for teacher in teachers]
-        return teachers_serialized, 200
+        return readmodels.teacher_list(), 200
 
 class TeacherById(Resource):
     def get(self, id):
@@ -104,6 +133,7 @@ class TeacherById(Resource):
             return teacher.to_dict(), 200
         return {'error': '401 Unauthorized'}, 401
 
+    @unit_of_work
     def patch(self, id):
         if session.get('user_id') and session['role'] == 'teacher' and session['user_id'] == id:
             teacher = Teacher.query.filter_by(id=id).first()
@@ -112,7 +142,7 @@ class TeacherById(Resource):
                     setattr(teacher, attr, request.json[attr])
                 try:
                     db.session.add(teacher)
-                    db.session.commit()
+                    db.session.flush()
                 except IntegrityError:
                     return {'error': 'invalid input'}, 422
                 return teacher.to_dict(), 200
@@ -127,6 +157,7 @@ class StudentById(Resource):
         else:
             return {'error': '401 Unauthorized'}, 401
 
+    @unit_of_work
     def patch(self, id):
         if session.get('user_id') and session['role'] == 'student' and session['user_id'] == id:
             student = Student.query.filter_by(id=id).first()
@@ -139,20 +170,21 @@ class StudentById(Resource):
                     setattr(student, attr, value)
                 try:
                     db.session.add(student)
-                    db.session.commit()
+                    db.session.flush()
                 except IntegrityError:
                     return {'error': 'invalid input'}, 422
                 return student.to_dict(), 200
             return {'error': 'Student not found'}, 404
         return {'error': '401 Unauthorized'}, 401
 
+    @unit_of_work
     def delete(self, id):
         if session.get('user_id') and session['role'] == 'teacher':
             student = Student.query.filter_by(id=id).first()
             if student:
                 try:
                     db.session.delete(student)
-                    db.session.commit()
+                    db.session.flush()
                 except IntegrityError:
                     return {'error': 'invalid input'}, 422
                 return {}, 204
@@ -162,11 +194,10 @@ class StudentById(Resource):
 class Lessons(Resource):
     def get(self):
         if session.get('user_id'):
-            lessons = Lesson.query.all()
-            lessons_serialized = [lesson.to_dict() for lesson in lessons]
-            return lessons_serialized, 200
+            return readmodels.lesson_list(archived=include_archived()), 200
         return {'error': '401 Unauthorized'}, 401
 
+    @unit_of_work
     def post(self):
         if session.get('user_id') and session['role'] == 'teacher':
             lesson_data = request.get_json()
@@ -202,21 +233,53 @@ class Lessons(Resource):
                 lesson = Lesson(**fields,
                                 teacher_id=teacher_id)
                 db.session.add(lesson)
-                db.session.commit()
+                db.session.flush()
                 return lesson.to_dict(), 201
             except IntegrityError:
                 return {'error': 'invalid input'}, 422
         return {'error': '401 Unauthorized'}, 401
 
+class LessonSearch(Resource):
+    fields = ('id', 'title', 'description', 'level', 'start', 'end', 'capacity',
+              'price', 'is_full', 'teacher_id', 'teacher.first_name', 'teacher.last_name')
+
+    def get(self):
+        if not session.get('user_id'):
+            return {'error': '401 Unauthorized'}, 401
+
+        q = request.args.get('q', '').strip()
+        if not q:
+            return {'error': 'search query q cannot be empty'}, 400
+
+        page, per_page = page_args()
+        lessons, total = search_lessons(q, page, per_page)
+        results = [lesson.to_dict(only=self.fields) for lesson in lessons]
+        return paginated(results, page, per_page, total), 200
+
+class LessonAvailability(Resource):
+    def get(self):
+        if not session.get('user_id'):
+            return {'error': '401 Unauthorized'}, 401
+        try:
+            lesson_ids = availability.parse_ids(request.args.get('ids'))
+        except ValueError:
+            lesson_ids = None
+        if not lesson_ids:
+            return {'error': f'ids must be a comma-separated list of at most {availability.MAX_IDS} lesson ids'}, 400
+        return availability.lesson_counts(lesson_ids), 200
+
 class LessonById(Resource):
     def get(self, id):
         if session.get('user_id'):
             lesson = Lesson.query.filter_by(id=id).first()
+            if lesson is None and include_archived():
+                lesson = db.session.get(ArchivedLesson, id)
             if lesson:
                 return lesson.to_dict(), 200
             return {'error': 'Lesson not found'}, 404
         return {'error': '401 Unauthorized'}, 401
 
+    @unit_of_work
     def patch(self, id):
         if session.get('user_id') and session['role'] == 'teacher':
             lesson = Lesson.query.filter_by(id=id, teacher_id=session['user_id']).first()
@@ -228,22 +291,23 @@ class LessonById(Resource):
                             value = datetime.fromisoformat(value)
                         setattr(lesson, attr, value)
                     db.session.add(lesson)
-                    db.session.commit()
+                    db.session.flush()
                     return lesson.to_dict(), 200
                 except IntegrityError:
                     return {'error': 'invalid input'}, 422
             return {'error': 'Lesson not found'}, 404
         return {'error': '401 Unauthorized'}, 401
 
+    @unit_of_work
     def delete(self, id):
         if session.get('user_id') and session['role'] == 'teacher':
             lesson = Lesson.query.filter_by(id=id, teacher_id=session['user_id']).first()
             if lesson:
                 try:
                     db.session.delete(lesson)
-                    db.session.commit()
+                    db.session.flush()
                     return {}, 204
-                except:
+                except IntegrityError:
                     return {'error': 'Failed to delete the lesson'}, 500
             return {'error': 'Lesson not found'}, 404
         return {'error': '401 Unauthorized'}, 401
@@ -260,11 +324,15 @@ class LessonsByStudentId(Resource):
             return {'error': '401 Unauthorized'}, 401
 
         lessons_query = Lesson.query.join(Enrollment).filter(Enrollment.student_id == student_id)
+        archived_query = ArchivedLesson.query.join(ArchivedEnrollment).filter(ArchivedEnrollment.student_id == student_id)
 
         if role == "teacher":
             lessons_query = lessons_query.filter(Lesson.teacher_id == user_id)
+            archived_query = archived_query.filter(ArchivedLesson.teacher_id == user_id)
 
         lessons = lessons_query.all()
+        if include_archived():
+            lessons += archived_query.all()
 
         if not lessons:
             return {'error': 'Lesson not found'}, 404
@@ -272,16 +340,25 @@ class LessonsByStudentId(Resource):
         lessons_serialized = [l.to_dict() for l in lessons]
         return lessons_serialized, 200
 
+class RecommendationsByStudentId(Resource):
+    def get(self, student_id):
+        if not session.get('user_id'):
+            return {'error': '401 Unauthorized'}, 401
+
+        if session['role'] == 'student' and session['user_id'] != student_id:
+            return {'error': '401 Unauthorized'}, 401
+
+        limit = min(max(request.args.get('limit', 10, type=int) or 10, 1), 20)
+        return recommended_lessons(student_id, limit), 200
+
 class LessonsByTeacherId(Resource):
     def get(self, teacher_id):
         if not session.get('user_id') or session['role'] != "teacher" or session['user_id'] != teacher_id:
             return {'error': '401 Unauthorized'}, 401
-        lessons = Lesson.query.filter_by(teacher_id=teacher_id).all()
+        lessons = readmodels.lesson_list(teacher_id, archived=include_archived())
         if not lessons:
             return {'error': 'Lesson not found'}, 404
-
-        lessons_serialized = [l.to_dict() for l in lessons]
-        return lessons_serialized, 200
+        return lessons, 200
 
 class EnrollmentsByLessonId(Resource):
     def get(self, lesson_id):
@@ -298,10 +375,12 @@ class EnrollmentsByLessonId(Resource):
             return {'error': 'Lesson not found'}, 404
         return {'error': '401 Unauthorized'}, 401
 
+    @unit_of_work
     def post(self, lesson_id):
         if not session.get('user_id') or session['role'] != 'student':
             return {'error': '401 Unauthorized'}, 401
 
+        lock_lesson(lesson_id)
         lesson = Lesson.query.filter_by(
             id=lesson_id
         ).first()
@@ -347,22 +426,47 @@ class EnrollmentsByLessonId(Resource):
             student_id=student_id,
             lesson_id=lesson_id
         )
-        lesson.update_is_full()
 
         try:
             db.session.add(new_enrollment)
             db.session.add(student)
-            db.session.commit()
+            lesson.update_is_full()
+            db.session.flush()
             return new_enrollment.to_dict(), 201
         except IntegrityError:
             return {'error': 'invalid input'}, 422
 
+    @unit_of_work
+    def patch(self, lesson_id):
+        if not session.get('user_id') or session['role'] != 'teacher':
+            return {'error': '401 Unauthorized'}, 401
+
+        data = request.get_json(silent=True)
+        items = data.get('enrollments') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return {'error': 'enrollments must be a non-empty list'}, 400
+        if len(items) > GRADING_MAX_UPDATES:
+            return {'error': f'at most {GRADING_MAX_UPDATES} enrollments can be updated at once'}, 400
+
+        lock_lesson(lesson_id)
+        lesson = Lesson.query.options(
+            selectinload(Lesson.enrollments).selectinload(Enrollment.student)
+        ).filter_by(id=lesson_id, teacher_id=session['user_id']).first()
+        if not lesson:
+            return {'error': 'Lesson not found'}, 404
+        results, applied = update_enrollments(lesson, items)
+        if not applied:
+            return {'error': 'No enrollments were updated', 'results': results}, 400
+        return {'results': results}, 200
+
 class IndividualEnrollmentByLessonId(Resource):
+    @unit_of_work
     def patch(self, lesson_id, enrollment_id):
         role = session['role']
         if not session.get('user_id') or (role == 'student'):
             return {'error': '401 Unauthorized'}, 401
 
+        lock_lesson(lesson_id)
         lesson = Lesson.query.filter_by(id=lesson_id).first()
         if not lesson:
             return {'error': 'Lesson not found'}, 404
@@ -419,11 +523,12 @@ class IndividualEnrollmentByLessonId(Resource):
                     setattr(enrollment, attr, value)
             lesson.update_is_full()
             db.session.add(student)
-            db.session.commit()
+            db.session.flush()
             return enrollment.to_dict(), 200
         except IntegrityError:
             return {'error': 'Invalid input'}, 422
 
+    @unit_of_work
     def delete(self, lesson_id, enrollment_id):
         if not session.get('user_id'):
             return {'error': '401 Unauthorized'}, 401
@@ -457,7 +562,7 @@ class IndividualEnrollmentByLessonId(Resource):
                     db.session.add(new_lesson_credit_history)
                 db.session.delete(enrollment)
                 lesson.update_is_full()
-                db.session.commit()
+                db.session.flush()
                 return {'message': 'Enrollment deleted'}, 200
 
             except IntegrityError:
@@ -481,7 +586,7 @@ class IndividualEnrollmentByLessonId(Resource):
                     db.session.add(new_lesson_credit_history)
                 db.session.delete(enrollment)
                 lesson.update_is_full()
-                db.session.commit()
+                db.session.flush()
                 return {'message': 'Enrollment deleted'}, 200
             except IntegrityError:
                 return {'error': 'Invalid input'}, 422
@@ -491,24 +596,20 @@ class PaymentsByStudentId(Resource):
         if not (session.get('user_id') or  session['role'] == 'student'):
             return {'error': '401 Unauthorized'}, 401
 
-        payments = Payment.query.filter_by(student_id=student_id).all()
+        payments = readmodels.payment_list(student_id)
         if not payments:
             return {'eror': 'Payment not found'}, 404
-
-        payments_serialized = [p.to_dict() for p in payments]
-        return payments_serialized, 200
+        return payments, 200
 
 class LessonCreditHistoryByStudentId(Resource):
     def get(self, student_id):
         if not (session.get('user_id') or  session['role'] == 'student'):
             return {'error': '401 Unauthorized'}, 401
 
-        records = LessonCreditHistory.query.filter_by(student_id=student_id).all()
+        records = readmodels.credit_history_list(student_id)
         if not records:
             return {'eror': 'History records not found'}, 404
-
-        records_serialized = [c.to_dict() for c in records]
-        return records_serialized, 200
+        return records, 200
 
 class FeedbackByStudentAndLessonId(Resource):
     def get(self, student_id, lesson_id):
@@ -519,12 +620,19 @@ class FeedbackByStudentAndLessonId(Resource):
             if session['user_id'] != student_id:
                 return {'error': '401 Unauthorized'}, 401
             feedback = Feedback.query.filter_by(student_id=student_id, lesson_id=lesson_id).first()
+            if feedback is None and include_archived():
+                feedback = ArchivedFeedback.query.filter_by(student_id=student_id, lesson_id=lesson_id).first()
 
         if session['role'] == 'teacher':
             lesson = Lesson.query.filter_by(id=lesson_id).first()
+            if lesson is None and include_archived():
+                lesson = db.session.get(ArchivedLesson, lesson_id)
+            if lesson is None:
+                return {'error': 'Feedback not found'}, 404
             if session['user_id'] != lesson.teacher_id:
                 return {'error': '401 Unauthorized'}, 401
-            feedback = Feedback.query.filter_by(student_id=student_id, lesson_id=lesson_id).first()
+            model = ArchivedFeedback if isinstance(lesson, ArchivedLesson) else Feedback
+            feedback = model.query.filter_by(student_id=student_id, lesson_id=lesson_id).first()
 
         if feedback:
             return feedback.to_dict(), 200
@@ -533,6 +641,7 @@ class FeedbackByStudentAndLessonId(Resource):
 
 class FeedbackById(Resource):
 
+    @unit_of_work
     def patch(self, id):
         if not session.get('user_id') or session['role'] == 'student':
             return {'error': '401 Unauthorized'}, 401
@@ -552,7 +661,7 @@ class FeedbackById(Resource):
                     return {'error': 'Invalid input'}, 422
                 setattr(feedback, attr, value)
 
-            db.session.commit()
+            db.session.flush()
             return feedback.to_dict(), 200
         except IntegrityError:
             return {'error': 'Invalid input'}, 422
@@ -561,29 +670,156 @@ class StudentsByTeacherId(Resource):
     def get(self, teacher_id):
         if not session.get('user_id') or session['role'] != "teacher" or session['user_id'] != teacher_id:
             return {'error': '401 Unauthorized'}, 401
-        teacher = Teacher.query.filter_by(id=teacher_id).first()
-        if not teacher:
+        if not db.session.get(Teacher, teacher_id):
             return {'error': 'teacher not found'}, 404
 
-        students = Student.query.join(Enrollment).filter(Enrollment.lesson.has(teacher_id=teacher_id)).all()
-        students_serialized = [s.to_dict() for s in students]
+        sort = request.args.get('sort', 'last_name')
+        order = request.args.get('order', 'asc')
+        if sort not in ROSTER_SORTS or order not in ('asc', 'desc'):
+            return {'error': f"sort must be one of {', '.join(ROSTER_SORTS)} and order asc or desc"}, 422
+
+        page, per_page = page_args()
+        students, total = teacher_roster(teacher_id, page, per_page, sort, order)
+        return paginated(students, page, per_page, total), 200
+
+class DashboardByTeacherId(Resource):
+    def get(self, teacher_id):
+        if not session.get('user_id') or session['role'] != "teacher" or session['user_id'] != teacher_id:
+            return {'error': '401 Unauthorized'}, 401
+
+        period = request.args.get('period', 'month')
+        if period not in PERIOD_FORMATS:
+            return {'error': f"period must be one of {', '.join(PERIOD_FORMATS)}"}, 422
+
+        return teacher_dashboard(teacher_id, period), 200
+
+class FeedbackInboxByTeacherId(Resource):
+    def get(self, teacher_id):
+        if not session.get('user_id') or session['role'] != "teacher" or session['user_id'] != teacher_id:
+            return {'error': '401 Unauthorized'}, 401
+
+        try:
+            since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+            until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+        except ValueError:
+            return {'error': 'since and until must be ISO dates'}, 422
+
+        page, per_page = page_args()
+        notes, total = teacher_inbox(
+            teacher_id, page, per_page,
+            q=request.args.get('q', '').strip(),
+            student_id=request.args.get('student_id', type=int),
+            lesson_id=request.args.get('lesson_id', type=int),
+            since=since,
+            until=until,
+        )
+        return paginated(notes, page, per_page, total), 200
+
+class RevenueReport(Resource):
+    def get(self):
+        if not session.get('user_id') or session['role'] != 'teacher':
+            return {'error': '401 Unauthorized'}, 401
+
+        try:
+            end = date.fromisoformat(request.args['end']) if request.args.get('end') else date.today()
+            start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=30)
+        except ValueError:
+            return {'error': 'start and end must be dates in YYYY-MM-DD format'}, 422
+
+        if start > end:
+            return {'error': 'start must not be after end'}, 422
 
-        return students_serialized, 200
+        return revenue_report(start, end, teacher_id=session['user_id']), 200
 
-@app.route('/config', methods=['GET'])
+class CalendarSubscription(Resource):
+    @unit_of_work
+    def get(self):
+        if not session.get('user_id'):
+            return {'error': '401 Unauthorized'}, 401
+        token = token_for(session['role'], session['user_id'])
+        return {'url': f'/calendar/{token}.ics'}, 200
+
+    @unit_of_work
+    def delete(self):
+        if not session.get('user_id'):
+            return {'error': '401 Unauthorized'}, 401
+        revoke_token(session['role'], session['user_id'])
+        return {}, 204
+
+class Batch(Resource):
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        items = data.get('requests')
+        if not isinstance(items, list) or not items:
+            return {'error': 'requests must be a non-empty list'}, 400
+        if len(items) > batch.MAX_REQUESTS:
+            return {'error': f'a batch can hold at most {batch.MAX_REQUESTS} requests'}, 400
+        return {'responses': batch.run(items)}, 200
+
+class Sync(Resource):
+    def get(self):
+        if not session.get('user_id'):
+            return {'error': '401 Unauthorized'}, 401
+
+        try:
+            since = parse_cursor(request.args.get('since', '0'))
+        except ValueError:
+            return {'error': 'since must be a cursor returned by a previous sync'}, 400
+        limit = min(max(request.args.get('limit', SYNC_LIMIT, type=int) or SYNC_LIMIT, 1), SYNC_MAX_LIMIT)
+        return changes_since(session['user_id'], session['role'], since, limit), 200
+
+@views.route('/calendar/<string:token>.ics', methods=['GET'])
+def calendar_ics(token):
+    owner = owner_of(token)
+    if not owner:
+        return jsonify(error='Calendar not found'), 404
+
+    body, etag = calendar_feed(owner.role, owner.user_id)
+    response = make_response(body)
+    response.headers['Content-Type'] = 'text/calendar; charset=utf-8'
+    response.headers['Cache-Control'] = 'private, max-age=300'
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+@views.route('/lessons/stream', methods=['GET'])
+def lesson_stream():
+    error, subscription, initial = availability.open_stream()
+    if error:
+        return error
+
+    def stream():
+        try:
+            yield availability.sse(initial) or ': connected\n\n'
+            while True:
+                events = subscription.get(availability.HEARTBEAT)
+                if events is None:
+                    return
+                yield availability.sse(events) or ': keepalive\n\n'
+        finally:
+            availability.hub.unsubscribe(subscription)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@views.route('/config', methods=['GET'])
 def get_publishable_key():
     return jsonify({
       'publicKey': os.getenv('STRIPE_PUBLISHABLE_KEY'),
     })
 
-@app.route('/checkout-session', methods=['GET'])
+@views.route('/checkout-session', methods=['GET'])
 def get_checkout_session():
     id = request.args.get('sessionId')
-    checkout_session = stripe.checkout.Session.retrieve(id)
+    if not id:
+        return jsonify(error='sessionId is required'), 400
+    try:
+        checkout_session = gateway.get_checkout_session(id)
+    except gateway.GatewayError as e:
+        return jsonify(error=str(e)), 502
     return jsonify(checkout_session)
 
 # stripe listen --forward-to localhost:5555/webhook
-@app.route('/create-checkout-session', methods=['POST'])
+@views.route('/create-checkout-session', methods=['POST'])
 def create_checkout_session():
     data = request.get_json()
     quantity = data.get('quantity')
@@ -592,15 +828,12 @@ def create_checkout_session():
     domain_url = os.getenv('DOMAIN')
 
     try:
-        checkout_session = stripe.checkout.Session.create(
-            success_url=domain_url + '/completion?session_id={CHECKOUT_SESSION_ID}',
-            cancel_url=domain_url + '/canceled',
-            mode='payment',
+        checkout_session = gateway.create_checkout_session(
+            price=price,
+            quantity=quantity,
             metadata=metadata,
-            line_items=[{
-                'price': price,
-                'quantity': quantity,
-            }],
+            domain_url=domain_url,
+            idempotency_key=request.headers.get('Idempotency-Key'),
         )
         return jsonify({"url": checkout_session.url}), 200
 
@@ -609,7 +842,8 @@ def create_checkout_session():
 
 
 
-@app.route('/webhook', methods=['POST'])
+@views.route('/webhook', methods=['POST'])
+@unit_of_work
 def webhook():
     event = None
     payload = request.data
@@ -623,10 +857,10 @@ def webhook():
     if endpoint_secret:
         sig_header = request.headers.get('stripe-signature')
         try:
-            event = stripe.Webhook.construct_event(
+            event = gateway.construct_event(
                 payload, sig_header, endpoint_secret
             )
-        except stripe.error.SignatureVerificationError as e:
+        except gateway.SignatureError as e:
             print('⚠️  Webhook signature verification failed.' + str(e))
             return jsonify(success=False)
 
@@ -654,7 +888,7 @@ def webhook():
             )
             db.session.add(new_lesson_credit_history)
             db.session.add(new_payment)
-            db.session.commit()
+            db.session.flush()
     elif event['type'] == 'payment_method.attached':
         payment_method = event['data']['object']
     else:
@@ -670,10 +904,15 @@ api.add_resource(Logout, '/logout', endpoint='logout')
 api.add_resource(Teachers,'/teachers', endpoint='teachers')
 api.add_resource(TeacherById, '/teachers/<int:id>', endpoint='teacher_by_id')
 api.add_resource(StudentsByTeacherId, '/teachers/<int:teacher_id>/students', endpoint='students_by_teacher_id')
+api.add_resource(DashboardByTeacherId, '/teachers/<int:teacher_id>/dashboard', endpoint='dashboard_by_teacher_id')
+api.add_resource(FeedbackInboxByTeacherId, '/teachers/<int:teacher_id>/feedback', endpoint='feedback_inbox_by_teacher_id')
 api.add_resource(StudentById, '/students/<int:id>', endpoint='student_by_id')
 api.add_resource(Lessons, '/lessons', endpoint='lessons')
+api.add_resource(LessonSearch, '/lessons/search', endpoint='lesson_search')
+api.add_resource(LessonAvailability, '/lessons/availability', endpoint='lesson_availability')
 api.add_resource(LessonById, '/lessons/<int:id>', endpoint='lesson_by_id')
 api.add_resource(LessonsByStudentId, '/students/<int:student_id>/lessons', endpoint="lesson_by_student_id")
+api.add_resource(RecommendationsByStudentId, '/students/<int:student_id>/recommendations', endpoint='recommendations_by_student_id')
 api.add_resource(LessonsByTeacherId, '/teachers/<int:teacher_id>/lessons', endpoint="lesson_by_teacher_id")
 api.add_resource(EnrollmentsByLessonId, '/lessons/<int:lesson_id>/enrollments', endpoint='enrollments_by_lesson_id')
 api.add_resource(IndividualEnrollmentByLessonId, '/lessons/<int:lesson_id>/enrollments/<int:enrollment_id>', endpoint='individual_enrollment_by_lesson_id')
@@ -681,7 +920,72 @@ api.add_resource(PaymentsByStudentId,'/students/<int:student_id>/payments', endp
 api.add_resource(LessonCreditHistoryByStudentId,'/students/<int:student_id>/lessoncredithistory', endpoint='lessoncredithistory_by_student_id')
 api.add_resource(FeedbackByStudentAndLessonId, '/students/<int:student_id>/lessons/<int:lesson_id>/feedback', endpoint='feedback_by_student_and_lesson_id')
 api.add_resource(FeedbackById, '/feedbacks/<int:id>', endpoint='feedback_by_id')
+api.add_resource(RevenueReport, '/reports/revenue', endpoint='revenue_report')
+api.add_resource(CalendarSubscription, '/calendar', endpoint='calendar_subscription')
+api.add_resource(Sync, '/sync', endpoint='sync')
+api.add_resource(Batch, '/batch', endpoint='batch')
+
+engines = weakref.WeakSet()
+
+
+def dispose_engines():
+    # A forked worker inherits the parent's pooled SQLite connections; drop
+    # them without closing so the parent's copies are left untouched.
+    for engine in list(engines):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=dispose_engines)
+
+
+def init_migrate(app):
+    # Flask-Migrate imports Alembic, which a serving worker never needs, so
+    # only the `flask db` commands and the test fixtures set it up.
+    from flask_migrate import Migrate
+    Migrate(app, db)
+    return app
+
+
+class MigrateCommands(click.Group):
+    # `flask db`, with the Flask-Migrate commands loaded when it is run
+    def _commands(self, ctx):
+        from flask_migrate.cli import db as commands
+        init_migrate(ctx.ensure_object(ScriptInfo).load_app())
+        return commands
+
+    def list_commands(self, ctx):
+        return self._commands(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._commands(ctx).get_command(ctx, name)
+
+
+def create_app(config='config.Config'):
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.json.compact = False
+
+    db.init_app(app)
+    api.init_app(app)
+    cors.init_app(app)
+    bcrypt.init_app(app)
+    app.register_blueprint(views)
+    metrics.init_app(app)
+    events.init_app(app)
+    jobs.init_app(app)
+    nplusone.init_app(app)
+
+    app.cli.add_command(MigrateCommands('db', help='Perform database migrations.'))
+    app.cli.add_command(reconcile_command)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(recommendations_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(archive_cli)
+
+    with app.app_context():
+        engines.update(db.engines.values())
+    return app
 
 
 if __name__ == '__main__':
-    app.run(port=5555, debug=True)
+    create_app().run(port=5555, debug=True)
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+import os
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, literal, select
+
+from cache import invalidate_tags
+from config import db
+from models import (Lesson, Enrollment, Feedback, LessonRecommendation,
+                    ArchivedLesson, ArchivedEnrollment, ArchivedFeedback)
+import sync
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+CHUNK_SIZE = 200
+
+# hot table -> archive table, with the columns both share
+MOVES = (
+    (Lesson.__table__, ArchivedLesson.__table__, 'id'),
+    (Enrollment.__table__, ArchivedEnrollment.__table__, 'lesson_id'),
+    (Feedback.__table__, ArchivedFeedback.__table__, 'lesson_id'),
+)
+
+
+def _shared_columns(hot, archived):
+    return [column.name for column in hot.columns if column.name in archived.columns]
+
+
+def archivable(cutoff):
+    return select(Lesson.id).where(Lesson.end < cutoff).order_by(Lesson.id)
+
+
+def _tags(lesson_ids):
+    tags = {('lesson', lesson_id) for lesson_id in lesson_ids}
+    tags.update(('teacher', teacher_id) for teacher_id in db.session.scalars(
+        select(Lesson.teacher_id).where(Lesson.id.in_(lesson_ids)).distinct()) if teacher_id is not None)
+    tags.update(('student', student_id) for student_id in db.session.scalars(
+        select(Enrollment.student_id).where(Enrollment.lesson_id.in_(lesson_ids)).distinct()) if student_id is not None)
+    return tags
+
+
+def _tombstones(lesson_ids):
+    # the Core deletes below bypass the flush listener in sync.py
+    teachers = dict(db.session.execute(select(Lesson.id, Lesson.teacher_id).where(Lesson.id.in_(lesson_ids))).all())
+    marks = {('lesson', lesson_id): (True, None, teacher_id) for lesson_id, teacher_id in teachers.items()}
+    for entity, model in (('enrollment', Enrollment), ('feedback', Feedback)):
+        rows = db.session.execute(select(model.id, model.student_id, model.lesson_id).where(model.lesson_id.in_(lesson_ids)))
+        marks.update({(entity, id): (True, student_id, teachers.get(lesson_id)) for id, student_id, lesson_id in rows})
+    return marks
+
+
+def archive_chunk(lesson_ids, now):
+    tags = _tags(lesson_ids)
+    sync.record(db.session.connection(), _tombstones(lesson_ids))
+    for hot, archived, key in MOVES:
+        columns = _shared_columns(hot, archived)
+        values = [hot.c[name] for name in columns]
+        if 'archived_at' in archived.columns:
+            columns, values = columns + ['archived_at'], values + [literal(now)]
+        db.session.execute(insert(archived).from_select(columns, select(*values).where(hot.c[key].in_(lesson_ids))))
+    db.session.execute(delete(LessonRecommendation).where(LessonRecommendation.lesson_id.in_(lesson_ids)))
+    # children first; the FTS delete triggers keep the search indexes in step
+    for hot, archived, key in reversed(MOVES):
+        db.session.execute(delete(hot).where(hot.c[key].in_(lesson_ids)))
+    return tags
+
+
+def archive(days=ARCHIVE_AFTER_DAYS, chunk_size=CHUNK_SIZE, now=None):
+    # One transaction per chunk keeps the write lock short, so requests are
+    # never blocked for the whole run.
+    now = now or datetime.now()
+    cutoff = now - timedelta(days=days)
+    while True:
+        lesson_ids = db.session.scalars(archivable(cutoff).limit(chunk_size)).all()
+        if not lesson_ids:
+            return
+        try:
+            tags = archive_chunk(lesson_ids, now)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        invalidate_tags(tags)
+        yield len(lesson_ids)
+
+
+def table_sizes():
+    return {model.__tablename__: db.session.scalar(select(func.count()).select_from(model))
+            for model in (Lesson, Enrollment, Feedback, ArchivedLesson, ArchivedEnrollment, ArchivedFeedback)}
+
+
+archive_cli = AppGroup('archive', help='Move finished lessons into the archive tables.')
+
+
+@archive_cli.command('run')
+@click.option('--days', default=ARCHIVE_AFTER_DAYS, show_default=True,
+              help='Archive lessons that ended more than this many days ago.')
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True, help='Lessons moved per transaction.')
+def run_command(days, chunk_size):
+    """Move old lessons with their enrollments and feedback to the archive."""
+    total = 0
+    for moved in archive(days, chunk_size):
+        total += moved
+        click.echo(f'archived {total} lessons')
+    click.echo(f'done, {total} lessons archived')
+
+
+@archive_cli.command('stats')
+def stats_command():
+    """Show row counts of the hot and archive tables."""
+    for table, count in table_sizes().items():
+        click.echo(f'{table:22} {count}')
@@ -0,0 +1,178 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import os
+import sys
+from urllib.parse import unquote_plus
+
+from flask_cors.core import get_cors_headers, get_cors_options, parse_resources, try_match
+from werkzeug.datastructures import Headers
+
+import availability
+from app import create_app
+
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', 8))
+
+
+def _json_response(status, body):
+    data = json.dumps(body).encode('utf-8')
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(data)).encode()),
+    ]
+    return status, headers, data
+
+
+def cors_resources(app):
+    # the same (pattern, options) pairs flask-cors builds in cors.init_app,
+    # which create_app calls without options, so the CORS_* settings apply
+    options = get_cors_options(app)
+    return [(pattern, get_cors_options(app, options, resource))
+            for pattern, resource in parse_resources(options.get('resources'))]
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+class ASGIAdapter:
+    # Minimal ASGI front for the Flask app. The lesson stream is served on the
+    # event loop; every other route, the checkout routes included, goes
+    # through WSGI on a thread pool with Flask's hooks, session and metrics.
+    # stripe has no async client, so a checkout holds one of those threads
+    # while it waits on Stripe: WSGI_THREADS bounds concurrent checkouts.
+    def __init__(self, wsgi_app, threads=WSGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        self.cors = cors_resources(wsgi_app)
+
+    def cors_headers(self, scope):
+        # the stream is answered here without Flask, so flask-cors is applied by hand
+        path = unquote_plus(scope['path'])
+        for pattern, options in self.cors:
+            if try_match(path, pattern):
+                request_headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']])
+                return [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                        for k, v in get_cors_headers(options, request_headers, scope['method']).items(multi=True)]
+        return []
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        if scope['method'] == 'GET' and scope['path'] == '/lessons/stream':
+            return await self.lesson_stream(scope, receive, send)
+
+        body = await _read_body(receive)
+        return await self.wsgi(scope, body, send)
+
+    def open_stream(self, scope, loop):
+        with self.wsgi_app.request_context(self.environ(scope, b'')):
+            return availability.open_stream(loop)
+
+    async def lesson_stream(self, scope, receive, send):
+        # Subscribers wait on the event loop rather than each holding a WSGI
+        # thread, so a worker can keep thousands of idle streams open.
+        loop = asyncio.get_running_loop()
+        error, subscription, initial = await loop.run_in_executor(self.executor, self.open_stream, scope, loop)
+        if error:
+            status, headers, data = _json_response(error[1], error[0])
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers + self.cors_headers(scope)})
+            await send({'type': 'http.response.body', 'body': data})
+            return
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            subscription.close()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ] + self.cors_headers(scope)})
+            chunk = availability.sse(initial) or ': connected\n\n'
+            while True:
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+                events = await subscription.get_async(availability.HEARTBEAT)
+                if events is None:
+                    return
+                chunk = availability.sse(events) or ': keepalive\n\n'
+        finally:
+            watcher.cancel()
+            availability.hub.unsubscribe(subscription)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+                continue
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    async def wsgi(self, scope, body, send):
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+        result = await loop.run_in_executor(self.executor, self.wsgi_app, self.environ(scope, body), start_response)
+        chunks = iter(result)
+        try:
+            # pull chunks one at a time so streamed responses are not buffered
+            chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            while chunk is not None:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, result.close)
+
+
+app = ASGIAdapter(create_app(os.getenv('APP_CONFIG', 'config.Config')))
@@ -0,0 +1,282 @@
+import asyncio
+from collections import defaultdict
+import json
+import os
+import threading
+
+from flask import current_app, request, session
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from config import db
+from models import Lesson, Enrollment, SyncChange
+
+POLL_INTERVAL = float(os.getenv('AVAILABILITY_POLL_INTERVAL', 0.5))
+HEARTBEAT = 15
+MAX_IDS = 500
+CACHE_TTL = float(os.getenv('AVAILABILITY_CACHE_TTL', 1))
+
+lessons = Lesson.__table__
+enrollments = Enrollment.__table__
+changes = SyncChange.__table__
+
+
+def parse_ids(raw, limit=MAX_IDS):
+    if not raw:
+        return None
+    ids = sorted({int(part) for part in raw.split(',') if part.strip()})
+    if not ids or len(ids) > limit:
+        raise ValueError(raw)
+    return ids
+
+
+# per-lesson entries, so overlapping id lists from different clients share them
+counts_cache = TTLCache(ttl=CACHE_TTL, maxsize=8192)
+
+
+def _counts(lesson_ids):
+    registered = func.coalesce(func.sum(case((enrollments.c.status == 'registered', 1), else_=0)), 0)
+    waitlisted = func.coalesce(func.sum(case((enrollments.c.status == 'waitlisted', 1), else_=0)), 0)
+    return db.session.execute(
+        select(lessons.c.id, lessons.c.capacity, registered.label('registered'), waitlisted.label('waitlisted'))
+        .select_from(lessons.outerjoin(enrollments, enrollments.c.lesson_id == lessons.c.id))
+        .where(lessons.c.id.in_(lesson_ids))
+        .group_by(lessons.c.id)
+    ).all()
+
+
+def availability(lesson_ids):
+    return {row.id: {
+        'lesson_id': row.id,
+        'seats_left': max(row.capacity - row.registered, 0),
+        'is_full': row.registered >= row.capacity,
+        'waitlist': row.waitlisted,
+    } for row in _counts(lesson_ids)}
+
+
+def lesson_counts(lesson_ids):
+    found = {lesson_id: counts_cache.get(lesson_id) for lesson_id in lesson_ids}
+    missing = [lesson_id for lesson_id, value in found.items() if value is None]
+    if missing:
+        for row in _counts(missing):
+            found[row.id] = {
+                'id': row.id,
+                'capacity': row.capacity,
+                'registered': row.registered,
+                'waitlisted': row.waitlisted,
+                'is_full': row.registered >= row.capacity,
+            }
+            counts_cache.set(row.id, found[row.id])
+    return [found[lesson_id] for lesson_id in lesson_ids if found[lesson_id] is not None]
+
+
+def sse(events):
+    return ''.join(f'data: {json.dumps(event)}\n\n' for event in events)
+
+
+class Subscription:
+    # Pending events are keyed by lesson, so a slow reader only ever holds the
+    # latest state of each lesson instead of an unbounded backlog.
+    def __init__(self, lesson_ids, loop=None):
+        self.lesson_ids = lesson_ids
+        self.loop = loop
+        self.pending = {}
+        self.closed = False
+        self.lock = threading.Lock()
+        self.ready = asyncio.Event() if loop else threading.Event()
+
+    def put(self, event):
+        with self.lock:
+            self.pending[event['lesson_id']] = event
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        if self.loop is None:
+            self.ready.set()
+        else:
+            self.loop.call_soon_threadsafe(self.ready.set)
+
+    def _drain(self):
+        if self.closed:
+            return None
+        self.ready.clear()
+        with self.lock:
+            events, self.pending = list(self.pending.values()), {}
+        return events
+
+    def get(self, timeout):
+        self.ready.wait(timeout)
+        return self._drain()
+
+    async def get_async(self, timeout):
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._drain()
+
+
+class Hub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_lesson = defaultdict(set)
+        self.everyone = set()
+        self.subscribers = 0
+
+    def __len__(self):
+        return self.subscribers
+
+    def subscribe(self, lesson_ids=None, loop=None):
+        subscription = Subscription(lesson_ids, loop)
+        with self.lock:
+            self.subscribers += 1
+            if lesson_ids is None:
+                self.everyone.add(subscription)
+            for lesson_id in lesson_ids or ():
+                self.by_lesson[lesson_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers -= 1
+            self.everyone.discard(subscription)
+            for lesson_id in subscription.lesson_ids or ():
+                subs = self.by_lesson.get(lesson_id)
+                if subs is not None:
+                    subs.discard(subscription)
+                    if not subs:
+                        del self.by_lesson[lesson_id]
+
+    def publish(self, events):
+        with self.lock:
+            targets = [(sub, event) for event in events
+                       for sub in (*self.by_lesson.get(event['lesson_id'], ()), *self.everyone)]
+        for subscription, event in targets:
+            subscription.put(event)
+
+
+class Notifier:
+    # One thread per process follows the sync change log, which every worker
+    # writes to, and turns lesson changes into availability events. A commit
+    # in this process wakes it straight away; other workers' commits are seen
+    # on the next poll.
+    def __init__(self, app, hub, interval=POLL_INTERVAL):
+        self.app = app
+        self.hub = hub
+        self.interval = interval
+        self.cursor = None
+        self.last = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='availability-notifier', daemon=True)
+
+    def follow(self, seq):
+        with self.lock:
+            self.cursor = seq if self.cursor is None else min(self.cursor, seq)
+
+    def poll(self):
+        with self.lock:
+            cursor = self.cursor
+        if cursor is None:
+            return []
+        with self.app.app_context():
+            rows = db.session.execute(
+                select(changes.c.seq, changes.c.entity, changes.c.entity_id)
+                .where(changes.c.seq > cursor)
+                .order_by(changes.c.seq)
+            ).all()
+            if not rows:
+                return []
+            with self.lock:
+                self.cursor = max(self.cursor, rows[-1].seq)
+            lesson_ids = {row.entity_id for row in rows if row.entity == 'lesson'}
+            current = availability(lesson_ids) if lesson_ids else {}
+        events = [event for lesson_id, event in current.items() if self.last.get(lesson_id) != event]
+        self.last.update((event['lesson_id'], event) for event in events)
+        return events
+
+    def run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            with self.lock:
+                if not len(self.hub):
+                    # nobody is listening; the next subscriber sets a new cursor
+                    self.cursor = None
+                    self.last.clear()
+                    continue
+            try:
+                self.hub.publish(self.poll())
+            except Exception:
+                self.app.logger.exception('availability notifier failed')
+
+
+hub = Hub()
+_notifier = None
+_lock = threading.Lock()
+
+
+def notifier(app):
+    global _notifier
+    with _lock:
+        if _notifier is None:
+            _notifier = Notifier(app, hub)
+            _notifier.thread.start()
+    return _notifier
+
+
+def _after_fork():
+    # the notifier thread and the subscribers stay with the parent
+    global hub, _notifier, _lock
+    hub, _notifier, _lock = Hub(), None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+@event.listens_for(Session, 'after_flush')
+def mark_availability(session, flush_context):
+    changed = session.info.setdefault('availability_changed', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Lesson):
+            changed.add(obj.id)
+        elif isinstance(obj, Enrollment):
+            changed.add(obj.lesson_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def wake_notifier(session):
+    changed = session.info.pop('availability_changed', None)
+    if not changed:
+        return
+    for lesson_id in changed:
+        counts_cache.delete(lesson_id)
+    if _notifier is not None:
+        _notifier.wake.set()
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_availability(session):
+    session.info.pop('availability_changed', None)
+
+
+def open_stream(loop=None):
+    # Checks the caller, subscribes and loads the starting state; shared by
+    # the Flask route and the ASGI adapter, and needs a request context.
+    if not session.get('user_id'):
+        return ({'error': '401 Unauthorized'}, 401), None, None
+    try:
+        lesson_ids = parse_ids(request.args.get('ids'))
+    except ValueError:
+        return ({'error': f'ids must be a comma-separated list of at most {MAX_IDS} lesson ids'}, 400), None, None
+    subscription = hub.subscribe(lesson_ids, loop)
+    # anything committed after this point reaches the subscriber as an event
+    notifier(current_app._get_current_object()).follow(
+        db.session.scalar(select(func.coalesce(func.max(changes.c.seq), 0))))
+    initial = list(availability(lesson_ids).values()) if lesson_ids else []
+    return None, subscription, initial
@@ -0,0 +1,60 @@
+import sys
+
+from flask import current_app, g, request, session
+
+from config import db
+
+MAX_REQUESTS = 20
+# the batch itself, and streams that would never finish inside one
+NOT_BATCHABLE = {'batch', 'views.lesson_stream'}
+
+
+def _error(status, message):
+    return {'status': status, 'body': {'error': message}}
+
+
+def _body(response):
+    if response.is_json:
+        return response.get_json(silent=True)
+    return response.get_data(as_text=True)
+
+
+def run_one(item):
+    if not isinstance(item, dict) or not str(item.get('path', '')).startswith('/'):
+        return _error(400, 'each request needs a path starting with /')
+    ctx = current_app.test_request_context(
+        item['path'], method=str(item.get('method', 'GET')).upper(),
+        json=item.get('body'), base_url=request.host_url,
+    )
+    # same principal: changes to the session (e.g. /logout) carry over to
+    # the batch response's cookie
+    ctx.session = session._get_current_object()
+    # each sub-request gets a fresh g, as a real request would, so the
+    # per-request hooks (metrics, query tracking) see only their own work
+    outer = g.__dict__.copy()
+    g.__dict__.clear()
+    try:
+        with ctx:
+            if request.endpoint in NOT_BATCHABLE:
+                return _error(400, f'{item["path"]} cannot be batched')
+            try:
+                response = current_app.full_dispatch_request()
+            except Exception:
+                current_app.log_exception(sys.exc_info())
+                db.session.rollback()
+                return _error(500, 'Internal Server Error')
+            try:
+                return {'status': response.status_code, 'body': _body(response)}
+            finally:
+                response.close()
+    finally:
+        g.__dict__.clear()
+        g.__dict__.update(outer)
+
+
+def run(items):
+    # Sub-requests run one after another: they share this request's
+    # principal and SQLAlchemy session, neither of which is thread-safe, and
+    # SQLite would serialize their queries on one connection anyway. The
+    # saving is in HTTP round trips, not in database time.
+    return [run_one(item) for item in items]
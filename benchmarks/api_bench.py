@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+# Endpoint benchmark for the API. Seeds a scratch database with the bulk
+# seeder, logs in as a teacher and a student, then drives every Resource,
+# reads and writes, through the Flask test client (default) or a local
+# threaded WSGI server and reports p50/p95/p99 latency, throughput and SQL
+# statements per request. Endpoints issuing more than QUERY_BUDGET statements
+# per request are flagged, and a scenario answered with errors is left out of
+# the results rather than timing the error path. Mixed scenarios cover an enrollment rush on one
+# lesson and a browse/enroll mix. Results are written as JSON so two commits
+# can be compared:
+#
+#   python benchmarks/api_bench.py --scale 10 --output before.json
+#   python benchmarks/api_bench.py --scale 10 --output after.json
+#   python benchmarks/api_bench.py --compare before.json after.json
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, datetime, timedelta
+
+RUSH_CAPACITY = 5
+# more statements than this per request usually means an N+1 pattern
+QUERY_BUDGET = 20
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class TestClientDriver:
+    name = 'test-client'
+
+    def __init__(self, app):
+        self.client = app.test_client(use_cookies=False)
+
+    def request(self, method, path, cookie=None, body=None):
+        headers = {'Cookie': f'session={cookie}'} if cookie else {}
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        response.close()
+        return response.status_code, response.headers
+
+
+class WSGIServerDriver:
+    name = 'wsgi-server'
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def request(self, method, path, cookie=None, body=None):
+        headers = {'Cookie': f'session={cookie}'} if cookie else {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status, response.headers
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code, error.headers
+
+
+def login(driver, role, username, password):
+    status, headers = driver.request('POST', '/login', body={'username': username, 'password': password, 'role': role})
+    if status != 200:
+        raise SystemExit(f'could not log in as {role} {username}: {status}')
+    cookie = headers.get('Set-Cookie')
+    return cookie.split(';', 1)[0].split('=', 1)[1]
+
+
+def session_cookie(app, user_id, role):
+    # signed exactly as /login would, without paying for bcrypt per user
+    return app.session_interface.get_signing_serializer(app).dumps({'user_id': user_id, 'role': role})
+
+
+def statements(registry):
+    totals = {}
+    for (name, labels), value in list(registry.counters.items()):
+        if name in ('db_statements_total', 'http_requests_total'):
+            endpoint = dict(labels)['endpoint']
+            totals.setdefault(endpoint, [0, 0])[name == 'http_requests_total'] += value
+    return totals
+
+
+def summarize(latencies, statuses, elapsed, queries, requests):
+    return {
+        'requests': len(latencies),
+        'statuses': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'queries_per_request': round(queries / requests, 2) if requests else None,
+    }
+
+
+def measure(registry, run):
+    # run() returns (latencies, statuses, elapsed); SQL counts come from the
+    # app's own metrics registry so they work for both drivers
+    before = statements(registry)
+    latencies, statuses, elapsed = run()
+    after = statements(registry)
+    queries = sum(after[e][0] - before.get(e, [0, 0])[0] for e in after)
+    requests = sum(after[e][1] - before.get(e, [0, 0])[1] for e in after)
+    return summarize(latencies, statuses, elapsed, queries, requests)
+
+
+def sequential(driver, method, path, cookie, count):
+    def run():
+        latencies, statuses = [], []
+        started = time.perf_counter()
+        for _ in range(count):
+            t = time.perf_counter()
+            status, _ = driver.request(method, path, cookie)
+            latencies.append(time.perf_counter() - t)
+            statuses.append(status)
+        return latencies, statuses, time.perf_counter() - started
+    return run
+
+
+def scripted(driver, calls):
+    # calls is a list of (method, path, cookie, body), each sent once; used
+    # for writes that need a fresh row or a unique payload per request
+    def run():
+        latencies, statuses = [], []
+        started = time.perf_counter()
+        for method, path, cookie, body in calls:
+            t = time.perf_counter()
+            status, _ = driver.request(method, path, cookie, body)
+            latencies.append(time.perf_counter() - t)
+            statuses.append(status)
+        return latencies, statuses, time.perf_counter() - started
+    return run
+
+
+def concurrent(jobs, threads):
+    # jobs is a list of zero-argument callables returning a status code
+    def run():
+        latencies, statuses = [], []
+        queue = iter(jobs)
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    job = next(queue, None)
+                if job is None:
+                    return
+                t = time.perf_counter()
+                status = job()
+                with lock:
+                    latencies.append(time.perf_counter() - t)
+                    statuses.append(status)
+
+        started = time.perf_counter()
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        return latencies, statuses, time.perf_counter() - started
+    return run
+
+
+def pick_users(db, models):
+    from sqlalchemy import func, select
+    Teacher, Student, Lesson, Enrollment = models
+    teacher_id = db.session.scalar(
+        select(Lesson.teacher_id).group_by(Lesson.teacher_id).order_by(func.count().desc(), Lesson.teacher_id).limit(1))
+    student_id = db.session.scalar(
+        select(Enrollment.student_id).group_by(Enrollment.student_id)
+        .order_by(func.count().desc(), Enrollment.student_id).limit(1))
+    teacher = db.session.get(Teacher, teacher_id)
+    student = db.session.get(Student, student_id)
+    teacher_lesson = db.session.scalar(select(Lesson.id).where(Lesson.teacher_id == teacher_id).limit(1))
+    student_lesson = db.session.scalar(select(Enrollment.lesson_id).where(Enrollment.student_id == student_id).limit(1))
+    return teacher, student, teacher_lesson, student_lesson
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--anchor', type=date.fromisoformat, default=date.today())
+    parser.add_argument('--requests', type=int, default=100, help='requests per endpoint')
+    parser.add_argument('--threads', type=int, default=8, help='threads for the mixed scenarios')
+    parser.add_argument('--rush', type=int, default=200, help='students racing for one lesson')
+    parser.add_argument('--server', action='store_true', help='drive a local WSGI server instead of the test client')
+    parser.add_argument('--only', nargs='*', help='run only these scenarios')
+    parser.add_argument('--output')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'))
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'api.db')}"
+        os.environ.setdefault('SECRET_KEY', 'api-bench')
+        from app import create_app
+        from config import db
+        from metrics import registry
+        from models import Teacher, Student, Lesson, Enrollment, Feedback, Payment, LessonCreditHistory
+        import seed
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            counts = seed.bulk_seed(
+                args.seed,
+                max(1, round(seed.NUM_STUDENTS * args.scale)),
+                max(1, round(seed.NUM_TEACHERS * args.scale)),
+                max(1, round(seed.NUM_LESSONS * args.scale)),
+                round(seed.NUM_ENROLLMENTS * args.scale),
+                args.anchor,
+            )
+            print('seeded {} students, {} teachers, {} lessons, {} enrollments'.format(*counts),
+                  f'in {time.perf_counter() - started:.1f}s')
+            teacher, student, teacher_lesson, student_lesson = pick_users(db, (Teacher, Student, Lesson, Enrollment))
+            teacher_id, teacher_username = teacher.id, teacher.username
+            student_id, student_username = student.id, student.username
+            student_count = counts[0]
+            # the bulk seeder writes no feedback
+            enrolled = db.session.execute(db.select(Enrollment.id, Enrollment.student_id, Enrollment.lesson_id).join(
+                Lesson).where(Lesson.teacher_id == teacher_id).limit(args.requests)).all()
+            db.session.add_all([Feedback(student_id=student, lesson_id=lesson, message='Lovely lesson')
+                                for _, student, lesson in enrolled])
+            # nor payments or credit history; give the benchmarked student
+            # some, plus feedback on their own lesson, so those reads find rows
+            if not any(enrolled_student == student_id and lesson == student_lesson
+                       for _, enrolled_student, lesson in enrolled):
+                db.session.add(Feedback(student_id=student_id, lesson_id=student_lesson, message='Lovely lesson'))
+            credit = 0
+            for i in range(10):
+                db.session.add(Payment(student_id=student_id, lesson_credit=100))
+                db.session.add(LessonCreditHistory(student_id=student_id, old_credit=credit, new_credit=credit + 100,
+                                                   memo=f'Bench top-up {i}'))
+                credit += 100
+            db.session.commit()
+            feedback_ids = db.session.scalars(db.select(Feedback.id).join(Lesson).where(
+                Lesson.teacher_id == teacher_id)).all()
+            teacher_enrollments = [(lesson, enrollment) for enrollment, _, lesson in enrolled]
+
+        driver = WSGIServerDriver(app) if args.server else TestClientDriver(app)
+        teacher_cookie = login(driver, 'teacher', teacher_username, seed.BULK_PASSWORD)
+        student_cookie = login(driver, 'student', student_username, seed.BULK_PASSWORD)
+
+        t, s = teacher_id, student_id
+        reads = [
+            ('teachers', 'GET', '/teachers', None),
+            ('teacher_by_id', 'GET', f'/teachers/{t}', teacher_cookie),
+            ('students_by_teacher_id', 'GET', f'/teachers/{t}/students', teacher_cookie),
+            ('dashboard_by_teacher_id', 'GET', f'/teachers/{t}/dashboard', teacher_cookie),
+            ('feedback_inbox_by_teacher_id', 'GET', f'/teachers/{t}/feedback', teacher_cookie),
+            ('lesson_by_teacher_id', 'GET', f'/teachers/{t}/lessons', teacher_cookie),
+            ('enrollments_by_lesson_id', 'GET', f'/lessons/{teacher_lesson}/enrollments', teacher_cookie),
+            ('revenue_report', 'GET', '/reports/revenue', teacher_cookie),
+            ('lessons', 'GET', '/lessons', student_cookie),
+            ('lesson_search', 'GET', '/lessons/search?q=matcha', student_cookie),
+            ('lesson_by_id', 'GET', f'/lessons/{student_lesson}', student_cookie),
+            ('student_by_id', 'GET', f'/students/{s}', student_cookie),
+            ('lesson_by_student_id', 'GET', f'/students/{s}/lessons', student_cookie),
+            ('recommendations_by_student_id', 'GET', f'/students/{s}/recommendations', student_cookie),
+            ('payments_by_student_id', 'GET', f'/students/{s}/payments', student_cookie),
+            ('lessoncredithistory_by_student_id', 'GET', f'/students/{s}/lessoncredithistory', student_cookie),
+            ('feedback_by_student_and_lesson_id', 'GET', f'/students/{s}/lessons/{student_lesson}/feedback', student_cookie),
+            ('check_session', 'GET', '/check_session', student_cookie),
+            ('calendar_subscription', 'GET', '/calendar', student_cookie),
+            ('lesson_availability', 'GET', f'/lessons/availability?ids={teacher_lesson},{student_lesson}', student_cookie),
+            ('sync', 'GET', '/sync', student_cookie),
+        ]
+
+        results = {}
+
+        def record(name, result, allowed=()):
+            failed = {code: count for code, count in result['statuses'].items()
+                      if not code.startswith('2') and int(code) not in allowed}
+            if failed:
+                # an error path is not the endpoint's cost; leave it out
+                print(f'{name:42} discarded, non-2xx responses: {failed}')
+                return
+            result['flagged'] = (result['queries_per_request'] or 0) > QUERY_BUDGET
+            results[name] = result
+            print(f"{name:42} p50={result['p50_ms']:9.2f}ms p95={result['p95_ms']:9.2f}ms "
+                  f"p99={result['p99_ms']:9.2f}ms {result['throughput_rps']:8.1f} req/s "
+                  f"q/req={result['queries_per_request']} {result['statuses']}")
+            if result['flagged']:
+                print(f"  flagged: {result['queries_per_request']} queries per request, "
+                      f"budget is {QUERY_BUDGET}")
+
+        def wanted(name):
+            return not args.only or name in args.only
+
+        for name, method, path, cookie in reads:
+            if not wanted(name):
+                continue
+            status, _ = driver.request(method, path, cookie)
+            if not 200 <= status < 300:
+                print(f'{name:42} skipped, answered {status}')
+                continue
+            record(name, measure(registry, sequential(driver, method, path, cookie, args.requests)))
+
+        # writes, in an order where each step creates the rows the next one
+        # updates or deletes; every call gets a unique payload or target
+        n = args.requests
+        batch = {'requests': [{'path': f'/lessons/{student_lesson}'}, {'path': f'/students/{s}/lessons'},
+                              {'path': f'/students/{s}/recommendations'}, {'path': '/lessons/search?q=tea'}]}
+        first = datetime.combine(args.anchor + timedelta(days=800), datetime.min.time())
+        new_lessons = [{
+            'title': f'Bench lesson {i}', 'description': 'Benchmark writes', 'level': 1,
+            'start': (first + timedelta(hours=4 * i)).isoformat(),
+            'end': (first + timedelta(hours=4 * i + 1)).isoformat(), 'capacity': 5, 'price': 0,
+        } for i in range(n)]
+        writes = [
+            ('signup', lambda: [('POST', '/signup', None, {
+                'username': f'bench{i}', 'email': f'bench{i}@example.com', 'first_name': 'Bench',
+                'last_name': 'Student', 'password': seed.BULK_PASSWORD, 'role': 'student'}) for i in range(n)]),
+            ('login', lambda: [('POST', '/login', None, {
+                'username': student_username, 'password': seed.BULK_PASSWORD, 'role': 'student'})] * n),
+            ('logout', lambda: [('DELETE', '/logout', student_cookie, None)] * n),
+            ('teacher_by_id_patch', lambda: [
+                ('PATCH', f'/teachers/{t}', teacher_cookie, {'bio': f'Bio revision {i}'}) for i in range(n)]),
+            ('student_by_id_patch', lambda: [
+                ('PATCH', f'/students/{s}', student_cookie, {'first_name': f'Name{i}'}) for i in range(n)]),
+            ('lessons_post', lambda: [('POST', '/lessons', teacher_cookie, body) for body in new_lessons]),
+            ('lesson_by_id_patch', lambda: [
+                ('PATCH', f'/lessons/{lesson}', teacher_cookie, {'description': f'Revision {i}'})
+                for i, lesson in enumerate(bench_lessons())]),
+            ('enrollments_by_lesson_id_post', lambda: [
+                ('POST', f'/lessons/{lesson}/enrollments', student_cookie, {}) for lesson in bench_lessons()]),
+            ('enrollments_by_lesson_id_patch', lambda: [
+                ('PATCH', f'/lessons/{lesson}/enrollments', teacher_cookie,
+                 {'enrollments': [{'id': enrollment, 'comment': f'Bulk note {i}'}]})
+                for i, (lesson, enrollment) in enumerate(teacher_enrollments)]),
+            ('individual_enrollment_by_lesson_id_patch', lambda: [
+                ('PATCH', f'/lessons/{lesson}/enrollments/{enrollment}', teacher_cookie, {'comment': f'Note {i}'})
+                for i, (lesson, enrollment) in enumerate(teacher_enrollments)]),
+            ('feedback_by_id_patch', lambda: [
+                ('PATCH', f'/feedbacks/{feedback}', teacher_cookie, {'message': f'Edited {i}'})
+                for i, feedback in enumerate(feedback_ids)]),
+            ('individual_enrollment_by_lesson_id_delete', lambda: [
+                ('DELETE', f'/lessons/{lesson}/enrollments/{enrollment}', teacher_cookie, None)
+                for lesson, enrollment in bench_enrollments()]),
+            ('lesson_by_id_delete', lambda: [
+                ('DELETE', f'/lessons/{lesson}', teacher_cookie, None) for lesson in bench_lessons()]),
+            ('student_by_id_delete', lambda: [
+                ('DELETE', f'/students/{student}', teacher_cookie, None) for student in signed_up()]),
+            ('calendar_subscription_delete', lambda: [('DELETE', '/calendar', student_cookie, None)] * n),
+            ('batch', lambda: [('POST', '/batch', student_cookie, batch)] * n),
+        ]
+
+        def bench_lessons():
+            with app.app_context():
+                return db.session.scalars(db.select(Lesson.id).where(
+                    Lesson.title.startswith('Bench lesson')).order_by(Lesson.id)).all()
+
+        def bench_enrollments():
+            with app.app_context():
+                return db.session.execute(db.select(Enrollment.lesson_id, Enrollment.id).join(Lesson).where(
+                    Lesson.title.startswith('Bench lesson')).order_by(Enrollment.id)).all()
+
+        def signed_up():
+            with app.app_context():
+                return db.session.scalars(db.select(Student.id).where(
+                    Student.username.startswith('bench')).order_by(Student.id)).all()
+
+        for name, calls in writes:
+            if not wanted(name):
+                continue
+            calls = calls()
+            if not calls:
+                print(f'{name:42} skipped, nothing to write to')
+                continue
+            record(name, measure(registry, scripted(driver, calls)))
+
+        rng = random.Random(args.seed)
+        if wanted('enrollment_rush'):
+            start = (args.anchor + timedelta(days=400)).isoformat() + 'T10:00:00'
+            end = (args.anchor + timedelta(days=400)).isoformat() + 'T12:00:00'
+            driver.request('POST', '/lessons', teacher_cookie, {
+                'title': 'Rush lesson', 'description': 'Everyone wants this seat', 'level': 1,
+                'start': start, 'end': end, 'capacity': RUSH_CAPACITY, 'price': 0,
+            })
+            with app.app_context():
+                rush_lesson = db.session.scalar(db.select(Lesson.id).where(Lesson.title == 'Rush lesson'))
+            racers = rng.sample(range(1, student_count + 1), min(args.rush, student_count))
+            jobs = [
+                (lambda cookie=session_cookie(app, racer, 'student'):
+                 driver.request('POST', f'/lessons/{rush_lesson}/enrollments', cookie, {})[0])
+                for racer in racers
+            ]
+            result = measure(registry, concurrent(jobs, args.threads))
+            with app.app_context():
+                registered = db.session.scalar(db.select(db.func.count()).select_from(Enrollment).where(
+                    Enrollment.lesson_id == rush_lesson, Enrollment.status == 'registered'))
+            result['registered'], result['capacity'] = registered, RUSH_CAPACITY
+            record('enrollment_rush', result)
+            if registered > RUSH_CAPACITY:
+                print(f'  overbooked: {registered} registered for {RUSH_CAPACITY} seats')
+
+        upcoming = []
+        if wanted('browse_and_enroll'):
+            with app.app_context():
+                upcoming = db.session.scalars(db.select(Lesson.id).where(
+                    Lesson.start > datetime.now(), Lesson.is_full.is_(False)).limit(500)).all()
+            if not upcoming:
+                print(f"{'browse_and_enroll':42} skipped, no open lessons after today")
+        if upcoming:
+            jobs = []
+            for _ in range(args.requests * 4):
+                racer = rng.randint(1, student_count)
+                cookie = session_cookie(app, racer, 'student')
+                lesson_id = rng.choice(upcoming)
+                roll = rng.random()
+                if roll < 0.4:
+                    method, path, body = 'GET', f'/lessons/{lesson_id}', None
+                elif roll < 0.6:
+                    method, path, body = 'GET', f'/students/{racer}/lessons', None
+                elif roll < 0.8:
+                    method, path, body = 'GET', f'/students/{racer}/recommendations', None
+                elif roll < 0.9:
+                    method, path, body = 'GET', '/lessons/search?q=tea', None
+                else:
+                    method, path, body = 'POST', f'/lessons/{lesson_id}/enrollments', {}
+                jobs.append(lambda m=method, p=path, c=cookie, b=body: driver.request(m, p, c, b)[0])
+            # random students enrolling at random is expected to hit
+            # "Already enrolled" and "Insufficient credit" now and then
+            record('browse_and_enroll', measure(registry, concurrent(jobs, args.threads)), allowed=(400,))
+
+    if args.output:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {'commit': commit, 'driver': driver.name, 'scale': args.scale, 'seed': args.seed,
+                         'anchor': args.anchor.isoformat(), 'requests': args.requests, 'threads': args.threads,
+                         'python': sys.version.split()[0]},
+                'scenarios': results,
+            }, f, indent=2)
+        print(f'wrote {args.output}')
+
+
+def compare(base_path, head_path):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(head_path) as f:
+        head = json.load(f)
+    print(f"{base['meta']['commit']} -> {head['meta']['commit']}")
+    print(f"{'scenario':42} {'p50':>18} {'p95':>18} {'req/s':>18} {'q/req':>12}")
+    for name, after in head['scenarios'].items():
+        before = base['scenarios'].get(name)
+        if before is None:
+            continue
+
+        def delta(key, fmt):
+            a, b = before[key], after[key]
+            if a is None or b is None:
+                return f'{str(b):>18}'
+            change = f'{(b - a) / a * 100:+.0f}%' if a else ''
+            return f'{format(b, fmt):>11} {change:>6}'
+
+        queries = str(after['queries_per_request']) + (' !' if after.get('flagged') else '')
+        print(f"{name:42} {delta('p50_ms', '.2f')} {delta('p95_ms', '.2f')} "
+              f"{delta('throughput_rps', '.1f')} {queries:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# Hot-path latency before and after archival. Seeds a scratch database with
+# the bulk seeder, ages most lessons by up to a few years so the hot tables
+# look like a long-running install, then times the lesson list, a teacher's
+# lessons, the blackout check in POST /lessons and Lesson.update_is_full.
+# Runs `archive.archive` and times the same paths again.
+#
+#   python benchmarks/archive_bench.py --scale 20 --history 0.9 --days 30
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def timed(fn, count):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return {'p50_ms': round(statistics.median(latencies) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3)}
+
+
+def age_lessons(db, Lesson, history):
+    # push all but every n-th lesson back by 30 days to ~3 years, keyed on
+    # the id so the same seed always ages the same lessons
+    from sqlalchemy import func, update
+    keep = max(2, round(1 / (1 - history))) if history < 1 else 0
+    shift = func.printf('-%d days', 30 + Lesson.id * 7919 % 1065)
+    aged = update(Lesson).values(start=func.datetime(Lesson.start, shift), end=func.datetime(Lesson.end, shift))
+    if keep:
+        aged = aged.where(Lesson.id % keep != 0)
+    db.session.execute(aged)
+    db.session.commit()
+
+
+def hot_paths(app, db, models, requests):
+    from sqlalchemy import func, select
+    Lesson, Enrollment = models
+    client = app.test_client(use_cookies=False)
+    serializer = app.session_interface.get_signing_serializer(app)
+
+    with app.app_context():
+        teacher_id = db.session.scalar(
+            select(Lesson.teacher_id).group_by(Lesson.teacher_id).order_by(func.count().desc()).limit(1))
+        clash = db.session.scalar(select(Lesson).where(Lesson.teacher_id == teacher_id).order_by(Lesson.id.desc()).limit(1))
+        student_cookie = serializer.dumps({'user_id': 1, 'role': 'student'})
+        teacher_cookie = serializer.dumps({'user_id': teacher_id, 'role': 'teacher'})
+        new_lesson = {'title': 'Bench', 'description': 'clashes with an existing lesson', 'level': 1,
+                      'start': clash.start.isoformat(), 'end': clash.end.isoformat(), 'capacity': 5, 'price': 1}
+        lesson_id = clash.id
+
+    def get(path, cookie):
+        def call():
+            response = client.get(path, headers={'Cookie': f'session={cookie}'})
+            assert response.status_code == 200, response.status_code
+        return call
+
+    def blackout():
+        response = client.post('/lessons', json=new_lesson, headers={'Cookie': f'session={teacher_cookie}'})
+        assert response.status_code == 409, response.status_code
+
+    def update_is_full():
+        with app.app_context():
+            db.session.get(Lesson, lesson_id).update_is_full()
+            db.session.rollback()
+
+    return {
+        'lessons': timed(get('/lessons', student_cookie), requests),
+        'lessons_by_teacher_id': timed(get(f'/teachers/{teacher_id}/lessons', teacher_cookie), requests),
+        'lessons_post_blackout': timed(blackout, requests),
+        'update_is_full': timed(update_is_full, requests),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--history', type=float, default=0.9, help='share of lessons aged into the past')
+    parser.add_argument('--days', type=int, default=30, help='archive lessons that ended this many days ago')
+    parser.add_argument('--requests', type=int, default=20, help='timed calls per hot path')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'archive.db')}"
+        os.environ.setdefault('SECRET_KEY', 'archive-bench')
+        import archive
+        import seed
+        from app import create_app
+        from config import db
+        from models import Lesson, Enrollment
+
+        app = create_app()
+        app.config['NPLUSONE_ENABLED'] = False
+        with app.app_context():
+            db.create_all()
+            counts = seed.bulk_seed(
+                args.seed,
+                max(1, round(seed.NUM_STUDENTS * args.scale)),
+                max(1, round(seed.NUM_TEACHERS * args.scale)),
+                max(1, round(seed.NUM_LESSONS * args.scale)),
+                round(seed.NUM_ENROLLMENTS * args.scale),
+                date.today(),
+            )
+            age_lessons(db, Lesson, args.history)
+            print('seeded {} students, {} teachers, {} lessons, {} enrollments'.format(*counts))
+
+        models = (Lesson, Enrollment)
+        results = {}
+        with app.app_context():
+            results['before'] = {'tables': archive.table_sizes()}
+        results['before']['paths'] = hot_paths(app, db, models, args.requests)
+
+        with app.app_context():
+            started = time.perf_counter()
+            moved = sum(archive.archive(args.days))
+            elapsed = time.perf_counter() - started
+            db.session.execute(db.text('VACUUM'))
+            results['after'] = {'tables': archive.table_sizes()}
+        print(f'archived {moved} lessons in {elapsed:.2f}s')
+        results['after']['paths'] = hot_paths(app, db, models, args.requests)
+
+    for table, before in results['before']['tables'].items():
+        print(f"{table:22} {before:8} -> {results['after']['tables'][table]:8}")
+    print(f"{'path':24} {'p50 before':>11} {'p50 after':>11} {'p95 before':>11} {'p95 after':>11}")
+    for path, before in results['before']['paths'].items():
+        after = results['after']['paths'][path]
+        print(f"{path:24} {before['p50_ms']:9.2f}ms {after['p50_ms']:9.2f}ms "
+              f"{before['p95_ms']:9.2f}ms {after['p95_ms']:9.2f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
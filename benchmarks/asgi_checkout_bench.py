@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Concurrent checkouts per worker against the local Stripe stub: the sync
+# Flask route on a fixed number of worker threads versus the ASGI adapter
+# with the same number of WSGI threads. stripe has no async client, so a
+# checkout holds a thread either way and both should top out at about
+# threads / latency checkouts per second. The ASGI app is called in-process,
+# so no ASGI server needs to be installed.
+#
+#   python benchmarks/asgi_checkout_bench.py --checkouts 200 --latency 0.2 --threads 4
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stripe_stub import serve
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def report(name, latencies, elapsed):
+    print(f'{name:10} n={len(latencies):5} '
+          f'p50={statistics.median(latencies) * 1000:8.1f}ms '
+          f'p95={percentile(latencies, 95) * 1000:8.1f}ms '
+          f'throughput {len(latencies) / elapsed:7.1f} checkouts/s')
+
+
+def payload(n):
+    return {'price': 'price_stub', 'quantity': 1 + n % 5, 'metadata': {'id': n}}
+
+
+def run_sync(app, checkouts, threads):
+    client = app.test_client()
+
+    def checkout(n):
+        started = time.perf_counter()
+        response = client.post('/create-checkout-session', json=payload(n))
+        assert response.status_code == 200, response.get_json()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(checkout, range(checkouts)))
+    return latencies, time.perf_counter() - started
+
+
+def run_async(asgi_app, checkouts, concurrency, offset):
+    async def checkout(n, limit):
+        async with limit:
+            body = json.dumps(payload(n)).encode('utf-8')
+            scope = {'type': 'http', 'method': 'POST', 'path': '/create-checkout-session',
+                     'query_string': b'', 'headers': [(b'content-type', b'application/json')]}
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            async def send(message):
+                sent.append(message)
+
+            started = time.perf_counter()
+            await asgi_app(scope, receive, send)
+            assert sent[0]['status'] == 200, sent
+            return time.perf_counter() - started
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(checkout(offset + n, limit) for n in range(checkouts)))
+
+    started = time.perf_counter()
+    latencies = asyncio.run(main())
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkouts', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--threads', type=int, default=4, help='worker threads of one sync or ASGI worker')
+    parser.add_argument('--concurrency', type=int, default=64, help='in-flight requests on the ASGI worker')
+    parser.add_argument('--port', type=int, default=12111)
+    args = parser.parse_args()
+
+    stub = serve(args.port, args.latency)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    os.environ['STRIPE_API_BASE'] = f'http://127.0.0.1:{args.port}'
+    os.environ['STRIPE_POOL_SIZE'] = str(args.threads)
+    os.environ.setdefault('STRIPE_SECRET_KEY', 'sk_test_stub')
+    os.environ.setdefault('DOMAIN', 'http://localhost:3000')
+    os.environ.setdefault('SECRET_KEY', 'asgi-bench')
+
+    # the request hooks read the change log, so the app needs a database
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp.name, 'checkout.db')}"
+    from app import create_app
+    from asgi import ASGIAdapter
+    from config import db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+    print(f'stub latency {args.latency * 1000:.0f}ms, {args.checkouts} checkouts')
+    latencies, elapsed = run_sync(app, args.checkouts, args.threads)
+    report(f'sync x{args.threads}', latencies, elapsed)
+    asgi_app = ASGIAdapter(app, threads=args.threads)
+    latencies, elapsed = run_async(asgi_app, args.checkouts, args.concurrency, args.checkouts)
+    report('asgi', latencies, elapsed)
+    stub.shutdown()
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
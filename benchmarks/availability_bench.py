@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Polling cost of seat availability: GET /lessons/<id> (full ORM graph)
+# versus GET /lessons/availability for one id and for a page of ids, with
+# the short response cache on and off. Drives the app through the Flask
+# test client on a bulk-seeded scratch database.
+#
+#   python benchmarks/availability_bench.py --scale 10 --requests 500 --ids 200
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(client, path, cookie, count):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(count):
+        t = time.perf_counter()
+        response = client.get(path, headers={'Cookie': f'session={cookie}'})
+        assert response.status_code == 200, response.status_code
+        latencies.append(time.perf_counter() - t)
+    return count / (time.perf_counter() - started), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--ids', type=int, default=200, help='lessons per availability call in the page scenario')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'availability.db')}"
+        os.environ.setdefault('SECRET_KEY', 'availability-bench')
+        import availability
+        import seed
+        from app import create_app
+        from config import db
+        from models import Lesson, Enrollment
+        from sqlalchemy import func, select
+
+        app = create_app()
+        app.config['NPLUSONE_ENABLED'] = False
+        with app.app_context():
+            db.create_all()
+            counts = seed.bulk_seed(
+                args.seed,
+                max(1, round(seed.NUM_STUDENTS * args.scale)),
+                max(1, round(seed.NUM_TEACHERS * args.scale)),
+                max(1, round(seed.NUM_LESSONS * args.scale)),
+                round(seed.NUM_ENROLLMENTS * args.scale),
+                date.today(),
+            )
+            print('seeded {} students, {} teachers, {} lessons, {} enrollments'.format(*counts))
+            busiest = db.session.scalar(
+                select(Enrollment.lesson_id).group_by(Enrollment.lesson_id).order_by(func.count().desc()).limit(1))
+            page = db.session.scalars(select(Lesson.id).order_by(Lesson.id).limit(args.ids)).all()
+
+        client = app.test_client(use_cookies=False)
+        cookie = app.session_interface.get_signing_serializer(app).dumps({'user_id': 1, 'role': 'student'})
+        ids = ','.join(map(str, page))
+        scenarios = [
+            ('lesson_by_id', f'/lessons/{busiest}', None),
+            ('availability 1 id, no cache', f'/lessons/availability?ids={busiest}', 0),
+            ('availability 1 id, cached', f'/lessons/availability?ids={busiest}', None),
+            (f'availability {len(page)} ids, no cache', f'/lessons/availability?ids={ids}', 0),
+            (f'availability {len(page)} ids, cached', f'/lessons/availability?ids={ids}', None),
+        ]
+
+        baseline = None
+        print(f"{'scenario':34} {'req/s':>9} {'p50':>9} {'p95':>9} {'vs lesson_by_id':>16}")
+        for name, path, ttl in scenarios:
+            availability.counts_cache.clear()
+            availability.counts_cache.ttl = availability.CACHE_TTL if ttl is None else ttl
+            run(client, path, cookie, min(20, args.requests))
+            rate, latencies = run(client, path, cookie, args.requests)
+            baseline = baseline or rate
+            print(f'{name:34} {rate:9.0f} {statistics.median(latencies) * 1000:7.2f}ms '
+                  f'{percentile(latencies, 95) * 1000:7.2f}ms {rate / baseline:15.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Drives /create-checkout-session and /checkout-session against the local
+# Stripe stub, so no network access or Stripe account is needed.
+#
+#   python benchmarks/checkout_load.py --requests 500 --threads 16 --latency 0.05
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stripe_stub import serve
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--port', type=int, default=12111)
+    args = parser.parse_args()
+
+    stub = serve(args.port, args.latency)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    os.environ['STRIPE_API_BASE'] = f'http://127.0.0.1:{args.port}'
+    os.environ.setdefault('STRIPE_SECRET_KEY', 'sk_test_stub')
+    os.environ.setdefault('DOMAIN', 'http://localhost:3000')
+
+    from app import create_app
+    app = create_app()
+
+    created, retrieved = [], []
+    counter = iter(range(args.requests))
+    counter_lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            started = time.perf_counter()
+            response = client.post('/create-checkout-session', json={
+                'price': 'price_stub', 'quantity': 1 + n % 5, 'metadata': {'id': n},
+            })
+            created.append(time.perf_counter() - started)
+            session_id = response.get_json()['url'].rsplit('/', 1)[-1]
+            # a completion page polls the same session several times
+            for _ in range(3):
+                started = time.perf_counter()
+                client.get(f'/checkout-session?sessionId={session_id}')
+                retrieved.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    for name, samples in (('create', created), ('retrieve', retrieved)):
+        print(f'{name:9} n={len(samples):5} '
+              f'p50={statistics.median(samples) * 1000:7.2f}ms '
+              f'p95={percentile(samples, 95) * 1000:7.2f}ms '
+              f'p99={percentile(samples, 99) * 1000:7.2f}ms')
+    print(f'throughput {(len(created) + len(retrieved)) / elapsed:.1f} req/s')
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
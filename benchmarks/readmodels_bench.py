@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# ORM to_dict() listings versus the Core read models in readmodels.py, for
+# the lesson list (with and without archived lessons), a teacher's lessons,
+# the teacher list and a student's payments and credit history. Checks both
+# paths produce the same JSON, then reports latency and tracemalloc
+# allocations (blocks and peak bytes) per call on a bulk-seeded database.
+#
+#   python benchmarks/readmodels_bench.py --scale 5 --repeat 5
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(fn, repeat, db):
+    latencies = []
+    for _ in range(repeat):
+        db.session.expire_all()
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+        db.session.rollback()
+    db.session.expire_all()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = fn()
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.rollback()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    return result, statistics.median(latencies), blocks, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'readmodels.db')}"
+        os.environ.setdefault('SECRET_KEY', 'readmodels-bench')
+        import archive
+        import readmodels
+        import seed
+        from app import create_app
+        from config import db
+        from models import Teacher, Lesson, Payment, LessonCreditHistory, ArchivedLesson
+        from sqlalchemy import func, insert, select
+
+        app = create_app()
+        app.config['NPLUSONE_ENABLED'] = False
+        with app.app_context():
+            db.create_all()
+            counts = seed.bulk_seed(
+                args.seed,
+                max(1, round(seed.NUM_STUDENTS * args.scale)),
+                max(1, round(seed.NUM_TEACHERS * args.scale)),
+                max(1, round(seed.NUM_LESSONS * args.scale)),
+                round(seed.NUM_ENROLLMENTS * args.scale),
+                date.today(),
+            )
+            print('seeded {} students, {} teachers, {} lessons, {} enrollments'.format(*counts))
+            # the bulk seeder writes no payments or credit history
+            rng = random.Random(args.seed)
+            now = datetime.now().replace(microsecond=0)
+            db.session.execute(insert(Payment.__table__), [
+                {'student_id': rng.randint(1, counts[0]), 'lesson_credit': Decimal(rng.randint(1, 40) * 10),
+                 'created_at': now - timedelta(days=rng.randint(0, 700))} for _ in range(counts[0] * 3)])
+            db.session.execute(insert(LessonCreditHistory.__table__), [
+                {'student_id': rng.randint(1, counts[0]), 'old_credit': Decimal(rng.randint(0, 300)),
+                 'new_credit': Decimal(rng.randint(0, 300)), 'memo': 'bench',
+                 'created_at': now - timedelta(days=rng.randint(0, 700))} for _ in range(counts[0] * 3)])
+            db.session.commit()
+            for _ in archive.archive(days=15):
+                pass
+            print(f'archived {db.session.scalar(select(func.count()).select_from(ArchivedLesson))} lessons')
+
+            teacher_id = db.session.scalar(
+                select(Lesson.teacher_id).group_by(Lesson.teacher_id).order_by(func.count().desc()).limit(1))
+            student_id = db.session.scalar(
+                select(LessonCreditHistory.student_id).group_by(LessonCreditHistory.student_id)
+                .order_by(func.count().desc()).limit(1))
+
+            scenarios = [
+                ('lessons',
+                 lambda: [lesson.to_dict() for lesson in Lesson.query.all()],
+                 lambda: readmodels.lesson_list()),
+                ('lessons + archived',
+                 lambda: [lesson.to_dict() for lesson in Lesson.query.all() + ArchivedLesson.query.all()],
+                 lambda: readmodels.lesson_list(archived=True)),
+                ('lessons by teacher',
+                 lambda: [lesson.to_dict() for lesson in Lesson.query.filter_by(teacher_id=teacher_id)],
+                 lambda: readmodels.lesson_list(teacher_id)),
+                ('teachers',
+                 lambda: [teacher.to_dict() for teacher in Teacher.query.all()],
+                 lambda: readmodels.teacher_list()),
+                ('payments by student',
+                 lambda: [payment.to_dict() for payment in Payment.query.filter_by(student_id=student_id)],
+                 lambda: readmodels.payment_list(student_id)),
+                ('credit history by student',
+                 lambda: [record.to_dict() for record in LessonCreditHistory.query.filter_by(student_id=student_id)],
+                 lambda: readmodels.credit_history_list(student_id)),
+            ]
+
+            print(f"{'scenario':28} {'path':5} {'p50':>10} {'blocks':>10} {'peak':>10} {'speedup':>8}")
+            for name, orm, core in scenarios:
+                orm_result, orm_latency, orm_blocks, orm_peak = measure(orm, args.repeat, db)
+                core_result, core_latency, core_blocks, core_peak = measure(core, args.repeat, db)
+                assert json.dumps(orm_result, sort_keys=True) == json.dumps(core_result, sort_keys=True), name
+                for path, latency, blocks, peak in (('orm', orm_latency, orm_blocks, orm_peak),
+                                                    ('core', core_latency, core_blocks, core_peak)):
+                    speedup = f'{orm_latency / core_latency:7.1f}x' if path == 'core' else ''
+                    print(f'{name:28} {path:5} {latency * 1000:8.1f}ms {blocks:10} '
+                          f'{peak / 1024 / 1024:8.1f}MB {speedup:>8}')
+
+
+if __name__ == '__main__':
+    main()
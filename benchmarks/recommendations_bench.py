@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Times the recommendation scorer on a bulk-seeded database: loading the
+# candidate lesson columns, scoring every student against them, and a full
+# refresh_all() including the writes. Reports the per-candidate cost of
+# score(), the number the pure-Python scorer is judged by.
+#
+#   python benchmarks/recommendations_bench.py --scale 50 --repeat 3
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - started)
+    return result, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'recommendations.db')}"
+        os.environ.setdefault('SECRET_KEY', 'recommendations-bench')
+        import recommendations
+        import seed
+        from app import create_app
+        from config import db
+        from models import Student
+        from sqlalchemy import select
+
+        app = create_app()
+        app.config['NPLUSONE_ENABLED'] = False
+        with app.app_context():
+            db.create_all()
+            counts = seed.bulk_seed(
+                args.seed,
+                max(1, round(seed.NUM_STUDENTS * args.scale)),
+                max(1, round(seed.NUM_TEACHERS * args.scale)),
+                max(1, round(seed.NUM_LESSONS * args.scale)),
+                round(seed.NUM_ENROLLMENTS * args.scale),
+                date.today(),
+            )
+            db.session.commit()
+            print('seeded {} students, {} teachers, {} lessons, {} enrollments'.format(*counts))
+
+            now = datetime.now()
+            student_ids = db.session.scalars(select(Student.id).order_by(Student.id)).all()
+            lessons, load = timed(lambda: recommendations.CandidateLessons(now), args.repeat)
+            profiles = recommendations.load_profiles(student_ids)
+            _, scoring = timed(lambda: [recommendations.score(profile, lessons) for profile in profiles.values()],
+                               args.repeat)
+            _, refresh = timed(recommendations.refresh_all, args.repeat)
+
+            pairs = len(profiles) * len(lessons)
+            print(f'{len(lessons)} candidate lessons, {len(profiles)} students, {pairs} pairs')
+            print(f'load candidates   {load * 1000:8.1f}ms')
+            print(f'score students    {scoring * 1000:8.1f}ms  {scoring / max(pairs, 1) * 1e9:6.0f}ns per pair')
+            print(f'refresh_all       {refresh * 1000:8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Compares the FTS5 lesson search (first page plus total, as served by
+# /lessons/search) against the same page and total computed with LIKE scans,
+# over a catalogue built from the seed titles and descriptions.
+#
+#   python benchmarks/search_bench.py --lessons 100000
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assets.lesson_content import lesson_content
+from assets.titles import lesson_titles
+from search import LESSON_FTS, LESSON_SEARCH, LESSON_SEARCH_COUNT, match_expression
+
+QUERIES = ['matcha', 'kimono', 'chashaku', 'tea room', 'seasonal sweets', 'bow', 'whisk']
+TOPICS = ['matcha', 'kimono', 'chashaku', 'natsume', 'chawan', 'wagashi', 'tatami', 'sencha',
+          'hishaku', 'fukusa', 'kensui', 'mizusashi', 'furo', 'ro', 'chabana', 'kaiseki']
+
+
+def build(path, count, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE lessons (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, description VARCHAR NOT NULL)")
+    for statement in LESSON_FTS:
+        conn.execute(statement)
+    rows = (
+        (i, rng.choice(lesson_titles),
+         f"{rng.choice(lesson_content)} Featuring {rng.choice(TOPICS)}.")
+        for i in range(1, count + 1)
+    )
+    conn.executemany("INSERT INTO lessons VALUES (?, ?, ?)", rows)
+    conn.commit()
+    return conn
+
+
+def timed(conn, queries, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for sql, params in queries:
+            conn.execute(sql, params).fetchall()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def positional(clause):
+    sql = str(clause)
+    for name in (':match', ':limit', ':offset'):
+        sql = sql.replace(name, '?')
+    return sql
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lessons', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        conn = build(os.path.join(tmp, 'search.db'), args.lessons, args.seed)
+        print(f'seeded {args.lessons} lessons in {time.perf_counter() - started:.1f}s')
+
+        search_sql, count_sql = positional(LESSON_SEARCH), positional(LESSON_SEARCH_COUNT)
+        like_where = "title LIKE ? OR description LIKE ?"
+        like_page = f"SELECT id FROM lessons WHERE {like_where} ORDER BY id LIMIT 20"
+        like_count = f"SELECT count(*) FROM lessons WHERE {like_where}"
+        print(f"{'query':18} {'matches':>8} {'fts5 p50':>10} {'like p50':>10}")
+        for q in QUERIES:
+            match = match_expression(q)
+            matches = conn.execute(count_sql, (match,)).fetchone()[0]
+            fts = timed(conn, [(search_sql, (match, 20, 0)), (count_sql, (match,))], args.repeat)
+            pattern = (f'%{q}%', f'%{q}%')
+            like = timed(conn, [(like_page, pattern), (like_count, pattern)], args.repeat)
+            print(f'{q:18} {matches:8} {fts:8.2f}ms {like:8.2f}ms')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
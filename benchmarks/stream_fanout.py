@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# Fan-out of /lessons/stream on one ASGI worker: opens N idle SSE
+# subscribers in-process, then enrolls students through the WSGI app and
+# measures how long each availability event takes to reach every
+# subscriber, plus memory held per idle subscriber.
+#
+#   python benchmarks/stream_fanout.py --subscribers 5000 --enrollments 5
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def subscribe(asgi_app, cookie, lesson_id, received, closed):
+    scope = {'type': 'http', 'method': 'GET', 'path': '/lessons/stream',
+             'query_string': f'ids={lesson_id}'.encode(), 'headers': [(b'cookie', f'session={cookie}'.encode())]}
+    arrivals = []
+    received.append(arrivals)
+
+    async def receive():
+        await closed.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.body' and message['body'].startswith(b'data:'):
+            arrivals.append(time.perf_counter())
+
+    await asgi_app(scope, receive, send)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--enrollments', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'stream.db')}"
+        os.environ.setdefault('SECRET_KEY', 'stream-bench')
+        import seed
+        from app import create_app
+        from asgi import ASGIAdapter
+        from config import db
+        from models import Student, Lesson
+
+        app = create_app()
+        app.config['NPLUSONE_ENABLED'] = False
+        with app.app_context():
+            db.create_all()
+            seed.bulk_seed(args.seed, args.enrollments * 4, 2, 4, 0, date.today())
+            lesson = Lesson.query.filter(Lesson.start > datetime.now()).first() or Lesson.query.first()
+            lesson.start, lesson.capacity = datetime(2100, 1, 1, 10), 5
+            students = [student.id for student in Student.query.limit(args.enrollments)]
+            for student in Student.query:
+                student.lesson_credit = 1000
+            db.session.commit()
+            lesson_id = lesson.id
+
+        serializer = app.session_interface.get_signing_serializer(app)
+        student_cookie = serializer.dumps({'user_id': students[0], 'role': 'student'})
+        client = app.test_client(use_cookies=False)
+        asgi_app = ASGIAdapter(app)
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            closed = asyncio.Event()
+            received = []
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            tasks = [asyncio.ensure_future(subscribe(asgi_app, student_cookie, lesson_id, received, closed))
+                     for _ in range(args.subscribers)]
+            while sum(1 for arrivals in received if arrivals) < args.subscribers:
+                await asyncio.sleep(0.05)
+            opened = time.perf_counter() - started
+            held = tracemalloc.get_traced_memory()[0] - baseline
+            tracemalloc.stop()
+            print(f'{args.subscribers} subscribers open in {opened:.2f}s, '
+                  f'{held / args.subscribers / 1024:.1f} KiB each')
+
+            delays = []
+            for n, student_id in enumerate(students, start=2):
+                cookie = serializer.dumps({'user_id': student_id, 'role': 'student'})
+
+                def enroll():
+                    response = client.post(f'/lessons/{lesson_id}/enrollments', json={},
+                                           headers={'Cookie': f'session={cookie}'})
+                    assert response.status_code == 201, response.get_json()
+
+                sent = time.perf_counter()
+                await loop.run_in_executor(None, enroll)
+                while sum(1 for arrivals in received if len(arrivals) >= n) < args.subscribers:
+                    await asyncio.sleep(0.001)
+                delays.append([arrivals[n - 1] - sent for arrivals in received])
+                last = max(delays[-1])
+                print(f'enrollment {n - 1}: all {args.subscribers} subscribers notified in {last * 1000:.1f}ms')
+
+            closed.set()
+            await asyncio.gather(*tasks)
+            flat = [delay for batch in delays for delay in batch]
+            print(f'delivery p50={statistics.median(flat) * 1000:.1f}ms '
+                  f'p95={percentile(flat, 95) * 1000:.1f}ms max={max(flat) * 1000:.1f}ms')
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# Minimal offline stand-in for the Stripe checkout API.
+#
+#   python benchmarks/stripe_stub.py --port 12111 --latency 0.2
+#   STRIPE_API_BASE=http://localhost:12111 STRIPE_SECRET_KEY=sk_test_stub python app.py
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+sessions = {}
+idempotent_responses = {}
+lock = threading.Lock()
+
+
+def unflatten(pairs):
+    # metadata[id]=1&line_items[0][price]=x -> {'metadata': {'id': '1'}, ...}
+    result = {}
+    for key, value in pairs:
+        parts = key.replace(']', '').split('[')
+        node = result
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return result
+
+
+def checkout_session(params):
+    session_id = 'cs_test_' + uuid.uuid4().hex
+    line_items = params.get('line_items', {})
+    quantity = sum(int(item.get('quantity', 1)) for item in line_items.values())
+    return {
+        'id': session_id,
+        'object': 'checkout.session',
+        'amount_total': quantity * 100,
+        'currency': 'usd',
+        'metadata': params.get('metadata', {}),
+        'mode': params.get('mode', 'payment'),
+        'payment_status': 'unpaid',
+        'status': 'open',
+        'success_url': params.get('success_url'),
+        'cancel_url': params.get('cancel_url'),
+        'url': 'https://checkout.stripe.test/pay/' + session_id,
+        'created': int(time.time()),
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        time.sleep(self.latency)
+        if self.path != '/v1/checkout/sessions':
+            return self.send_json(404, {'error': {'message': 'Unrecognized request URL'}})
+
+        key = self.headers.get('Idempotency-Key')
+        with lock:
+            if key and key in idempotent_responses:
+                return self.send_json(200, idempotent_responses[key])
+            created = checkout_session(unflatten(parse_qsl(body)))
+            sessions[created['id']] = created
+            if key:
+                idempotent_responses[key] = created
+        self.send_json(200, created)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        prefix = '/v1/checkout/sessions/'
+        session_id = self.path[len(prefix):] if self.path.startswith(prefix) else None
+        found = sessions.get(session_id)
+        if not found:
+            return self.send_json(404, {'error': {
+                'type': 'invalid_request_error',
+                'message': f'No such checkout.session: {session_id}',
+            }})
+        self.send_json(200, found)
+
+
+def serve(port=12111, latency=0.0):
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline Stripe checkout stub')
+    parser.add_argument('--port', type=int, default=12111)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    args = parser.parse_args()
+    server = serve(args.port, args.latency)
+    print(f'Stripe stub listening on http://127.0.0.1:{args.port} (latency {args.latency}s)')
+    server.serve_forever()
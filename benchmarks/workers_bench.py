@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# Pre-forks 1..N workers from one app (as gunicorn --preload does) sharing a
+# listening socket, then measures throughput of a read endpoint against a
+# scratch SQLite database. The parent opens a pooled connection before
+# forking, so every worker exercises the after-fork engine disposal.
+#
+#   python benchmarks/workers_bench.py --workers 1 2 4 --clients 8 --duration 5
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build(app, teachers, lessons):
+    from sqlalchemy import insert
+    from config import db
+    from models import Teacher, Lesson
+
+    now = datetime.now()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Teacher), [
+            {'username': f'teacher{i}', 'email': f'teacher{i}@example.com',
+             'first_name': 'Tea', 'last_name': f'Teacher {i}'}
+            for i in range(1, teachers + 1)
+        ])
+        db.session.execute(insert(Lesson), [
+            {'title': f'Lesson {i}', 'description': 'Usucha temae', 'level': 1 + i % 5,
+             'start': now + timedelta(days=i), 'end': now + timedelta(days=i, hours=2),
+             'capacity': 8, 'price': 40, 'teacher_id': 1 + i % teachers}
+            for i in range(lessons)
+        ])
+        db.session.commit()
+        # leave a pooled connection behind for the workers to inherit
+        db.session.execute(db.select(Teacher.id)).all()
+
+
+def serve(app, listener):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server(*listener.getsockname(), app, fd=listener.fileno())
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    server.serve_forever()
+
+
+def hammer(args):
+    url, deadline = args
+    count = errors = 0
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            count += 1
+        except OSError:
+            errors += 1
+    return count, errors
+
+
+def run(app, listener, workers, clients, duration, url):
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            serve(app, listener)
+        pids.append(pid)
+    time.sleep(0.3)
+
+    deadline = time.time() + duration
+    with multiprocessing.get_context('fork').Pool(clients) as pool:
+        results = pool.map(hammer, [(url, deadline)] * clients)
+
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--teachers', type=int, default=20)
+    parser.add_argument('--lessons', type=int, default=200)
+    parser.add_argument('--path', default='/teachers')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'workers.db')}"
+        from app import create_app
+        app = create_app()
+        build(app, args.teachers, args.lessons)
+
+        listener = socket.socket()
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(128)
+        url = f'http://127.0.0.1:{listener.getsockname()[1]}{args.path}'
+
+        print(f'{os.cpu_count()} cpus, {args.clients} clients, GET {args.path}')
+        baseline = None
+        for workers in args.workers:
+            count, errors = run(app, listener, workers, args.clients, args.duration, url)
+            throughput = count / args.duration
+            baseline = baseline or throughput
+            print(f'{workers:3} workers {throughput:9.1f} req/s '
+                  f'{throughput / baseline:5.2f}x errors={errors}')
+        listener.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache:
+    def __init__(self, ttl, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TaggedCache:
+    # Entries live until one of their tags is invalidated, e.g. every
+    # dashboard tagged ('teacher', 3) is dropped when that teacher's
+    # enrollments change, or until their ttl runs out, which bounds how stale
+    # an entry can get if an invalidation is missed.
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._keys_by_tag = {}
+        self._lock = threading.Lock()
+        # bumped on every invalidation so a value computed before a
+        # concurrent write is not stored after that write's invalidation
+        self.generation = 0
+        tagged_caches.append(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if item[2] is not None and item[2] <= time.monotonic():
+                self._discard(key)
+                return default
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, tags, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._discard(key)
+            expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+            self._data[key] = (tuple(tags), value, expires_at)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._discard(next(iter(self._data)))
+
+    def invalidate(self, tag):
+        with self._lock:
+            self.generation += 1
+            for key in list(self._keys_by_tag.get(tag, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+            self._keys_by_tag.clear()
+
+    def _discard(self, key):
+        item = self._data.pop(key, None)
+        if item is None:
+            return
+        for tag in item[0]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+tagged_caches = []
+
+
+def invalidate_tags(tags):
+    for cache in tagged_caches:
+        for tag in tags:
+            cache.invalidate(tag)
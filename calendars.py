@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+import hashlib
+import secrets
+
+from sqlalchemy import literal, select
+
+from cache import TaggedCache
+from config import db
+from models import Lesson, Enrollment, CalendarToken
+
+FEED_TTL = 300
+
+feeds = TaggedCache(maxsize=2048, ttl=FEED_TTL)
+
+
+def token_for(role, user_id):
+    calendar_token = CalendarToken.query.filter_by(role=role, user_id=user_id).first()
+    if calendar_token is None:
+        calendar_token = CalendarToken(role=role, user_id=user_id, token=secrets.token_urlsafe(24))
+        db.session.add(calendar_token)
+        db.session.flush()
+    return calendar_token.token
+
+
+def revoke_token(role, user_id):
+    CalendarToken.query.filter_by(role=role, user_id=user_id).delete()
+    db.session.flush()
+    feeds.invalidate((role, user_id))
+
+
+def owner_of(token):
+    return db.session.execute(
+        select(CalendarToken.role, CalendarToken.user_id).where(CalendarToken.token == token)
+    ).first()
+
+
+def _escape(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line):
+    # RFC 5545 lines are at most 75 octets; continuation lines start with a space
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        size = 75 if not parts else 74
+        while size < len(encoded) and (encoded[size] & 0xC0) == 0x80:
+            size -= 1
+        parts.append(encoded[:size].decode('utf-8'))
+        encoded = encoded[size:]
+    return '\r\n '.join(parts)
+
+
+@lru_cache(maxsize=8192)
+def _vevent(lesson_id, title, description, start, end, status):
+    # everything after DTSTAMP, which is stamped per feed in render_feed
+    summary = title if status != 'waitlisted' else f'{title} (waitlisted)'
+    lines = [
+        f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}",
+        f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}",
+        f'SUMMARY:{_escape(summary)}',
+        f'DESCRIPTION:{_escape(description)}',
+        'END:VEVENT',
+    ]
+    return '\r\n'.join(_fold(line) for line in lines)
+
+
+def _lessons(role, user_id):
+    columns = (Lesson.id, Lesson.title, Lesson.description, Lesson.start, Lesson.end)
+    if role == 'teacher':
+        stmt = select(*columns, literal(None).label('status')).where(Lesson.teacher_id == user_id)
+    else:
+        stmt = (select(*columns, Enrollment.status)
+                .join(Enrollment, Enrollment.lesson_id == Lesson.id)
+                .where(Enrollment.student_id == user_id))
+    return db.session.execute(stmt.order_by(Lesson.start)).all()
+
+
+def render_feed(role, user_id):
+    rows = _lessons(role, user_id)
+    vevents = [(row.id, _vevent(*row)) for row in rows]
+    # DTSTAMP is when this feed was generated, in UTC
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    events = [f'BEGIN:VEVENT\r\nUID:lesson-{id}@tai-an-tea-school\r\nDTSTAMP:{stamp}\r\n{vevent}'
+              for id, vevent in vevents]
+    body = '\r\n'.join([
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Tai-an Tea School//Lessons//EN',
+        'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:Tai-an Tea School',
+        *events,
+        'END:VCALENDAR',
+        '',
+    ]).encode('utf-8')
+    # left out of the etag: a re-render with the same lessons is not a change
+    etag = hashlib.sha1(repr(vevents).encode('utf-8')).hexdigest()
+    return body, etag, [row.id for row in rows]
+
+
+def calendar_feed(role, user_id):
+    key = (role, user_id)
+    feed = feeds.get(key)
+    if feed is None:
+        generation = feeds.generation
+        body, etag, lesson_ids = render_feed(role, user_id)
+        feed = (body, etag)
+        # a student's feed also changes when a teacher edits one of its lessons
+        tags = [key] if role == 'teacher' else [key] + [('lesson', id) for id in lesson_ids]
+        feeds.set(key, feed, tags=tags, generation=generation)
+    return feed
@@ -1,19 +1,27 @@
-from flask import Flask
 from flask_bcrypt import Bcrypt
-from flask_cors import CORS
-from flask_migrate import Migrate
-from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
-app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.json.compact = False
+
+
+class Config:
+    SECRET_KEY = os.getenv('SECRET_KEY')
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///app.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+    SCHEDULER_IN_PROCESS = os.getenv('SCHEDULER_IN_PROCESS', '0') == '1'
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SECRET_KEY = 'testing'
+    SCHEDULER_IN_PROCESS = False
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
 metadata = MetaData(naming_convention={
     "ix": "ix_%(column_0_label)s",
     "uq": "uq_%(table_name)s_%(column_0_name)s",
@@ -22,8 +30,4 @@ metadata = MetaData(naming_convention={
     "pk": "pk_%(table_name)s"
 })
 db = SQLAlchemy(metadata=metadata)
-migrate = Migrate(app, db)
-db.init_app(app)
-api = Api(app)
-CORS(app)
-bcrypt = Bcrypt(app)
+bcrypt = Bcrypt()
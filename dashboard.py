@@ -0,0 +1,131 @@
+from decimal import Decimal
+
+from sqlalchemy import case, distinct, func, select
+
+from cache import TaggedCache
+from config import db
+from models import Lesson, Enrollment
+
+PERIOD_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+    'year': '%Y',
+}
+
+DASHBOARD_TTL = 300
+
+dashboards = TaggedCache(maxsize=512, ttl=DASHBOARD_TTL)
+
+registered = case((Enrollment.status == 'registered', 1), else_=0)
+waitlisted = case((Enrollment.status == 'waitlisted', 1), else_=0)
+revenue = case((Enrollment.status == 'registered', Enrollment.cost), else_=0)
+
+
+def _money(value):
+    return str(Decimal(value or 0).quantize(Decimal('0.01')))
+
+
+def _fill_rate(registered_count, capacity):
+    return round(registered_count / capacity, 4) if capacity else 0
+
+
+def lesson_stats(teacher_id):
+    stmt = (
+        select(
+            Lesson.id, Lesson.title, Lesson.level, Lesson.start, Lesson.capacity,
+            func.coalesce(func.sum(registered), 0).label('registered'),
+            func.coalesce(func.sum(waitlisted), 0).label('waitlisted'),
+            func.coalesce(func.sum(revenue), 0).label('revenue'),
+            func.count(distinct(Enrollment.student_id)).label('unique_students'),
+        )
+        .outerjoin(Enrollment, Enrollment.lesson_id == Lesson.id)
+        .where(Lesson.teacher_id == teacher_id)
+        .group_by(Lesson.id)
+        .order_by(Lesson.start)
+    )
+    return db.session.execute(stmt).all()
+
+
+def unique_students_by_period(teacher_id, period_format):
+    period = func.strftime(period_format, Lesson.start)
+    stmt = (
+        select(period.label('period'), func.count(distinct(Enrollment.student_id)))
+        .join(Enrollment, Enrollment.lesson_id == Lesson.id)
+        .where(Lesson.teacher_id == teacher_id)
+        .group_by(period)
+    )
+    return dict(db.session.execute(stmt).all())
+
+
+def unique_students(teacher_id):
+    stmt = (
+        select(func.count(distinct(Enrollment.student_id)))
+        .join(Lesson, Enrollment.lesson_id == Lesson.id)
+        .where(Lesson.teacher_id == teacher_id)
+    )
+    return db.session.scalar(stmt)
+
+
+def build_dashboard(teacher_id, period='month'):
+    period_format = PERIOD_FORMATS[period]
+    lessons = []
+    periods = {}
+    totals = {'lessons': 0, 'capacity': 0, 'registered': 0, 'waitlisted': 0, 'revenue': Decimal(0)}
+
+    for row in lesson_stats(teacher_id):
+        lessons.append({
+            'id': row.id,
+            'title': row.title,
+            'level': row.level,
+            'start': row.start.strftime('%Y-%m-%d %H:%M:%S'),
+            'capacity': row.capacity,
+            'registered': row.registered,
+            'waitlisted': row.waitlisted,
+            'fill_rate': _fill_rate(row.registered, row.capacity),
+            'revenue': _money(row.revenue),
+            'unique_students': row.unique_students,
+        })
+        key = row.start.strftime(period_format)
+        bucket = periods.setdefault(key, {'lessons': 0, 'capacity': 0, 'registered': 0,
+                                          'waitlisted': 0, 'revenue': Decimal(0)})
+        for summary in (bucket, totals):
+            summary['lessons'] += 1
+            summary['capacity'] += row.capacity
+            summary['registered'] += row.registered
+            summary['waitlisted'] += row.waitlisted
+            summary['revenue'] += Decimal(row.revenue or 0)
+
+    students_by_period = unique_students_by_period(teacher_id, period_format) if lessons else {}
+    period_list = []
+    for key, bucket in periods.items():
+        period_list.append({
+            'period': key,
+            **bucket,
+            'fill_rate': _fill_rate(bucket['registered'], bucket['capacity']),
+            'revenue': _money(bucket['revenue']),
+            'unique_students': students_by_period.get(key, 0),
+        })
+
+    return {
+        'teacher_id': teacher_id,
+        'period': period,
+        'totals': {
+            **totals,
+            'fill_rate': _fill_rate(totals['registered'], totals['capacity']),
+            'revenue': _money(totals['revenue']),
+            'unique_students': unique_students(teacher_id) if lessons else 0,
+        },
+        'periods': period_list,
+        'lessons': lessons,
+    }
+
+
+def teacher_dashboard(teacher_id, period='month'):
+    key = (teacher_id, period)
+    dashboard = dashboards.get(key)
+    if dashboard is None:
+        generation = dashboards.generation
+        dashboard = build_dashboard(teacher_id, period)
+        dashboards.set(key, dashboard, tags=[('teacher', teacher_id)], generation=generation)
+    return dashboard
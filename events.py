@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from cache import invalidate_tags
+from config import db
+from models import Lesson, Enrollment, SyncChange
+
+POLL_INTERVAL = float(os.getenv('CACHE_POLL_INTERVAL', 1))
+
+changes = SyncChange.__table__
+
+
+def _values(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    values = set(history.added) | set(history.unchanged) | set(history.deleted)
+    values.discard(None)
+    return values
+
+
+def _lesson_tags(lesson):
+    tags = {('lesson', lesson.id)} if lesson.id else set()
+    tags.update(('teacher', teacher_id) for teacher_id in _values(lesson, 'teacher_id'))
+    if lesson.teacher is not None and lesson.teacher.id is not None:
+        tags.add(('teacher', lesson.teacher.id))
+    return tags
+
+
+def _enrollment_tags(session, enrollment):
+    tags = set()
+    for lesson_id in _values(enrollment, 'lesson_id'):
+        tags.add(('lesson', lesson_id))
+        lesson = session.get(Lesson, lesson_id)
+        if lesson is not None:
+            tags.add(('teacher', lesson.teacher_id))
+    if enrollment.lesson is not None and enrollment.lesson.teacher_id is not None:
+        tags.add(('teacher', enrollment.lesson.teacher_id))
+    tags.update(('student', student_id) for student_id in _values(enrollment, 'student_id'))
+    return tags
+
+
+@event.listens_for(Session, 'before_flush')
+def collect_cache_tags(session, flush_context, instances):
+    tags = session.info.setdefault('cache_tags', set())
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Lesson):
+                tags.update(_lesson_tags(obj))
+            elif isinstance(obj, Enrollment):
+                tags.update(_enrollment_tags(session, obj))
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_cache_tags(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        invalidate_tags(tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_cache_tags(session):
+    session.info.pop('cache_tags', None)
+
+
+# Commits invalidate the caches of the process that made them. Other workers,
+# and the job scheduler, learn about a change from the sync change log, which
+# every writer appends to in the same transaction; each process reads the new
+# rows at most once per POLL_INTERVAL and drops the matching tags.
+_cursor = None
+_polled_at = 0.0
+_poll_lock = threading.Lock()
+
+
+def _change_tags(rows):
+    tags = set()
+    for row in rows:
+        if row.entity == 'lesson':
+            tags.add(('lesson', row.entity_id))
+        if row.teacher_id is not None:
+            tags.add(('teacher', row.teacher_id))
+        if row.student_id is not None:
+            tags.add(('student', row.student_id))
+    return tags
+
+
+def poll_changes():
+    global _cursor, _polled_at
+    if time.monotonic() - _polled_at < POLL_INTERVAL or not _poll_lock.acquire(blocking=False):
+        return
+    try:
+        _polled_at = time.monotonic()
+        if _cursor is None:
+            # nothing is cached yet, so earlier changes do not matter
+            _cursor = db.session.scalar(select(func.coalesce(func.max(changes.c.seq), 0)))
+            return
+        rows = db.session.execute(
+            select(changes.c.seq, changes.c.entity, changes.c.entity_id, changes.c.student_id, changes.c.teacher_id)
+            .where(changes.c.seq > _cursor)
+            .order_by(changes.c.seq)
+        ).all()
+        if rows:
+            _cursor = rows[-1].seq
+            invalidate_tags(_change_tags(rows))
+    finally:
+        _poll_lock.release()
+
+
+def _after_fork():
+    global _poll_lock
+    _poll_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def init_app(app):
+    @app.before_request
+    def poll_cache_invalidations():
+        poll_changes()
@@ -0,0 +1,114 @@
+import os
+import threading
+
+from cache import TTLCache
+
+CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", 2))
+READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", 8))
+POOL_SIZE = int(os.getenv("STRIPE_POOL_SIZE", 16))
+SESSION_CACHE_TTL = float(os.getenv("STRIPE_SESSION_CACHE_TTL", 5))
+FINISHED_SESSION_CACHE_TTL = 300
+
+_stripe = None
+_lock = threading.Lock()
+
+
+class GatewayError(Exception):
+    pass
+
+
+class SignatureError(GatewayError):
+    pass
+
+
+def _http_client(stripe):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    http.mount("https://", adapter)
+    http.mount("http://", adapter)
+    # A single requests.Session shared by every thread keeps the TLS connections
+    # to Stripe open between calls instead of one pool per worker thread.
+    return stripe.http_client.RequestsClient(
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        session=http,
+    )
+
+
+def client():
+    # stripe and requests are imported on the first payment call rather than
+    # on every worker boot and CLI command
+    global _stripe
+    if _stripe is None:
+        with _lock:
+            if _stripe is None:
+                import stripe
+                stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+                stripe.api_version = "2022-11-15"
+                if os.getenv("STRIPE_API_BASE"):
+                    stripe.api_base = os.getenv("STRIPE_API_BASE")
+                stripe.default_http_client = _http_client(stripe)
+                stripe.max_network_retries = int(os.getenv("STRIPE_MAX_RETRIES", 1))
+                _stripe = stripe
+    return _stripe
+
+
+def _after_fork():
+    # pooled sockets must not be shared with the parent after a fork
+    global _lock
+    _lock = threading.Lock()
+    if _stripe is not None:
+        _stripe.default_http_client = _http_client(_stripe)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+checkout_sessions = TTLCache(ttl=SESSION_CACHE_TTL, maxsize=2048)
+
+
+def create_checkout_session(price, quantity, metadata, domain_url, idempotency_key=None):
+    params = dict(
+        success_url=domain_url + '/completion?session_id={CHECKOUT_SESSION_ID}',
+        cancel_url=domain_url + '/canceled',
+        mode='payment',
+        metadata=metadata,
+        line_items=[{
+            'price': price,
+            'quantity': quantity,
+        }],
+    )
+    # Only a key the client sent for this purchase attempt is forwarded; two
+    # identical purchases are still two sessions unless the client says so.
+    if idempotency_key:
+        params['idempotency_key'] = idempotency_key
+    stripe = client()
+    try:
+        return stripe.checkout.Session.create(**params)
+    except stripe.error.StripeError as e:
+        raise GatewayError(str(e)) from e
+
+
+def get_checkout_session(session_id):
+    checkout_session = checkout_sessions.get(session_id)
+    if checkout_session is None:
+        stripe = client()
+        try:
+            checkout_session = stripe.checkout.Session.retrieve(session_id)
+        except stripe.error.StripeError as e:
+            raise GatewayError(str(e)) from e
+        if checkout_session.get('status') in ('complete', 'expired'):
+            ttl = FINISHED_SESSION_CACHE_TTL
+        else:
+            ttl = None
+        checkout_sessions.set(session_id, checkout_session, ttl=ttl)
+    return checkout_session
+
+
+def construct_event(payload, signature, secret):
+    stripe = client()
+    try:
+        return stripe.Webhook.construct_event(payload, signature, secret)
+    except stripe.error.SignatureVerificationError as e:
+        raise SignatureError(str(e)) from e
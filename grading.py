@@ -0,0 +1,116 @@
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import update
+from sqlalchemy.orm import selectinload
+
+from config import db
+from models import Student, Lesson, Enrollment, LessonCreditHistory
+
+MAX_UPDATES = 100
+FIELDS = ('cost', 'status', 'comment')
+STATUSES = ('registered', 'waitlisted')
+
+
+def lock_lesson(lesson_id):
+    # Seat checks read the registered count and then write. SQLite only takes
+    # the write lock at the first write, so two requests could both see the
+    # last free seat; touching the lesson row first makes them take turns.
+    db.session.execute(
+        update(Lesson).where(Lesson.id == lesson_id).values(is_full=Lesson.is_full)
+        .execution_options(synchronize_session=False))
+
+
+def _result(enrollment_id, status, body):
+    return {'id': enrollment_id, 'status': status, 'body': body}
+
+
+def _error(enrollment_id, status, message):
+    return _result(enrollment_id, status, {'error': message})
+
+
+def _validate(item, by_id, seen):
+    enrollment_id = item.get('id') if isinstance(item, dict) else None
+    if isinstance(enrollment_id, bool) or not isinstance(enrollment_id, int):
+        return _error(None, 400, 'Enrollment id must be an integer')
+    enrollment = by_id.get(enrollment_id)
+    if enrollment is None:
+        return _error(enrollment_id, 404, 'Enrollment not found')
+    if enrollment_id in seen:
+        return _error(enrollment_id, 400, 'Enrollment listed more than once')
+    seen.add(enrollment_id)
+    changes = {field: item[field] for field in FIELDS if field in item}
+    if 'status' in changes and changes['status'] not in STATUSES:
+        return _error(enrollment_id, 422, 'Invalid input')
+    if 'cost' in changes:
+        try:
+            changes['cost'] = Decimal(str(changes['cost']))
+        except InvalidOperation:
+            return _error(enrollment_id, 422, 'Invalid input')
+        if not changes['cost'].is_finite() or changes['cost'] < 0:
+            return _error(enrollment_id, 422, 'Invalid input')
+    return enrollment, changes
+
+
+def _ledger(student, amount, memo):
+    old_credit = student.lesson_credit
+    student.lesson_credit += amount
+    return LessonCreditHistory(old_credit=old_credit, new_credit=student.lesson_credit, student=student, memo=memo)
+
+
+def update_enrollments(lesson, items):
+    # Applies a list of {id, cost?, status?, comment?} updates to the lesson's
+    # enrollments, with the same rules as the single-enrollment PATCH, and
+    # returns one {id, status, body} result per item in request order and
+    # whether all of them were applied. If any item fails nothing is changed
+    # and the others are answered 424; the caller rolls back.
+    by_id = {enrollment.id: enrollment for enrollment in lesson.enrollments}
+    results = [None] * len(items)
+    accepted, seen = [], set()
+    for index, item in enumerate(items):
+        checked = _validate(item, by_id, seen)
+        if isinstance(checked, dict):
+            results[index] = checked
+        else:
+            accepted.append((index, *checked))
+
+    # Only a real change of status moves credit. Refunds go first so the
+    # seats they free can be taken by promotions in the same request.
+    registered = sum(1 for enrollment in lesson.enrollments if enrollment.status == 'registered')
+    ledger = []
+    for index, enrollment, changes in accepted:
+        if changes.get('status') == 'waitlisted' and enrollment.status == 'registered':
+            ledger.append(_ledger(enrollment.student, enrollment.cost, 'credit refund after being removed to waitlist'))
+            registered -= 1
+    for index, enrollment, changes in accepted:
+        if changes.get('status') != 'registered' or enrollment.status == 'registered':
+            continue
+        cost = changes.get('cost', enrollment.cost)
+        if registered >= lesson.capacity:
+            changes['status'] = 'waitlisted'
+        elif enrollment.student.lesson_credit < cost:
+            results[index] = _error(enrollment.id, 400, 'Insufficient credit')
+        else:
+            ledger.append(_ledger(enrollment.student, -cost, 'credit deduction after being added to registered list'))
+            registered += 1
+
+    if any(result is not None for result in results):
+        for index, enrollment, changes in accepted:
+            if results[index] is None:
+                results[index] = _error(enrollment.id, 424, 'Not applied because another item failed')
+        return results, False
+
+    updated = []
+    for index, enrollment, changes in accepted:
+        for attr, value in changes.items():
+            setattr(enrollment, attr, value)
+        updated.append(enrollment.id)
+    db.session.add_all(ledger)
+    lesson.update_is_full()
+
+    # one reload for the response instead of refreshing each row after the flush
+    fresh = {enrollment.id: enrollment for enrollment in Enrollment.query.options(
+        selectinload(Enrollment.student).selectinload(Student.lesson_credit_history),
+    ).filter(Enrollment.id.in_(updated)).populate_existing()}
+    for index, enrollment, changes in accepted:
+        results[index] = _result(enrollment.id, 200, fresh[enrollment.id].to_dict())
+    return results, True
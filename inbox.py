@@ -0,0 +1,77 @@
+from sqlalchemy import column, func, literal, select, text, union_all
+
+from config import db
+from models import Student, Lesson, Enrollment, Feedback
+from search import match_expression
+
+NO_FEEDBACK = "No feedback provided yet!"
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _notes(model, body, kind, fts_table, teacher_id, student_id, lesson_id, since, until, match):
+    stmt = (
+        select(
+            literal(kind).label('kind'),
+            model.id.label('id'),
+            body.label('text'),
+            model.created_at.label('created_at'),
+            model.updated_at.label('updated_at'),
+            Student.id.label('student_id'),
+            Student.first_name.label('first_name'),
+            Student.last_name.label('last_name'),
+            Lesson.id.label('lesson_id'),
+            Lesson.title.label('lesson_title'),
+            Lesson.start.label('lesson_start'),
+        )
+        .join(Lesson, model.lesson_id == Lesson.id)
+        .join(Student, model.student_id == Student.id)
+        .where(Lesson.teacher_id == teacher_id, body.isnot(None), body != NO_FEEDBACK)
+    )
+    if student_id is not None:
+        stmt = stmt.where(model.student_id == student_id)
+    if lesson_id is not None:
+        stmt = stmt.where(model.lesson_id == lesson_id)
+    if since is not None:
+        stmt = stmt.where(Lesson.start >= since)
+    if until is not None:
+        stmt = stmt.where(Lesson.start < until)
+    if match is not None:
+        matching = (text(f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH :{fts_table}_match")
+                    .bindparams(**{f'{fts_table}_match': match})
+                    .columns(column('rowid')))
+        stmt = stmt.where(model.id.in_(matching))
+    return stmt
+
+
+def _serialize(row):
+    return {
+        'kind': row.kind,
+        'id': row.id,
+        'text': row.text,
+        'created_at': row.created_at.strftime(DATETIME_FORMAT) if row.created_at else None,
+        'updated_at': row.updated_at.strftime(DATETIME_FORMAT) if row.updated_at else None,
+        'student': {'id': row.student_id, 'first_name': row.first_name, 'last_name': row.last_name},
+        'lesson': {'id': row.lesson_id, 'title': row.lesson_title,
+                   'start': row.lesson_start.strftime(DATETIME_FORMAT)},
+    }
+
+
+def teacher_inbox(teacher_id, page, per_page, q=None, student_id=None, lesson_id=None, since=None, until=None):
+    match = match_expression(q) if q else None
+    if q and match is None:
+        return [], 0
+
+    args = (teacher_id, student_id, lesson_id, since, until, match)
+    notes = union_all(
+        _notes(Enrollment, Enrollment.comment, 'comment', 'enrollments_fts', *args),
+        _notes(Feedback, Feedback.message, 'feedback', 'feedbacks_fts', *args),
+    ).subquery()
+
+    total = db.session.scalar(select(func.count()).select_from(notes))
+    rows = db.session.execute(
+        select(notes)
+        .order_by(notes.c.lesson_start.desc(), notes.c.created_at.desc(), notes.c.id.desc())
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
+    return [_serialize(row) for row in rows], total
@@ -0,0 +1,338 @@
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import db
+from grading import lock_lesson
+from models import (Student, Lesson, Enrollment, LessonCreditHistory, ShoppingCart,
+                    JobState, SchedulerLock)
+import archive
+import recommendations
+import rollups
+import sync
+
+POLL_INTERVAL = float(os.getenv('SCHEDULER_POLL_INTERVAL', 30))
+LOCK_TTL = timedelta(seconds=POLL_INTERVAL * 3)
+JITTER = 0.1
+BACKOFF_BASE = timedelta(seconds=30)
+CART_TTL = timedelta(hours=float(os.getenv('CART_TTL_HOURS', 24)))
+PROMOTION_WINDOW = timedelta(hours=float(os.getenv('WAITLIST_PROMOTION_HOURS', 48)))
+
+jobs = {}
+
+# holder of the scheduler lease while run_pending runs its jobs
+_holder = ContextVar('scheduler_holder', default=None)
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, name, every, fn):
+        self.name = name
+        self.every = every
+        self.fn = fn
+
+    def jitter(self):
+        # spread runs so several jobs (or restarts) do not line up
+        return timedelta(seconds=random.uniform(0, self.every.total_seconds() * JITTER))
+
+    def backoff(self, failures):
+        return min(self.every, BACKOFF_BASE * 2 ** (failures - 1))
+
+
+def job(name, every):
+    def register(fn):
+        jobs[name] = Job(name, every, fn)
+        return fn
+    return register
+
+
+@job('complete_lessons', every=timedelta(minutes=5))
+def complete_lessons(now):
+    finished = db.session.execute(
+        select(Lesson.id, Lesson.teacher_id).where(Lesson.end <= now, Lesson.completed_at.is_(None))
+    ).all()
+    if finished:
+        db.session.execute(
+            update(Lesson).where(Lesson.id.in_([id for id, _ in finished])).values(completed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        # a Core update is not seen by the flush listener in sync.py
+        sync.record(db.session.connection(),
+                    {('lesson', id): (False, None, teacher_id) for id, teacher_id in finished})
+    return f'{len(finished)} lessons completed'
+
+
+@job('expire_carts', every=timedelta(hours=1))
+def expire_carts(now):
+    result = db.session.execute(delete(ShoppingCart).where(ShoppingCart.created_at < now - CART_TTL))
+    return f'{result.rowcount} carts expired'
+
+
+@job('refresh_rollups', every=timedelta(hours=1))
+def refresh_rollups(now):
+    # the flush listeners keep today current; re-deriving the last two days
+    # also picks up rows written outside the ORM
+    end = now.date()
+    rollups.rebuild(end - timedelta(days=1), end)
+    return f'rebuilt {end - timedelta(days=1)} to {end}'
+
+
+@job('refresh_recommendations', every=timedelta(minutes=10))
+def refresh_recommendations(now):
+    students, lessons = recommendations.process_queue()
+    return f'refreshed {students} students and {lessons} lessons'
+
+
+@job('promote_waitlists', every=timedelta(minutes=15))
+def promote_waitlists(now):
+    registered = (select(func.count())
+                  .where(Enrollment.lesson_id == Lesson.id, Enrollment.status == 'registered')
+                  .correlate(Lesson)
+                  .scalar_subquery())
+    lessons = Lesson.query.filter(
+        Lesson.start > now,
+        Lesson.start <= now + PROMOTION_WINDOW,
+        registered < Lesson.capacity,
+        Lesson.enrollments.any(Enrollment.status == 'waitlisted'),
+    ).all()
+
+    promoted = 0
+    for lesson in lessons:
+        # same lock as the enrollment handlers, so a student enrolling now
+        # cannot take a seat counted here as free
+        lock_lesson(lesson.id)
+        seats = lesson.capacity - Enrollment.query.filter_by(lesson_id=lesson.id, status='registered').count()
+        waitlist = (Enrollment.query
+                    .filter_by(lesson_id=lesson.id, status='waitlisted')
+                    .order_by(Enrollment.created_at, Enrollment.id))
+        for enrollment in waitlist:
+            if seats <= 0:
+                break
+            student = db.session.get(Student, enrollment.student_id)
+            if student is None or student.lesson_credit < enrollment.cost:
+                continue
+            old_credit = student.lesson_credit
+            student.lesson_credit -= enrollment.cost
+            db.session.add(LessonCreditHistory(
+                old_credit=old_credit,
+                new_credit=student.lesson_credit,
+                student_id=student.id,
+                memo="credit deduction after promotion from waitlist"
+            ))
+            enrollment.status = 'registered'
+            seats -= 1
+            promoted += 1
+        db.session.flush()
+        lesson.update_is_full()
+    return f'{promoted} enrollments promoted'
+
+
+@job('archive_lessons', every=timedelta(days=1))
+def archive_lessons(now):
+    archived = 0
+    for moved in archive.archive(now=now):
+        archived += moved
+        keep_alive()
+    return f'{archived} lessons archived'
+
+
+def run_job(job, now=None):
+    now = now or datetime.now()
+    state = db.session.get(JobState, job.name) or JobState(name=job.name, failures=0)
+    try:
+        message = job.fn(now)
+        # the job's writes and this check commit together, so a scheduler
+        # that lost its lease mid-job cannot commit over the new holder
+        holder = _holder.get()
+        if holder is not None and not renew_lock(holder):
+            raise LeaseLost(holder)
+        state = db.session.merge(state)
+        state.last_status, state.last_error, state.failures = 'ok', None, 0
+        state.next_run_at = now + job.every + job.jitter()
+        ok = True
+    except LeaseLost:
+        db.session.rollback()
+        current_app.logger.warning('job %s abandoned, the scheduler lease was lost', job.name)
+        return False, 'scheduler lease lost'
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('job %s failed', job.name)
+        state = db.session.merge(state)
+        state.failures = (state.failures or 0) + 1
+        state.last_status, state.last_error = 'failed', repr(e)[:500]
+        state.next_run_at = now + job.backoff(state.failures) + job.jitter()
+        message, ok = repr(e), False
+    state.last_run_at = now
+    db.session.commit()
+    return ok, message
+
+
+def acquire_lock(holder, now=None, name='scheduler'):
+    # Leader election: whoever holds an unexpired row runs the jobs. The
+    # conditional UPDATE is atomic, so two schedulers can never both win.
+    now = now or datetime.now()
+    db.session.execute(sqlite_insert(SchedulerLock).values(
+        name=name, holder=holder, expires_at=now - timedelta(seconds=1)
+    ).on_conflict_do_nothing())
+    result = db.session.execute(
+        update(SchedulerLock)
+        .where(SchedulerLock.name == name,
+               (SchedulerLock.holder == holder) | (SchedulerLock.expires_at < now))
+        .values(holder=holder, expires_at=now + LOCK_TTL)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def renew_lock(holder, now=None, name='scheduler'):
+    # extends the lease only while this holder still has it; the caller commits
+    now = now or datetime.now()
+    result = db.session.execute(
+        update(SchedulerLock)
+        .where(SchedulerLock.name == name, SchedulerLock.holder == holder)
+        .values(expires_at=now + LOCK_TTL)
+    )
+    return result.rowcount == 1
+
+
+def keep_alive():
+    # For jobs that commit in steps: extends the lease between steps, and
+    # stops the job if another scheduler has taken over.
+    holder = _holder.get()
+    if holder is None:
+        return
+    if not renew_lock(holder):
+        db.session.rollback()
+        raise LeaseLost(holder)
+    db.session.commit()
+
+
+def release_lock(holder, name='scheduler'):
+    db.session.execute(delete(SchedulerLock).where(SchedulerLock.name == name, SchedulerLock.holder == holder))
+    db.session.commit()
+
+
+def due_jobs(now):
+    states = {state.name: state for state in JobState.query.all()}
+    return [job for name, job in jobs.items()
+            if name not in states or states[name].next_run_at is None or states[name].next_run_at <= now]
+
+
+def run_pending(holder, now=None):
+    now = now or datetime.now()
+    if not acquire_lock(holder, now):
+        return None
+    results = []
+    token = _holder.set(holder)
+    try:
+        for job in due_jobs(now):
+            # a fresh lease for every job, so earlier ones cannot use it up
+            if not acquire_lock(holder):
+                break
+            results.append((job.name, *run_job(job, now)))
+    finally:
+        _holder.reset(token)
+    return results
+
+
+def holder_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def _run_forever(app, holder):
+    while True:
+        time.sleep(POLL_INTERVAL * random.uniform(1 - JITTER, 1 + JITTER))
+        with app.app_context():
+            try:
+                run_pending(holder)
+            except Exception:
+                app.logger.exception('scheduler tick failed')
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler(app):
+    # one scheduler thread per web worker; the lock row still elects a
+    # single one to do the work
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=_run_forever, args=(app, holder_name()),
+                                          name='job-scheduler', daemon=True)
+            _scheduler.start()
+
+
+def _after_fork():
+    # the thread stays with the parent; the child starts its own
+    global _scheduler, _scheduler_lock
+    _scheduler, _scheduler_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def init_app(app):
+    if app.config.get('SCHEDULER_IN_PROCESS'):
+        @app.before_request
+        def start_job_scheduler():
+            start_scheduler(app)
+
+
+jobs_cli = AppGroup('jobs', help='Run scheduled background jobs.')
+
+
+@jobs_cli.command('list')
+def list_command():
+    """Show every job with its schedule and last result."""
+    states = {state.name: state for state in JobState.query.all()}
+    for name, job in jobs.items():
+        state = states.get(name)
+        if state is None:
+            click.echo(f'{name:26} every {job.every}  never run')
+            continue
+        click.echo(f'{name:26} every {job.every}  last {state.last_run_at:%Y-%m-%d %H:%M:%S} '
+                   f'{state.last_status}  next {state.next_run_at:%Y-%m-%d %H:%M:%S}'
+                   + (f'  failures={state.failures} {state.last_error}' if state.failures else ''))
+
+
+@jobs_cli.command('run')
+@click.argument('name', type=click.Choice(list(jobs)))
+def run_command(name):
+    """Run one job now, whatever its schedule."""
+    ok, message = run_job(jobs[name])
+    click.echo(f'{name}: {message}')
+    if not ok:
+        raise SystemExit(1)
+
+
+@jobs_cli.command('scheduler')
+@click.option('--once', is_flag=True, help='Run due jobs a single time and exit.')
+def scheduler_command(once):
+    """Run due jobs forever; only the lock holder among schedulers does work."""
+    holder = holder_name()
+    try:
+        while True:
+            results = run_pending(holder)
+            for name, ok, message in results or []:
+                click.echo(f"{datetime.now():%Y-%m-%d %H:%M:%S} {name}: {'ok' if ok else 'failed'} {message}")
+            if once:
+                return
+            time.sleep(POLL_INTERVAL * random.uniform(1 - JITTER, 1 + JITTER))
+    finally:
+        release_lock(holder)
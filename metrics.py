@@ -0,0 +1,135 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+import threading
+import time
+
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED = '<unmatched>'
+
+# [statements, seconds] for the request running in this context
+_sql = ContextVar('sql', default=None)
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    # Metrics live in process memory; with several workers each one serves
+    # its own figures and the scraper sums them.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(Histogram)
+        self.counters = defaultdict(float)
+
+    def observe_request(self, endpoint, status, seconds, statements, sql_seconds):
+        with self._lock:
+            self.latency[endpoint].observe(seconds)
+            self.counters['http_requests_total', (('endpoint', endpoint), ('status', str(status)))] += 1
+            self.counters['db_statements_total', (('endpoint', endpoint),)] += statements
+            self.counters['db_statement_seconds_total', (('endpoint', endpoint),)] += sql_seconds
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self.counters[name, tuple(sorted(labels.items()))] += value
+
+    def clear(self):
+        with self._lock:
+            self.latency.clear()
+            self.counters.clear()
+
+    def render(self):
+        with self._lock:
+            latency = {endpoint: (list(h.counts), h.sum) for endpoint, h in self.latency.items()}
+            counters = dict(self.counters)
+
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by endpoint.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for endpoint, (counts, total) in sorted(latency.items()):
+            endpoint = _escape(endpoint)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {total:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+
+        declared = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in declared:
+                lines.append(f'# TYPE {name} counter')
+                declared.add(name)
+            rendered = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+            lines.append(f'{name}{{{rendered}}} {value:g}' if rendered else f'{name} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _sql.get() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _sql.get()
+    if stats is not None and conn.info.get('query_started'):
+        stats[0] += 1
+        stats[1] += time.perf_counter() - conn.info['query_started'].pop()
+
+
+def _start():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql = [0, 0.0]
+    g.metrics_token = _sql.set(g.metrics_sql)
+
+
+def _finish(status):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    _sql.reset(g.pop('metrics_token'))
+    statements, sql_seconds = g.pop('metrics_sql')
+    registry.observe_request(request.endpoint or UNMATCHED, status,
+                             time.perf_counter() - started, statements, sql_seconds)
+
+
+def init_app(app):
+    @app.before_request
+    def start_request_metrics():
+        _start()
+
+    @app.after_request
+    def record_request_metrics(response):
+        _finish(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request_metrics(exc):
+        # after_request is skipped when a view raises past every handler
+        _finish(500)
+
+    app.add_url_rule('/metrics', 'metrics', lambda: Response(
+        registry.render(), mimetype='text/plain; version=0.0.4'))
@@ -0,0 +1,46 @@
+"""add lesson search index
+
+Revision ID: 50f913aada7b
+Revises: e834cb7ca100
+Create Date: 2026-10-19 11:35:55.692021
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '50f913aada7b'
+down_revision = 'e834cb7ca100'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS lessons_fts USING fts5("
+        "title, description, content='lessons', content_rowid='id', tokenize='porter unicode61', prefix='2 3')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS lessons_fts_ai AFTER INSERT ON lessons BEGIN "
+        "INSERT INTO lessons_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS lessons_fts_ad AFTER DELETE ON lessons BEGIN "
+        "INSERT INTO lessons_fts(lessons_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS lessons_fts_au AFTER UPDATE OF title, description ON lessons BEGIN "
+        "INSERT INTO lessons_fts(lessons_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO lessons_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+    )
+    op.execute("INSERT INTO lessons_fts(lessons_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS lessons_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS lessons_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS lessons_fts_ai")
+    op.execute("DROP TABLE IF EXISTS lessons_fts")
@@ -0,0 +1,75 @@
+"""autoincrement lesson, enrollment and feedback ids
+
+Revision ID: 5c0e4b2d9a17
+Revises: 1bda097c07d7
+Create Date: 2026-10-19 15:02:11.318442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c0e4b2d9a17'
+down_revision = '1bda097c07d7'
+branch_labels = None
+depends_on = None
+
+# hot table -> (archive table, search triggers); a batch rebuild drops the
+# triggers with the old table, so they are created again afterwards
+TABLES = {
+    'lessons': ('archivedlessons', (
+        "CREATE TRIGGER lessons_fts_ai AFTER INSERT ON lessons BEGIN "
+        "INSERT INTO lessons_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER lessons_fts_ad AFTER DELETE ON lessons BEGIN "
+        "INSERT INTO lessons_fts(lessons_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER lessons_fts_au AFTER UPDATE OF title, description ON lessons BEGIN "
+        "INSERT INTO lessons_fts(lessons_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO lessons_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    )),
+    'enrollments': ('archivedenrollments', (
+        "CREATE TRIGGER enrollments_fts_ai AFTER INSERT ON enrollments BEGIN "
+        "INSERT INTO enrollments_fts(rowid, comment) VALUES (new.id, new.comment); END",
+        "CREATE TRIGGER enrollments_fts_ad AFTER DELETE ON enrollments BEGIN "
+        "INSERT INTO enrollments_fts(enrollments_fts, rowid, comment) VALUES ('delete', old.id, old.comment); END",
+        "CREATE TRIGGER enrollments_fts_au AFTER UPDATE OF comment ON enrollments BEGIN "
+        "INSERT INTO enrollments_fts(enrollments_fts, rowid, comment) VALUES ('delete', old.id, old.comment); "
+        "INSERT INTO enrollments_fts(rowid, comment) VALUES (new.id, new.comment); END",
+    )),
+    'feedbacks': ('archivedfeedbacks', (
+        "CREATE TRIGGER feedbacks_fts_ai AFTER INSERT ON feedbacks BEGIN "
+        "INSERT INTO feedbacks_fts(rowid, message) VALUES (new.id, new.message); END",
+        "CREATE TRIGGER feedbacks_fts_ad AFTER DELETE ON feedbacks BEGIN "
+        "INSERT INTO feedbacks_fts(feedbacks_fts, rowid, message) VALUES ('delete', old.id, old.message); END",
+        "CREATE TRIGGER feedbacks_fts_au AFTER UPDATE OF message ON feedbacks BEGIN "
+        "INSERT INTO feedbacks_fts(feedbacks_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+        "INSERT INTO feedbacks_fts(rowid, message) VALUES (new.id, new.message); END",
+    )),
+}
+
+
+def _rebuild(autoincrement):
+    for table, (archived, triggers) in TABLES.items():
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}):
+            pass
+        for trigger in triggers:
+            op.execute(trigger)
+        if autoincrement:
+            # new ids must also clear every id that already went to the archive
+            op.execute(f"DELETE FROM sqlite_sequence WHERE name = '{table}'")
+            op.execute(
+                f"INSERT INTO sqlite_sequence(name, seq) SELECT '{table}', max(coalesce(max(hot.id), 0), "
+                f"(SELECT coalesce(max(id), 0) FROM {archived})) FROM {table} AS hot"
+            )
+    for table in TABLES:
+        op.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+
+def upgrade():
+    _rebuild(True)
+
+
+def downgrade():
+    _rebuild(False)
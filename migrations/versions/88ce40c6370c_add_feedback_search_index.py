@@ -0,0 +1,66 @@
+"""add feedback search index
+
+Revision ID: 88ce40c6370c
+Revises: 50f913aada7b
+Create Date: 2026-10-19 11:38:18.427281
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '88ce40c6370c'
+down_revision = '50f913aada7b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS enrollments_fts USING fts5("
+        "comment, content='enrollments', content_rowid='id', tokenize='porter unicode61', prefix='2 3')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS enrollments_fts_ai AFTER INSERT ON enrollments BEGIN "
+        "INSERT INTO enrollments_fts(rowid, comment) VALUES (new.id, new.comment); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS enrollments_fts_ad AFTER DELETE ON enrollments BEGIN "
+        "INSERT INTO enrollments_fts(enrollments_fts, rowid, comment) VALUES ('delete', old.id, old.comment); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS enrollments_fts_au AFTER UPDATE OF comment ON enrollments BEGIN "
+        "INSERT INTO enrollments_fts(enrollments_fts, rowid, comment) VALUES ('delete', old.id, old.comment); "
+        "INSERT INTO enrollments_fts(rowid, comment) VALUES (new.id, new.comment); END"
+    )
+    op.execute("INSERT INTO enrollments_fts(enrollments_fts) VALUES ('rebuild')")
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS feedbacks_fts USING fts5("
+        "message, content='feedbacks', content_rowid='id', tokenize='porter unicode61', prefix='2 3')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS feedbacks_fts_ai AFTER INSERT ON feedbacks BEGIN "
+        "INSERT INTO feedbacks_fts(rowid, message) VALUES (new.id, new.message); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS feedbacks_fts_ad AFTER DELETE ON feedbacks BEGIN "
+        "INSERT INTO feedbacks_fts(feedbacks_fts, rowid, message) VALUES ('delete', old.id, old.message); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS feedbacks_fts_au AFTER UPDATE OF message ON feedbacks BEGIN "
+        "INSERT INTO feedbacks_fts(feedbacks_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+        "INSERT INTO feedbacks_fts(rowid, message) VALUES (new.id, new.message); END"
+    )
+    op.execute("INSERT INTO feedbacks_fts(feedbacks_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS feedbacks_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS feedbacks_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS feedbacks_fts_ai")
+    op.execute("DROP TABLE IF EXISTS feedbacks_fts")
+    op.execute("DROP TRIGGER IF EXISTS enrollments_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS enrollments_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS enrollments_fts_ai")
+    op.execute("DROP TABLE IF EXISTS enrollments_fts")
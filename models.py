@@ -109,6 +109,8 @@ class Teacher(db.Model, SerializerMixin):
 
 class Lesson(db.Model, SerializerMixin):
     __tablename__ = "lessons"
+    # ids are never reused, so they cannot collide with archived rows
+    __table_args__ = {"sqlite_autoincrement": True}
 
     serialize_rules = ("-enrollments.student.enrollments",
                     #    "-enrollments.student.teachers",
@@ -124,6 +126,7 @@ class Lesson(db.Model, SerializerMixin):
     capacity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(8, 2), default=0)
     is_full = db.Column(db.Boolean, nullable=False, default=False)
+    completed_at = db.Column(db.DateTime)
 
     teacher_id = db.Column(db.Integer, db.ForeignKey('teachers.id'))
     teacher = db.relationship("Teacher", back_populates="lessons")
@@ -164,6 +167,7 @@ class Lesson(db.Model, SerializerMixin):
 
 class Enrollment(db.Model, SerializerMixin):
     __tablename__ = "enrollments"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     serialize_rules = ("-student.enrollments", "-student.feedbacks", "-lesson.enrollments")
 
@@ -192,6 +196,7 @@ class Enrollment(db.Model, SerializerMixin):
 
 class Feedback(db.Model, SerializerMixin):
     __tablename__ = "feedbacks"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     serialize_rules = ("-student", "-lesson")
 
@@ -210,6 +215,74 @@ class Feedback(db.Model, SerializerMixin):
     def __repr__(self):
         return f'<Feedback: {self.id} for {self.student}>'
 
+class ArchivedLesson(db.Model, SerializerMixin):
+    __tablename__ = "archivedlessons"
+
+    serialize_rules = ("-enrollments.student.enrollments", "-feedbacks")
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String, nullable=False)
+    description = db.Column(db.String, nullable=False)
+    level = db.Column(db.Integer, nullable=False)
+    start = db.Column(db.DateTime, nullable=False)
+    end = db.Column(db.DateTime, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Numeric(8, 2), default=0)
+    is_full = db.Column(db.Boolean, nullable=False, default=False)
+    completed_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teachers.id'), index=True)
+    teacher = db.relationship("Teacher", viewonly=True)
+
+    enrollments = db.relationship("ArchivedEnrollment", back_populates="lesson")
+    feedbacks = db.relationship("ArchivedFeedback", back_populates="lesson")
+
+    def __repr__(self):
+        return f'<ArchivedLesson: {self.id} {self.title}>'
+
+class ArchivedEnrollment(db.Model, SerializerMixin):
+    __tablename__ = "archivedenrollments"
+
+    serialize_rules = ("-student.enrollments", "-student.feedbacks", "-lesson.enrollments")
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    cost = db.Column(db.Numeric(8, 2), default=0)
+    status = db.Column(db.Enum('registered', 'waitlisted', name='enrollment_status'), default='registered')
+    comment = db.Column(db.String)
+
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), index=True)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('archivedlessons.id'), index=True)
+
+    student = db.relationship("Student", viewonly=True)
+    lesson = db.relationship("ArchivedLesson", back_populates="enrollments")
+
+    def __repr__(self):
+        return f'<ArchivedEnrollment: {self.id} {self.lesson.title}>'
+
+class ArchivedFeedback(db.Model, SerializerMixin):
+    __tablename__ = "archivedfeedbacks"
+
+    serialize_rules = ("-student", "-lesson")
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    message = db.Column(db.String)
+
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), index=True)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('archivedlessons.id'), index=True)
+
+    student = db.relationship("Student", viewonly=True)
+    lesson = db.relationship("ArchivedLesson", back_populates="feedbacks")
+
+    def __repr__(self):
+        return f'<ArchivedFeedback: {self.id} for {self.student}>'
+
 class Payment(db.Model, SerializerMixin):
     __tablename__ = "payments"
 
@@ -265,3 +338,112 @@ class ShoppingCart(db.Model, SerializerMixin):
 
     def __repr__(self):
         return f'<ShoppingCart: {self.id} ${self.value}>'
+
+
+class DailyTeacherRollup(db.Model, SerializerMixin):
+    __tablename__ = "dailyteacherrollups"
+
+    day = db.Column(db.Date, primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teachers.id'), primary_key=True)
+    registered = db.Column(db.Integer, nullable=False, default=0)
+    waitlisted = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyTeacherRollup: {self.day} teacher {self.teacher_id}>'
+
+class DailyLevelRollup(db.Model, SerializerMixin):
+    __tablename__ = "dailylevelrollups"
+
+    day = db.Column(db.Date, primary_key=True)
+    level = db.Column(db.Integer, primary_key=True)
+    registered = db.Column(db.Integer, nullable=False, default=0)
+    waitlisted = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyLevelRollup: {self.day} level {self.level}>'
+
+class DailyCreditRollup(db.Model, SerializerMixin):
+    __tablename__ = "dailycreditrollups"
+
+    day = db.Column(db.Date, primary_key=True)
+    purchases = db.Column(db.Integer, nullable=False, default=0)
+    purchased = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyCreditRollup: {self.day} ${self.purchased}>'
+
+class LessonRecommendation(db.Model, SerializerMixin):
+    __tablename__ = "lessonrecommendations"
+    __table_args__ = (db.Index("ix_lessonrecommendations_student_id_score", "student_id", "score"),)
+
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lessons.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self):
+        return f'<LessonRecommendation: lesson {self.lesson_id} for student {self.student_id}>'
+
+class RecommendationRefresh(db.Model, SerializerMixin):
+    __tablename__ = "recommendationrefreshes"
+
+    kind = db.Column(db.Enum('student', 'lesson', name='recommendation_refresh_kind'), primary_key=True)
+    ref_id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self):
+        return f'<RecommendationRefresh: {self.kind} {self.ref_id}>'
+
+class CalendarToken(db.Model, SerializerMixin):
+    __tablename__ = "calendartokens"
+    __table_args__ = (db.UniqueConstraint("role", "user_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String, unique=True, nullable=False)
+    role = db.Column(db.Enum('teacher', 'student', name='calendar_token_role'), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self):
+        return f'<CalendarToken: {self.role} {self.user_id}>'
+
+class JobState(db.Model, SerializerMixin):
+    __tablename__ = "jobstates"
+
+    name = db.Column(db.String, primary_key=True)
+    next_run_at = db.Column(db.DateTime)
+    last_run_at = db.Column(db.DateTime)
+    last_status = db.Column(db.Enum('ok', 'failed', name='job_status'))
+    last_error = db.Column(db.String)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<JobState: {self.name} {self.last_status}>'
+
+class SchedulerLock(db.Model, SerializerMixin):
+    __tablename__ = "schedulerlocks"
+
+    name = db.Column(db.String, primary_key=True)
+    holder = db.Column(db.String, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchedulerLock: {self.name} held by {self.holder}>'
+
+class SyncChange(db.Model, SerializerMixin):
+    __tablename__ = "syncchanges"
+    # AUTOINCREMENT so a sequence number is never handed out twice
+    __table_args__ = (db.UniqueConstraint("entity", "entity_id"), {"sqlite_autoincrement": True})
+
+    seq = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.Enum('lesson', 'enrollment', 'credit_history', 'feedback', name='sync_entity'), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    student_id = db.Column(db.Integer)
+    teacher_id = db.Column(db.Integer)
+    changed_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self):
+        return f'<SyncChange: {self.seq} {self.entity} {self.entity_id}>'
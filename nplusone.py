@@ -0,0 +1,108 @@
+from contextvars import ContextVar
+import re
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# Per-request bookkeeping, only set while a debug or testing request runs
+_statements = ContextVar('statements', default=None)
+_loader_path = ContextVar('loader_path', default=None)
+
+EXPANDED_IN = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r'\s+')
+COLUMNS = re.compile(r'^SELECT .*? FROM ')
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+class Statement:
+    __slots__ = ('count', 'sql', 'paths')
+
+    def __init__(self, sql):
+        self.count = 0
+        self.sql = sql
+        self.paths = set()
+
+
+def fingerprint(statement):
+    # statements that differ only in their parameters share a fingerprint
+    statement = EXPANDED_IN.sub('(?)', statement)
+    statement = LITERALS.sub('?', statement)
+    return WHITESPACE.sub(' ', statement).strip()
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_loader_path(orm_execute_state):
+    if _statements.get() is None or not orm_execute_state.is_relationship_load:
+        return None
+    path = orm_execute_state.loader_strategy_path
+    token = _loader_path.set(' -> '.join(str(prop) for prop in path.path[1::2]))
+    try:
+        return orm_execute_state.invoke_statement()
+    finally:
+        _loader_path.reset(token)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements = _statements.get()
+    if statements is None:
+        return
+    key = fingerprint(statement)
+    entry = statements.get(key)
+    if entry is None:
+        entry = statements[key] = Statement(key)
+    entry.count += 1
+    path = _loader_path.get()
+    if path:
+        entry.paths.add(path)
+
+
+def repeated(statements, threshold):
+    return sorted((entry for entry in statements.values() if entry.count >= threshold),
+                  key=lambda entry: -entry.count)
+
+
+def _enabled(app):
+    return app.config.get('NPLUSONE_ENABLED', app.debug or app.testing)
+
+
+def init_app(app):
+    @app.before_request
+    def start_query_tracking():
+        if _enabled(current_app):
+            g.nplusone_token = _statements.set({})
+
+    @app.after_request
+    def report_repeated_queries(response):
+        token = g.pop('nplusone_token', None)
+        if token is None:
+            return response
+        statements = _statements.get()
+        _statements.reset(token)
+
+        threshold = current_app.config.get('NPLUSONE_THRESHOLD', 5)
+        offenders = repeated(statements, threshold)
+        if not offenders:
+            return response
+        report = '\n'.join(
+            f"  {entry.count} x {COLUMNS.sub('SELECT ... FROM ', entry.sql)[:200]}"
+            + (f"\n    via {', '.join(sorted(entry.paths))}" if entry.paths else '')
+            for entry in offenders
+        )
+        message = f'repeated queries in {request.method} {request.endpoint or request.path}:\n{report}'
+        if current_app.config.get('NPLUSONE_RAISE', current_app.testing):
+            raise NPlusOneError(message)
+        current_app.logger.warning(message)
+        return response
+
+    @app.teardown_request
+    def stop_query_tracking(exc):
+        token = g.pop('nplusone_token', None)
+        if token is not None:
+            _statements.reset(token)
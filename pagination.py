@@ -0,0 +1,17 @@
+from flask import request
+
+
+def page_args(default_per_page=20, max_per_page=100):
+    page = request.args.get('page', 1, type=int) or 1
+    per_page = request.args.get('per_page', default_per_page, type=int) or default_per_page
+    return max(page, 1), min(max(per_page, 1), max_per_page)
+
+
+def paginated(results, page, per_page, total):
+    return {
+        'results': results,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
+    }
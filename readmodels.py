@@ -0,0 +1,136 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from config import db
+from models import (Student, Teacher, Lesson, Enrollment, Payment, LessonCreditHistory,
+                    ArchivedLesson, ArchivedEnrollment)
+
+# Read-only listings straight from Core rows, shaped exactly like the models'
+# to_dict() output but without building ORM instances. Objects that appear
+# many times in a listing (a teacher, a student) are serialized once and the
+# dict is shared.
+
+students = Student.__table__
+teachers = Teacher.__table__
+lessons = Lesson.__table__
+enrollments = Enrollment.__table__
+payments = Payment.__table__
+histories = LessonCreditHistory.__table__
+archived_lessons = ArchivedLesson.__table__
+archived_enrollments = ArchivedEnrollment.__table__
+
+
+def _value(value):
+    # same formats as SerializerMixin's defaults
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, time):
+        return value.strftime('%H:%M')
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _dict(row):
+    return {key: _value(value) for key, value in row._mapping.items()}
+
+
+def _rows(query):
+    return db.session.execute(query).all()
+
+
+def _by_id(table, ids):
+    return {row.id: _dict(row) for row in _rows(select(table).where(table.c.id.in_(ids)))}
+
+
+def teacher_list():
+    return [_dict(row) for row in _rows(select(teachers))]
+
+
+def _lesson_list(lesson_table, enrollment_table, criterion):
+    lesson_ids = select(lesson_table.c.id)
+    query = select(lesson_table)
+    if criterion is not None:
+        lesson_ids = lesson_ids.where(criterion)
+        query = query.where(criterion)
+    lesson_rows = _rows(query)
+    if not lesson_rows:
+        return []
+    enrollment_rows = _rows(
+        select(enrollment_table).where(enrollment_table.c.lesson_id.in_(lesson_ids)).order_by(enrollment_table.c.id))
+
+    teacher_by_id = _by_id(teachers, {row.teacher_id for row in lesson_rows})
+    student_by_id = _by_id(students, {row.student_id for row in enrollment_rows})
+    for student in student_by_id.values():
+        student['lesson_credit_history'] = []
+    for row in _rows(select(histories).where(histories.c.student_id.in_(student_by_id)).order_by(histories.c.id)):
+        student_by_id[row.student_id]['lesson_credit_history'].append(_dict(row))
+
+    # an enrollment embeds its lesson without the lesson's enrollments
+    embedded, result = {}, []
+    for row in lesson_rows:
+        lesson = _dict(row)
+        lesson['teacher'] = teacher_by_id.get(row.teacher_id)
+        embedded[row.id] = lesson
+        result.append(dict(lesson, enrollments=[]))
+    listed = {lesson['id']: lesson for lesson in result}
+    for row in enrollment_rows:
+        enrollment = _dict(row)
+        enrollment['lesson'] = embedded[row.lesson_id]
+        enrollment['student'] = student_by_id.get(row.student_id)
+        listed[row.lesson_id]['enrollments'].append(enrollment)
+    return result
+
+
+def lesson_list(teacher_id=None, archived=False):
+    result = _lesson_list(lessons, enrollments, None if teacher_id is None else lessons.c.teacher_id == teacher_id)
+    if archived:
+        criterion = None if teacher_id is None else archived_lessons.c.teacher_id == teacher_id
+        result += _lesson_list(archived_lessons, archived_enrollments, criterion)
+    return result
+
+
+def payment_list(student_id):
+    return [_dict(row) for row in _rows(
+        select(payments).where(payments.c.student_id == student_id).order_by(payments.c.id))]
+
+
+def _history_student(student_id, history):
+    # the student as LessonCreditHistory.to_dict() embeds it: their
+    # enrollments, each with its lesson and that lesson's enrollments
+    row = db.session.execute(select(students).where(students.c.id == student_id)).first()
+    if row is None:
+        return None
+    own = _rows(select(enrollments).where(enrollments.c.student_id == student_id).order_by(enrollments.c.id))
+    lesson_ids = select(enrollments.c.lesson_id).where(enrollments.c.student_id == student_id)
+    lesson_rows = _rows(select(lessons).where(lessons.c.id.in_(lesson_ids)))
+    siblings = _rows(select(enrollments).where(enrollments.c.lesson_id.in_(lesson_ids)).order_by(enrollments.c.id))
+    teacher_by_id = _by_id(teachers, {lesson.teacher_id for lesson in lesson_rows})
+
+    with_teacher, outer = {}, {}
+    for lesson in lesson_rows:
+        with_teacher[lesson.id] = dict(_dict(lesson), teacher=teacher_by_id.get(lesson.teacher_id))
+        outer[lesson.id] = dict(_dict(lesson), enrollments=[])
+    for enrollment in siblings:
+        outer[enrollment.lesson_id]['enrollments'].append(
+            dict(_dict(enrollment), lesson=with_teacher[enrollment.lesson_id]))
+
+    inner = dict(_dict(row), lesson_credit_history=history)
+    student = _dict(row)
+    student['enrollments'] = [
+        dict(_dict(enrollment), lesson=outer.get(enrollment.lesson_id), student=inner) for enrollment in own
+    ]
+    return student
+
+
+def credit_history_list(student_id):
+    rows = _rows(select(histories).where(histories.c.student_id == student_id).order_by(histories.c.id))
+    if not rows:
+        return []
+    history = [_dict(row) for row in rows]
+    student = _history_student(student_id, history)
+    return [dict(record, student=student) for record in history]
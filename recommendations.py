@@ -0,0 +1,259 @@
+from array import array
+from collections import Counter
+from datetime import datetime
+import heapq
+import re
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, delete, event, insert, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from config import db
+from models import (Student, Lesson, Enrollment, LessonRecommendation,
+                    RecommendationRefresh)
+
+TOP_K = 20
+BATCH_SIZE = 500
+LEVEL_WEIGHT, TEACHER_WEIGHT, TITLE_WEIGHT, SOON_WEIGHT = 0.45, 0.25, 0.2, 0.1
+STOPWORDS = {'the', 'and', 'for', 'with', 'into', 'tea', 'ceremony', 'japanese', 'your', 'from'}
+
+refreshes = RecommendationRefresh.__table__
+
+
+def title_tokens(title):
+    return frozenset(w for w in re.findall(r'[a-z]+', (title or '').lower())
+                     if len(w) > 2 and w not in STOPWORDS)
+
+
+class CandidateLessons:
+    # Column-oriented features of every upcoming lesson that still has a
+    # seat, loaded once and shared by every student score() is run for.
+    def __init__(self, now, lesson_ids=None):
+        stmt = (select(Lesson.id, Lesson.level, Lesson.teacher_id, Lesson.start, Lesson.title)
+                .where(Lesson.start > now, Lesson.is_full.is_(False))
+                .order_by(Lesson.id))
+        if lesson_ids is not None:
+            stmt = stmt.where(Lesson.id.in_(lesson_ids))
+        rows = db.session.execute(stmt).all()
+        self.ids = array('l', (r.id for r in rows))
+        self.levels = array('b', (r.level for r in rows))
+        self.teachers = array('l', (r.teacher_id or 0 for r in rows))
+        self.soon = array('d', (1 / (1 + max((r.start - now).total_seconds(), 0) / 86400 / 14) for r in rows))
+        self.tokens = [title_tokens(r.title) for r in rows]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Profile:
+    def __init__(self):
+        self.levels = []
+        self.teachers = Counter()
+        self.tokens = set()
+        self.lesson_ids = set()
+
+    def add(self, lesson_id, level, teacher_id, title):
+        self.levels.append(level)
+        self.teachers[teacher_id] += 1
+        self.tokens |= title_tokens(title)
+        self.lesson_ids.add(lesson_id)
+
+    @property
+    def target_level(self):
+        # lean half a level above what the student usually takes
+        if not self.levels:
+            return 1
+        return min(5, sum(self.levels) / len(self.levels) + 0.5)
+
+
+def load_profiles(student_ids):
+    profiles = {student_id: Profile() for student_id in student_ids}
+    rows = db.session.execute(
+        select(Enrollment.student_id, Lesson.id, Lesson.level, Lesson.teacher_id, Lesson.title)
+        .join(Lesson, Enrollment.lesson_id == Lesson.id)
+        .where(Enrollment.student_id.in_(student_ids))
+    )
+    for row in rows:
+        profiles[row.student_id].add(row.id, row.level, row.teacher_id, row.title)
+    return profiles
+
+
+def score(profile, lessons):
+    # A scalar loop over the candidate columns, not vectorized: numpy is not a
+    # dependency. benchmarks/recommendations_bench.py measures about 2.2us per
+    # (student, lesson) pair, 1.8s to score 1000 students against 821 lessons.
+    target = profile.target_level
+    taken = sum(profile.teachers.values()) or 1
+    teacher_share = {teacher_id: count / taken for teacher_id, count in profile.teachers.items()}
+    tokens = profile.tokens
+    scores = [
+        LEVEL_WEIGHT * (1 - abs(level - target) / 4)
+        + TEACHER_WEIGHT * teacher_share.get(teacher_id, 0)
+        + TITLE_WEIGHT * (len(tokens & lesson_tokens) / len(tokens | lesson_tokens) if tokens else 0)
+        + SOON_WEIGHT * soon
+        for level, teacher_id, lesson_tokens, soon
+        in zip(lessons.levels, lessons.teachers, lessons.tokens, lessons.soon)
+    ]
+    return [(round(s, 6), lesson_id) for s, lesson_id in zip(scores, lessons.ids)
+            if lesson_id not in profile.lesson_ids]
+
+
+def refresh_students(student_ids, lessons=None, now=None):
+    now = now or datetime.now()
+    if lessons is None:
+        lessons = CandidateLessons(now)
+    for start in range(0, len(student_ids), BATCH_SIZE):
+        batch = student_ids[start:start + BATCH_SIZE]
+        profiles = load_profiles(batch)
+        rows = []
+        for student_id, profile in profiles.items():
+            for value, lesson_id in heapq.nlargest(TOP_K, score(profile, lessons)):
+                rows.append({'student_id': student_id, 'lesson_id': lesson_id, 'score': value, 'computed_at': now})
+        db.session.execute(delete(LessonRecommendation).where(LessonRecommendation.student_id.in_(batch)))
+        if rows:
+            db.session.execute(insert(LessonRecommendation), rows)
+
+
+TRIM = text("""
+    DELETE FROM lessonrecommendations WHERE rowid IN (
+        SELECT rowid FROM (
+            SELECT rowid, row_number() OVER (
+                PARTITION BY student_id ORDER BY score DESC, lesson_id DESC) AS position
+            FROM lessonrecommendations
+            WHERE student_id IN :student_ids
+        ) WHERE position > :top_k
+    )
+""").bindparams(bindparam('student_ids', expanding=True))
+
+
+def refresh_lessons(lesson_ids, now=None):
+    now = now or datetime.now()
+    # A student who loses one of these lessons gets their whole list rebuilt;
+    # the lesson that would take its place was trimmed away long ago.
+    losing = db.session.execute(
+        select(LessonRecommendation.student_id).where(LessonRecommendation.lesson_id.in_(lesson_ids)).distinct()
+    ).scalars().all()
+    db.session.execute(delete(LessonRecommendation).where(LessonRecommendation.lesson_id.in_(lesson_ids)))
+    if losing:
+        refresh_students(sorted(losing), now=now)
+    lessons = CandidateLessons(now, lesson_ids)
+    if not len(lessons):
+        return
+
+    # everyone else keeps their list and only gains the rows that beat its
+    # lowest entry, so only those students need trimming back to TOP_K
+    losing = set(losing)
+    student_ids = [student_id for student_id in
+                   db.session.execute(select(Student.id).order_by(Student.id)).scalars() if student_id not in losing]
+    for start in range(0, len(student_ids), BATCH_SIZE):
+        batch = student_ids[start:start + BATCH_SIZE]
+        profiles = load_profiles(batch)
+        current = {}
+        for row in db.session.execute(
+            select(LessonRecommendation.student_id, LessonRecommendation.score, LessonRecommendation.lesson_id)
+            .where(LessonRecommendation.student_id.in_(batch))
+        ):
+            current.setdefault(row.student_id, []).append((row.score, row.lesson_id))
+        rows, changed = [], []
+        for student_id, profile in profiles.items():
+            kept = current.get(student_id, ())
+            floor = min(kept) if len(kept) >= TOP_K else None
+            scored = [pair for pair in score(profile, lessons) if floor is None or pair > floor]
+            if scored:
+                changed.append(student_id)
+                rows.extend({'student_id': student_id, 'lesson_id': lesson_id, 'score': value, 'computed_at': now}
+                            for value, lesson_id in scored)
+        if rows:
+            db.session.execute(insert(LessonRecommendation), rows)
+            db.session.execute(TRIM, {'student_ids': changed, 'top_k': TOP_K})
+
+
+def refresh_all():
+    now = datetime.now()
+    student_ids = db.session.execute(select(Student.id).order_by(Student.id)).scalars().all()
+    db.session.execute(delete(LessonRecommendation))
+    refresh_students(student_ids, CandidateLessons(now), now)
+    db.session.execute(delete(RecommendationRefresh))
+    db.session.commit()
+    return len(student_ids)
+
+
+def process_queue():
+    # Claims the queue before refreshing. Re-queuing a key that is still
+    # queued is a no-op, so deleting afterwards would drop a re-queue made
+    # during the refresh. Deleting first takes SQLite's write lock: a
+    # concurrent write either committed before it, and the refresh below
+    # reads its data, or waits for our commit and queues its key again.
+    queued = db.session.execute(
+        delete(refreshes).returning(refreshes.c.kind, refreshes.c.ref_id)
+    ).all()
+    if not queued:
+        return 0, 0
+    lesson_ids = [ref_id for kind, ref_id in queued if kind == 'lesson']
+    student_ids = [ref_id for kind, ref_id in queued if kind == 'student']
+    if lesson_ids:
+        refresh_lessons(lesson_ids)
+    if student_ids:
+        existing = set(db.session.execute(select(Student.id).where(Student.id.in_(student_ids))).scalars())
+        db.session.execute(delete(LessonRecommendation).where(
+            LessonRecommendation.student_id.in_([id for id in student_ids if id not in existing])))
+        refresh_students(sorted(existing))
+    return len(student_ids), len(lesson_ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def queue_refreshes(session, flush_context):
+    marks = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Enrollment):
+            marks.add(('student', obj.student_id))
+            marks.add(('lesson', obj.lesson_id))
+        elif isinstance(obj, Lesson):
+            marks.add(('lesson', obj.id))
+        elif isinstance(obj, Student) and (obj in session.new or obj in session.deleted):
+            marks.add(('student', obj.id))
+    marks = [{'kind': kind, 'ref_id': ref_id} for kind, ref_id in marks if ref_id is not None]
+    if marks:
+        session.connection().execute(sqlite_insert(refreshes).values(marks).on_conflict_do_nothing())
+
+
+def recommended_lessons(student_id, limit):
+    rows = db.session.execute(
+        select(LessonRecommendation.score, Lesson.id, Lesson.title, Lesson.level, Lesson.start,
+               Lesson.end, Lesson.capacity, Lesson.price, Lesson.teacher_id)
+        .join(Lesson, LessonRecommendation.lesson_id == Lesson.id)
+        .where(LessonRecommendation.student_id == student_id,
+               Lesson.start > datetime.now(), Lesson.is_full.is_(False))
+        .order_by(LessonRecommendation.score.desc())
+        .limit(limit)
+    ).all()
+    return [{
+        'score': row.score,
+        'lesson': {
+            'id': row.id,
+            'title': row.title,
+            'level': row.level,
+            'start': row.start.strftime('%Y-%m-%d %H:%M:%S'),
+            'end': row.end.strftime('%Y-%m-%d %H:%M:%S'),
+            'capacity': row.capacity,
+            'price': str(row.price),
+            'teacher_id': row.teacher_id,
+        },
+    } for row in rows]
+
+
+recommendations_cli = AppGroup('recommendations', help='Maintain precomputed lesson recommendations.')
+
+
+@recommendations_cli.command('refresh')
+@click.option('--full', is_flag=True, help='Recompute every student instead of only queued changes.')
+def refresh_command(full):
+    """Recompute recommendation scores."""
+    if full:
+        click.echo(f'refreshed recommendations for {refresh_all()} students')
+    else:
+        students, lessons = process_queue()
+        db.session.commit()
+        click.echo(f'refreshed {students} students and {lessons} lessons')
@@ -0,0 +1,166 @@
+from decimal import Decimal
+from itertools import groupby
+import json
+import os
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, or_, select, union
+
+from config import db
+from models import Student, Payment, LessonCreditHistory
+
+PURCHASE_MEMO = "purchase credit"
+BATCH_SIZE = 1000
+CENT = Decimal("0.01")
+
+
+def _money(value):
+    return Decimal(value or 0).quantize(CENT)
+
+
+def _stream(stmt):
+    # yield_per keeps only one batch of rows in memory per source
+    rows = db.session.execute(stmt.execution_options(yield_per=BATCH_SIZE))
+    for student_id, group in groupby(rows, key=lambda row: row.student_id):
+        yield student_id, list(group)
+
+
+class _Source:
+    def __init__(self, stmt):
+        self._groups = _stream(stmt)
+        self._advance()
+
+    def _advance(self):
+        self.student_id, self.rows = next(self._groups, (None, []))
+
+    def take(self, student_id):
+        # Rows for students missing from the students stream (e.g. payments
+        # left behind after a student was deleted) are returned as orphans.
+        orphans = []
+        while self.student_id is not None and (student_id is None or self.student_id < student_id):
+            orphans.append((self.student_id, self.rows))
+            self._advance()
+        rows = []
+        if student_id is not None and self.student_id == student_id:
+            rows = self.rows
+            self._advance()
+        return orphans, rows
+
+
+def check_student(student_id, balance, payments, histories):
+    problems = []
+    paid = sum((_money(p.lesson_credit) for p in payments), Decimal(0))
+    purchases = [h for h in histories if h.memo == PURCHASE_MEMO]
+    purchased = sum((_money(h.new_credit) - _money(h.old_credit) for h in purchases), Decimal(0))
+
+    if len(payments) != len(purchases):
+        problems.append(f"{len(payments)} payments but {len(purchases)} purchase credit entries")
+    if paid != purchased:
+        problems.append(f"payments total {paid} but purchase credit entries total {purchased}")
+
+    previous = None
+    for h in histories:
+        if previous is not None and _money(h.old_credit) != _money(previous.new_credit):
+            problems.append(
+                f"credit history {h.id} starts at {_money(h.old_credit)} "
+                f"but history {previous.id} ended at {_money(previous.new_credit)}"
+            )
+        previous = h
+
+    if previous is not None and balance is not None and _money(balance) != _money(previous.new_credit):
+        problems.append(f"balance {_money(balance)} but last credit history entry is {_money(previous.new_credit)}")
+
+    return [(student_id, problem) for problem in problems]
+
+
+def reconcile(last_payment_id=0, last_history_id=0, recheck=()):
+    max_payment_id = db.session.scalar(select(func.coalesce(func.max(Payment.id), 0)))
+    max_history_id = db.session.scalar(select(func.coalesce(func.max(LessonCreditHistory.id), 0)))
+
+    students = select(Student.id.label("student_id"), Student.lesson_credit).order_by(Student.id)
+    payments = (select(Payment.student_id, Payment.id, Payment.lesson_credit)
+                .where(Payment.id <= max_payment_id, Payment.student_id.isnot(None))
+                .order_by(Payment.student_id, Payment.id))
+    histories = (select(LessonCreditHistory.student_id, LessonCreditHistory.id,
+                        LessonCreditHistory.old_credit, LessonCreditHistory.new_credit,
+                        LessonCreditHistory.memo)
+                 .where(LessonCreditHistory.id <= max_history_id, LessonCreditHistory.student_id.isnot(None))
+                 .order_by(LessonCreditHistory.student_id, LessonCreditHistory.id))
+
+    if last_payment_id or last_history_id:
+        touched = union(
+            select(Payment.student_id).where(Payment.id > last_payment_id),
+            select(LessonCreditHistory.student_id).where(LessonCreditHistory.id > last_history_id),
+        ).subquery()
+        changed = select(touched.c.student_id)
+        students = students.where(or_(Student.id.in_(changed), Student.id.in_(list(recheck))))
+        payments = payments.where(or_(Payment.student_id.in_(changed), Payment.student_id.in_(list(recheck))))
+        histories = histories.where(or_(LessonCreditHistory.student_id.in_(changed),
+                                        LessonCreditHistory.student_id.in_(list(recheck))))
+
+    payment_source = _Source(payments)
+    history_source = _Source(histories)
+    discrepancies = []
+    checked = 0
+
+    for student_id, rows in _stream(students):
+        orphan_payments, student_payments = payment_source.take(student_id)
+        orphan_histories, student_histories = history_source.take(student_id)
+        for orphan_id, orphan_rows in orphan_payments:
+            discrepancies.append((orphan_id, f"{len(orphan_rows)} payments for a missing student"))
+        for orphan_id, orphan_rows in orphan_histories:
+            discrepancies.append((orphan_id, f"{len(orphan_rows)} credit history entries for a missing student"))
+        discrepancies.extend(check_student(student_id, rows[0].lesson_credit, student_payments, student_histories))
+        checked += 1
+
+    for orphan_id, orphan_rows in payment_source.take(None)[0]:
+        discrepancies.append((orphan_id, f"{len(orphan_rows)} payments for a missing student"))
+    for orphan_id, orphan_rows in history_source.take(None)[0]:
+        discrepancies.append((orphan_id, f"{len(orphan_rows)} credit history entries for a missing student"))
+
+    checkpoint = {
+        "payment_id": max_payment_id,
+        "history_id": max_history_id,
+        "recheck": sorted({student_id for student_id, _ in discrepancies if student_id is not None}),
+    }
+    return checked, discrepancies, checkpoint
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+@click.command("reconcile")
+@click.option("--checkpoint", "checkpoint_path", default="reconcile_checkpoint.json",
+              show_default=True, help="File recording the last reconciled payment and credit history ids.")
+@click.option("--full", is_flag=True, help="Ignore the checkpoint and reconcile every student.")
+@with_appcontext
+def reconcile_command(checkpoint_path, full):
+    """Check payments, purchase credit history and student balances agree."""
+    checkpoint = {} if full else load_checkpoint(checkpoint_path)
+    checked, discrepancies, new_checkpoint = reconcile(
+        last_payment_id=checkpoint.get("payment_id", 0),
+        last_history_id=checkpoint.get("history_id", 0),
+        recheck=checkpoint.get("recheck", []),
+    )
+
+    for student_id, problem in discrepancies:
+        click.echo(f"student {student_id}: {problem}")
+    click.echo(f"checked {checked} students, {len(discrepancies)} discrepancies "
+               f"(payments up to {new_checkpoint['payment_id']}, "
+               f"credit history up to {new_checkpoint['history_id']})")
+
+    save_checkpoint(checkpoint_path, new_checkpoint)
+    if discrepancies:
+        raise SystemExit(1)
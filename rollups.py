@@ -0,0 +1,289 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, event, func, insert, inspect, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from config import db
+from models import (Lesson, Enrollment, Payment, DailyTeacherRollup,
+                    DailyLevelRollup, DailyCreditRollup, ArchivedLesson, ArchivedEnrollment)
+
+enrollments = Enrollment.__table__
+lessons = Lesson.__table__
+payments = Payment.__table__
+archived_enrollments = ArchivedEnrollment.__table__
+archived_lessons = ArchivedLesson.__table__
+
+
+def _day(value):
+    if value is None:
+        return datetime.now(timezone.utc).date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _contribution(status, cost, count=1):
+    # an enrollment without a status yet gets the column default, 'registered'
+    if status == 'waitlisted':
+        return (0, count, Decimal(0))
+    return (count, 0, Decimal(cost or 0))
+
+
+def _changed(obj, attr):
+    return inspect(obj).attrs[attr].history.has_changes()
+
+
+def _teacher_id(lesson):
+    # assigning lesson.teacher only reaches teacher_id at flush, so prefer a
+    # loaded teacher's id; reading the attribute would lazy load it
+    teacher = inspect(lesson).dict.get('teacher')
+    if teacher is not None and teacher.id is not None:
+        return teacher.id
+    return lesson.teacher_id
+
+
+def _lesson_for(session, enrollment):
+    if enrollment.lesson is not None:
+        return enrollment.lesson
+    if enrollment.lesson_id is not None:
+        return session.get(Lesson, enrollment.lesson_id)
+    return None
+
+
+@event.listens_for(Session, 'before_flush')
+def track_rollups(session, flush_context, instances):
+    new = [o for o in session.new if isinstance(o, Enrollment)]
+    changed = [o for o in session.dirty if isinstance(o, Enrollment) and session.is_modified(o)]
+    removed = [o for o in session.deleted if isinstance(o, Enrollment)]
+    moved_lessons = [o for o in session.dirty if isinstance(o, Lesson)
+                     and (_changed(o, 'level') or _changed(o, 'teacher_id') or _changed(o, 'teacher'))]
+    purchases = [o for o in session.new if isinstance(o, Payment)]
+    if not (new or changed or removed or moved_lessons or purchases):
+        return
+
+    # (day, teacher_id, level) -> [registered, waitlisted, revenue]
+    deltas = defaultdict(lambda: [0, 0, Decimal(0)])
+
+    def apply(key, contribution, sign):
+        totals = deltas[key]
+        for i, value in enumerate(contribution):
+            totals[i] += sign * value
+
+    connection = session.connection()
+    with session.no_autoflush:
+        handled_ids = [o.id for o in changed + removed if o.id is not None]
+        old_rows = {}
+        if handled_ids:
+            rows = connection.execute(
+                select(enrollments.c.id, enrollments.c.status, enrollments.c.cost,
+                       enrollments.c.created_at, lessons.c.teacher_id, lessons.c.level)
+                .select_from(enrollments.join(lessons, enrollments.c.lesson_id == lessons.c.id))
+                .where(enrollments.c.id.in_(handled_ids))
+            )
+            old_rows = {row.id: row for row in rows}
+
+        for enrollment in removed + changed:
+            row = old_rows.get(enrollment.id)
+            if row is not None:
+                apply((_day(row.created_at), row.teacher_id, row.level),
+                      _contribution(row.status, row.cost), -1)
+        for enrollment in changed:
+            row = old_rows.get(enrollment.id)
+            lesson = _lesson_for(session, enrollment)
+            if row is not None and lesson is not None:
+                apply((_day(row.created_at), _teacher_id(lesson), lesson.level),
+                      _contribution(enrollment.status, enrollment.cost), 1)
+        for enrollment in new:
+            lesson = _lesson_for(session, enrollment)
+            if lesson is not None:
+                apply((_day(None), _teacher_id(lesson), lesson.level),
+                      _contribution(enrollment.status, enrollment.cost), 1)
+
+        for lesson in moved_lessons:
+            old = connection.execute(
+                select(lessons.c.teacher_id, lessons.c.level).where(lessons.c.id == lesson.id)
+            ).first()
+            if old is None:
+                continue
+            rows = connection.execute(
+                select(func.date(enrollments.c.created_at).label('day'), enrollments.c.status,
+                       func.count().label('count'), func.sum(enrollments.c.cost).label('cost'))
+                .where(enrollments.c.lesson_id == lesson.id, enrollments.c.id.notin_(handled_ids))
+                .group_by(func.date(enrollments.c.created_at), enrollments.c.status)
+            )
+            for row in rows:
+                contribution = _contribution(row.status, row.cost, row.count)
+                apply((_day(row.day), old.teacher_id, old.level), contribution, -1)
+                apply((_day(row.day), _teacher_id(lesson), lesson.level), contribution, 1)
+
+    by_teacher = defaultdict(lambda: [0, 0, Decimal(0)])
+    by_level = defaultdict(lambda: [0, 0, Decimal(0)])
+    for (day, teacher_id, level), totals in deltas.items():
+        for target, key in ((by_teacher, (day, teacher_id)), (by_level, (day, level))):
+            if key[1] is None:
+                continue
+            for i, value in enumerate(totals):
+                target[key][i] += value
+
+    _upsert(connection, DailyTeacherRollup.__table__, 'teacher_id', by_teacher)
+    _upsert(connection, DailyLevelRollup.__table__, 'level', by_level)
+
+    credit = defaultdict(lambda: [0, Decimal(0)])
+    for payment in purchases:
+        totals = credit[_day(None)]
+        totals[0] += 1
+        totals[1] += Decimal(str(payment.lesson_credit or 0))
+    if credit:
+        table = DailyCreditRollup.__table__
+        stmt = sqlite_insert(table).values([
+            {'day': day, 'purchases': count, 'purchased': amount}
+            for day, (count, amount) in credit.items()
+        ])
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['day'],
+            set_={'purchases': table.c.purchases + stmt.excluded.purchases,
+                  'purchased': table.c.purchased + stmt.excluded.purchased},
+        ))
+
+
+def _upsert(connection, table, key_column, totals):
+    values = [
+        {'day': day, key_column: key, 'registered': registered,
+         'waitlisted': waitlisted, 'revenue': revenue}
+        for (day, key), (registered, waitlisted, revenue) in totals.items()
+        if registered or waitlisted or revenue
+    ]
+    if not values:
+        return
+    stmt = sqlite_insert(table).values(values)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['day', key_column],
+        set_={'registered': table.c.registered + stmt.excluded.registered,
+              'waitlisted': table.c.waitlisted + stmt.excluded.waitlisted,
+              'revenue': table.c.revenue + stmt.excluded.revenue},
+    ))
+
+
+def _history():
+    # enrollments of archived lessons still count towards the days they were made
+    return union_all(*(
+        select(e.c.status, e.c.cost, e.c.created_at, l.c.teacher_id, l.c.level)
+        .select_from(e.join(l, e.c.lesson_id == l.c.id))
+        for e, l in ((enrollments, lessons), (archived_enrollments, archived_lessons))
+    )).subquery()
+
+
+def rebuild(start, end):
+    start_at = datetime.combine(start, time.min)
+    end_at = datetime.combine(end + timedelta(days=1), time.min)
+    history = _history()
+    day = func.date(history.c.created_at)
+    registered = func.sum(case((history.c.status == 'waitlisted', 0), else_=1))
+    waitlisted = func.sum(case((history.c.status == 'waitlisted', 1), else_=0))
+    revenue = func.coalesce(func.sum(case((history.c.status == 'waitlisted', 0), else_=history.c.cost)), 0)
+    in_range = (history.c.created_at >= start_at, history.c.created_at < end_at)
+
+    for model in (DailyTeacherRollup, DailyLevelRollup, DailyCreditRollup):
+        db.session.execute(delete(model).where(model.day.between(start, end)))
+
+    db.session.execute(insert(DailyTeacherRollup).from_select(
+        ['day', 'teacher_id', 'registered', 'waitlisted', 'revenue'],
+        select(day, history.c.teacher_id, registered, waitlisted, revenue)
+        .where(*in_range, history.c.teacher_id.isnot(None))
+        .group_by(day, history.c.teacher_id)
+    ))
+    db.session.execute(insert(DailyLevelRollup).from_select(
+        ['day', 'level', 'registered', 'waitlisted', 'revenue'],
+        select(day, history.c.level, registered, waitlisted, revenue)
+        .where(*in_range)
+        .group_by(day, history.c.level)
+    ))
+    payment_day = func.date(payments.c.created_at)
+    db.session.execute(insert(DailyCreditRollup).from_select(
+        ['day', 'purchases', 'purchased'],
+        select(payment_day, func.count(), func.coalesce(func.sum(payments.c.lesson_credit), 0))
+        .where(payments.c.created_at >= start_at, payments.c.created_at < end_at)
+        .group_by(payment_day)
+    ))
+
+
+def backfill(start=None, end=None, chunk_days=31):
+    if start is None:
+        first = db.session.scalar(select(func.min(_history().c.created_at)))
+        first_payment = db.session.scalar(select(func.min(payments.c.created_at)))
+        candidates = [_day(value) for value in (first, first_payment) if value is not None]
+        start = min(candidates) if candidates else _day(None)
+    end = end or _day(None)
+
+    day = start
+    while day <= end:
+        chunk_end = min(end, day + timedelta(days=chunk_days - 1))
+        rebuild(day, chunk_end)
+        db.session.commit()
+        yield day, chunk_end
+        day = chunk_end + timedelta(days=1)
+
+
+def _sum_rows(model, key_column, start, end, *criteria):
+    stmt = (
+        select(key_column, func.sum(model.registered), func.sum(model.waitlisted), func.sum(model.revenue))
+        .where(model.day.between(start, end), *criteria)
+        .group_by(key_column)
+        .order_by(key_column)
+    )
+    return db.session.execute(stmt).all()
+
+
+def _money(value):
+    return str(Decimal(value or 0).quantize(Decimal('0.01')))
+
+
+def revenue_report(start, end, teacher_id=None):
+    # With a teacher_id only that teacher's enrollments are reported. The
+    # level and credit rollups have no teacher column, so those school-wide
+    # sections are left out of a teacher's report.
+    def enrollment_rows(name, rows):
+        return [{name: str(key) if isinstance(key, date) else key, 'registered': registered,
+                 'waitlisted': waitlisted, 'revenue': _money(revenue)}
+                for key, registered, waitlisted, revenue in rows]
+
+    teacher = [DailyTeacherRollup.teacher_id == teacher_id] if teacher_id is not None else []
+    report = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'by_day': enrollment_rows('day', _sum_rows(DailyTeacherRollup, DailyTeacherRollup.day, start, end, *teacher)),
+        'by_teacher': enrollment_rows('teacher_id', _sum_rows(
+            DailyTeacherRollup, DailyTeacherRollup.teacher_id, start, end, *teacher)),
+    }
+    if teacher_id is not None:
+        return report
+
+    credit = db.session.execute(
+        select(DailyCreditRollup.day, DailyCreditRollup.purchases, DailyCreditRollup.purchased)
+        .where(DailyCreditRollup.day.between(start, end))
+        .order_by(DailyCreditRollup.day)
+    ).all()
+    report['by_level'] = enrollment_rows('level', _sum_rows(DailyLevelRollup, DailyLevelRollup.level, start, end))
+    report['credit_purchases'] = [{'day': day.isoformat(), 'purchases': purchases, 'purchased': _money(purchased)}
+                                  for day, purchases, purchased in credit]
+    return report
+
+
+rollups_cli = AppGroup('rollups', help='Maintain the daily revenue and enrollment rollups.')
+
+
+@rollups_cli.command('backfill')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First day to rebuild (default: earliest data).')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day to rebuild (default: today).')
+@click.option('--chunk-days', default=31, show_default=True, help='Days rebuilt per transaction.')
+def backfill_command(start, end, chunk_days):
+    """Rebuild rollup rows from enrollments and payments."""
+    for chunk_start, chunk_end in backfill(start and start.date(), end and end.date(), chunk_days):
+        click.echo(f'rebuilt {chunk_start} to {chunk_end}')
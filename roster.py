@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from sqlalchemy import and_, case, func, select
+
+from config import db
+from models import Student, Lesson, Enrollment
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _aggregates(now):
+    registered = Enrollment.status == 'registered'
+    return (
+        func.count(case((and_(registered, Lesson.start <= now), Enrollment.id))).label('lessons_taken'),
+        func.count(case((and_(registered, Lesson.start > now), Enrollment.id))).label('upcoming_lessons'),
+        func.max(case((and_(registered, Lesson.start <= now), Lesson.start))).label('last_lesson'),
+        func.count(case((and_(Enrollment.status == 'waitlisted', Lesson.start > now), Enrollment.id)))
+            .label('outstanding_waitlists'),
+    )
+
+
+SORTS = {
+    'last_name': (Student.last_name, Student.first_name),
+    'first_name': (Student.first_name, Student.last_name),
+    'lessons_taken': ('lessons_taken',),
+    'last_lesson': ('last_lesson',),
+    'outstanding_waitlists': ('outstanding_waitlists',),
+}
+
+
+def teacher_roster(teacher_id, page, per_page, sort='last_name', order='asc', now=None):
+    now = now or datetime.now()
+    aggregates = _aggregates(now)
+    columns = {column.name: column for column in aggregates}
+    keys = [columns[key] if isinstance(key, str) else key for key in SORTS[sort]]
+    direction = (lambda key: key.desc()) if order == 'desc' else (lambda key: key.asc())
+
+    rows = db.session.execute(
+        select(Student.id, Student.username, Student.first_name, Student.last_name,
+               Student.email, Student.phone, Student.avatar, *aggregates)
+        .join(Enrollment, Enrollment.student_id == Student.id)
+        .join(Lesson, Enrollment.lesson_id == Lesson.id)
+        .where(Lesson.teacher_id == teacher_id)
+        .group_by(Student.id)
+        .order_by(*[direction(key).nulls_last() for key in keys], Student.id)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
+    total = db.session.scalar(
+        select(func.count(Enrollment.student_id.distinct()))
+        .join(Lesson, Enrollment.lesson_id == Lesson.id)
+        .where(Lesson.teacher_id == teacher_id)
+    )
+    return [{
+        'id': row.id,
+        'username': row.username,
+        'first_name': row.first_name,
+        'last_name': row.last_name,
+        'email': row.email,
+        'phone': row.phone,
+        'avatar': row.avatar,
+        'lessons_taken': row.lessons_taken,
+        'upcoming_lessons': row.upcoming_lessons,
+        'last_lesson': row.last_lesson.strftime(DATETIME_FORMAT) if row.last_lesson else None,
+        'outstanding_waitlists': row.outstanding_waitlists,
+    } for row in rows], total
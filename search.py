@@ -0,0 +1,70 @@
+import re
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.orm import selectinload
+
+from config import db
+from models import Lesson, Enrollment, Feedback
+
+
+def fts_ddl(table, fts_table, columns):
+    cols = ', '.join(columns)
+    new_cols = ', '.join(f'new.{c}' for c in columns)
+    old_cols = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id', tokenize='porter unicode61', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+    ]
+
+
+LESSON_FTS = fts_ddl('lessons', 'lessons_fts', ['title', 'description'])
+ENROLLMENT_FTS = fts_ddl('enrollments', 'enrollments_fts', ['comment'])
+FEEDBACK_FTS = fts_ddl('feedbacks', 'feedbacks_fts', ['message'])
+
+# db.create_all() builds the indexes too; migrations run the same statements
+for model, statements in ((Lesson, LESSON_FTS), (Enrollment, ENROLLMENT_FTS), (Feedback, FEEDBACK_FTS)):
+    for statement in statements:
+        event.listen(model.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def match_expression(q):
+    # Quote every word so user input can never be parsed as FTS5 syntax;
+    # the trailing * lets "chash" find "chashaku".
+    words = re.findall(r'\w+', q or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+LESSON_SEARCH = text("""
+    SELECT rowid AS id FROM lessons_fts
+    WHERE lessons_fts MATCH :match
+    ORDER BY bm25(lessons_fts, 5.0, 1.0)
+    LIMIT :limit OFFSET :offset
+""")
+
+LESSON_SEARCH_COUNT = text("SELECT count(*) FROM lessons_fts WHERE lessons_fts MATCH :match")
+
+
+def search_lessons(q, page, per_page):
+    match = match_expression(q)
+    if match is None:
+        return [], 0
+
+    params = {'match': match, 'limit': per_page, 'offset': (page - 1) * per_page}
+    ids = db.session.execute(LESSON_SEARCH, params).scalars().all()
+    total = db.session.execute(LESSON_SEARCH_COUNT, {'match': match}).scalar()
+    if not ids:
+        return [], total
+
+    # results show the teacher's name, so load the teachers with the page
+    lessons = {lesson.id: lesson for lesson in
+               Lesson.query.options(selectinload(Lesson.teacher)).filter(Lesson.id.in_(ids))}
+    return [lessons[id] for id in ids if id in lessons], total
@@ -1,9 +1,14 @@
-from datetime import datetime, timedelta
+from array import array
+from datetime import date, datetime, time, timedelta
+import argparse
 import random
 from faker import Faker
-from app import app
+from sqlalchemy import delete, insert, text, update
+from app import create_app
 from config import db
 from models import Student, Teacher, Lesson, Enrollment, Feedback, Payment, LessonCreditHistory
+import recommendations
+import rollups
 from assets.avatars import student_avatars, teacher_avatars
 from assets.bio import bio_samples
 from assets.feedback import comments
@@ -160,6 +165,163 @@ def seed_enrollments(num_enrollments, num_students, num_lessons):
 
     db.session.commit()
 
+BULK_PASSWORD = "teahello"
+# bcrypt salts every hash, so a hash made per run would differ between two
+# runs with the same seed; this one was made once from BULK_PASSWORD
+BULK_PASSWORD_HASH = "$2b$12$RIqNPAonpgDcZfAv/wbi0.5QFbKHrQfBsfm9xEF89BrtliNFg1ABO"
+# the default --anchor, so a bulk dataset does not depend on the day it is made
+BULK_ANCHOR = date(2026, 1, 15)
+CHUNK_SIZE = 20000
+NO_FEEDBACK = "No feedback provided yet!"
+
+def chunked(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def bulk_insert(model, rows):
+    count = 0
+    for chunk in chunked(rows):
+        db.session.execute(insert(model.__table__), chunk)
+        count += len(chunk)
+    return count
+
+def name_pools(faker, size=1000):
+    # Faker is far too slow to call per row at this scale, so rows draw from
+    # fixed pools generated once from the seeded Faker instance
+    return {
+        'first_name': [faker.first_name() for _ in range(size)],
+        'last_name': [faker.last_name() for _ in range(size)],
+        'street': [faker.street_address() for _ in range(size)],
+        'secondary': [faker.secondary_address() for _ in range(size)],
+        'city': [faker.city() for _ in range(size)],
+        'state': [faker.state() for _ in range(size)],
+        'country': [faker.country() for _ in range(size)],
+    }
+
+def person(rng, pools, i, kind, password_hash, created_at):
+    first_name = rng.choice(pools['first_name'])
+    last_name = rng.choice(pools['last_name'])
+    username = f"{first_name}{last_name}{i}".lower().replace(" ", "")
+    return {
+        'id': i,
+        'username': username,
+        'email': f"{username}@{kind}.example.com",
+        '_password_hash': password_hash,
+        'first_name': first_name,
+        'last_name': last_name,
+        'phone': "123-456-7890",
+        'address_line1': rng.choice(pools['street']),
+        'address_line2': rng.choice(pools['secondary']),
+        'city': rng.choice(pools['city']),
+        'state': rng.choice(pools['state']),
+        'country': rng.choice(pools['country']),
+        'created_at': created_at,
+    }
+
+def bulk_seed(seed, num_students, num_teachers, num_lessons, num_enrollments, anchor):
+    rng = random.Random(seed)
+    faker = Faker()
+    faker.seed_instance(seed)
+    pools = name_pools(faker)
+    anchor = datetime.combine(anchor, time.min)
+    created_at = anchor - timedelta(days=90)
+    # one bcrypt hash shared by every bulk user instead of one per row
+    password_hash = BULK_PASSWORD_HASH
+
+    db.session.execute(text("PRAGMA synchronous = OFF"))
+    # every table the app owns, archives, rollups and change log included, so
+    # a reseed never depends on what ran before it; children go first
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(delete(table))
+    db.session.execute(text("DELETE FROM sqlite_sequence"))
+
+    students = bulk_insert(Student, (
+        dict(person(rng, pools, i, 'student', password_hash, created_at),
+             avatar=student_avatars[i % len(student_avatars)],
+             lesson_credit=rng.randint(0, 300))
+        for i in range(1, num_students + 1)
+    ))
+    teachers = bulk_insert(Teacher, (
+        dict(person(rng, pools, i, 'teacher', password_hash, created_at),
+             avatar=teacher_avatars[i % len(teacher_avatars)],
+             teaching_since=anchor - timedelta(days=rng.randint(365, 365 * 20)),
+             bio=bio_samples[i % len(bio_samples)])
+        for i in range(1, num_teachers + 1)
+    ))
+
+    # per-lesson state kept in flat arrays so capacity is tracked in memory
+    capacity = array('b')
+    price = array('h')
+    starts = []
+
+    def lesson_rows():
+        for i in range(1, num_lessons + 1):
+            start = anchor + timedelta(days=rng.randint(-30, 30), hours=rng.randint(9, 17))
+            capacity.append(rng.randint(1, 5))
+            price.append(rng.randint(30, 50))
+            starts.append(start)
+            yield {
+                'id': i,
+                'title': lesson_titles[i % 30],
+                'description': lesson_content[i % 30],
+                'level': rng.randint(1, 5),
+                'start': start,
+                'end': start + timedelta(hours=rng.randint(1, 3)),
+                'capacity': capacity[-1],
+                'price': price[-1],
+                'is_full': False,
+                'teacher_id': rng.randint(1, num_teachers),
+            }
+
+    lessons = bulk_insert(Lesson, lesson_rows())
+
+    registered = array('b', bytes(num_lessons))
+    feedback_cutoff = anchor + timedelta(days=2)
+    per_student = num_enrollments / max(num_students, 1)
+
+    def enrollment_rows():
+        budget = num_enrollments
+        for student_id in range(1, num_students + 1):
+            count = min(budget, num_lessons, rng.randint(0, round(2 * per_student)))
+            budget -= count
+            for index in rng.sample(range(num_lessons), count):
+                lesson_start = starts[index]
+                row = {
+                    'cost': price[index],
+                    'student_id': student_id,
+                    'lesson_id': index + 1,
+                    'created_at': min(lesson_start, anchor) - timedelta(days=rng.randint(0, 29), minutes=rng.randint(1, 600)),
+                }
+                if registered[index] >= capacity[index]:
+                    row.update(status='waitlisted', comment=NO_FEEDBACK)
+                else:
+                    registered[index] += 1
+                    row.update(status='registered',
+                               comment=NO_FEEDBACK if lesson_start > feedback_cutoff else comments[rng.randrange(60)])
+                yield row
+
+    enrollments = bulk_insert(Enrollment, enrollment_rows())
+
+    full = [index + 1 for index in range(num_lessons) if registered[index] >= capacity[index]]
+    for chunk in chunked(full, 500):
+        db.session.execute(update(Lesson.__table__).where(Lesson.id.in_(chunk)).values(is_full=True))
+    db.session.commit()
+
+    # Core inserts bypass the ORM flush listeners, so rebuild the rollups and
+    # score every student here. The sync change log is left empty: a first
+    # sync (since=0) reads the tables themselves, and cursors handed out
+    # before a reseed belong to the old dataset, so clients start over.
+    for _ in rollups.backfill():
+        pass
+    recommendations.refresh_all()
+    return students, teachers, lessons, enrollments
+
 NUM_STUDENTS = 10
 NUM_TEACHERS = 9
 NUM_LESSONS = 45
@@ -167,16 +329,39 @@ NUM_ENROLLMENTS = 150
 NUM_FEEDBACKS = 30
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Seed the database with sample data.")
+    parser.add_argument('--bulk', action='store_true', help="generate a large deterministic dataset with bulk inserts")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scale', type=float, default=1000, help="multiplier applied to every default count")
+    parser.add_argument('--students', type=int)
+    parser.add_argument('--teachers', type=int)
+    parser.add_argument('--lessons', type=int)
+    parser.add_argument('--enrollments', type=int)
+    parser.add_argument('--anchor', type=date.fromisoformat, default=BULK_ANCHOR,
+                        help=f"date lessons are spread around (YYYY-MM-DD, default {BULK_ANCHOR})")
+    args = parser.parse_args()
 
-    with app.app_context():
-        clear_students()
-        clear_teachers()
-        clear_lessons()
-        clear_enrollments()
-        clear_feedbacks()
-        clear_payments()
-        clear_credit_history()
-        seed_students(NUM_STUDENTS)
-        seed_teachers(NUM_TEACHERS)
-        seed_lessons(NUM_LESSONS, NUM_TEACHERS)
-        seed_enrollments(NUM_ENROLLMENTS, NUM_STUDENTS, NUM_LESSONS)
+    with create_app().app_context():
+        if args.bulk:
+            counts = bulk_seed(
+                args.seed,
+                args.students or max(1, round(NUM_STUDENTS * args.scale)),
+                args.teachers or max(1, round(NUM_TEACHERS * args.scale)),
+                args.lessons or max(1, round(NUM_LESSONS * args.scale)),
+                args.enrollments or round(NUM_ENROLLMENTS * args.scale),
+                args.anchor,
+            )
+            print("seeded {} students, {} teachers, {} lessons and {} enrollments".format(*counts))
+            print(f"every bulk user's password is {BULK_PASSWORD!r}")
+        else:
+            clear_students()
+            clear_teachers()
+            clear_lessons()
+            clear_enrollments()
+            clear_feedbacks()
+            clear_payments()
+            clear_credit_history()
+            seed_students(NUM_STUDENTS)
+            seed_teachers(NUM_TEACHERS)
+            seed_lessons(NUM_LESSONS, NUM_TEACHERS)
+            seed_enrollments(NUM_ENROLLMENTS, NUM_STUDENTS, NUM_LESSONS)
@@ -0,0 +1,201 @@
+from sqlalchemy import and_, delete, event, false, func, insert, inspect, or_, select, true
+from sqlalchemy.orm import Session, selectinload
+
+from config import db
+from models import Student, Lesson, Enrollment, LessonCreditHistory, Feedback, SyncChange
+
+ENTITIES = {
+    Lesson: 'lesson',
+    Enrollment: 'enrollment',
+    LessonCreditHistory: 'credit_history',
+    Feedback: 'feedback',
+}
+COLLECTIONS = {
+    'lesson': 'lessons',
+    'enrollment': 'enrollments',
+    'credit_history': 'credit_history',
+    'feedback': 'feedback',
+}
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+
+changes = SyncChange.__table__
+
+
+def _lesson(session, obj):
+    # relationships of objects that were pending before this flush do not
+    # lazy load yet, so go through the foreign key unless it is already loaded
+    lesson = inspect(obj).dict.get('lesson')
+    if lesson is not None or obj.lesson_id is None:
+        return lesson
+    return session.get(Lesson, obj.lesson_id)
+
+
+def _owners(session, obj):
+    # (student_id, teacher_id) the change is visible to; lessons are public
+    if isinstance(obj, Lesson):
+        return None, obj.teacher_id
+    if isinstance(obj, LessonCreditHistory):
+        return obj.student_id, None
+    lesson = _lesson(session, obj)
+    return obj.student_id, lesson.teacher_id if lesson is not None else None
+
+
+@event.listens_for(Session, 'after_flush')
+def record_changes(session, flush_context):
+    marks = {}
+    with session.no_autoflush:
+        changed = [obj for obj in list(session.new) + list(session.dirty)
+                   if type(obj) in ENTITIES and (obj in session.new or session.is_modified(obj, include_collections=False))]
+        deleted = [obj for obj in session.deleted if type(obj) in ENTITIES]
+        for obj in changed + deleted:
+            lesson = _lesson(session, obj) if isinstance(obj, Enrollment) else None
+            if lesson is not None:
+                # serialized lessons embed their enrollments
+                marks['lesson', lesson.id] = (False, *_owners(session, lesson))
+        for obj in changed:
+            marks[ENTITIES[type(obj)], obj.id] = (False, *_owners(session, obj))
+        # deletes last, so a row removed in this flush ends up as a tombstone
+        for obj in deleted:
+            marks[ENTITIES[type(obj)], obj.id] = (True, *_owners(session, obj))
+
+    record(session.connection(), marks)
+
+
+def record(connection, marks):
+    # marks maps (entity, id) -> (deleted, student_id, teacher_id); bulk writers
+    # that bypass the flush listener call this with their own marks
+    marks = {key: value for key, value in marks.items() if key[1] is not None}
+    if not marks:
+        return
+    # one row per entity: a change replaces the row with a newer sequence number
+    for entity in {entity for entity, _ in marks}:
+        connection.execute(delete(changes).where(
+            changes.c.entity == entity,
+            changes.c.entity_id.in_([id for kind, id in marks if kind == entity])
+        ))
+    connection.execute(insert(changes), [
+        {'entity': entity, 'entity_id': id, 'deleted': deleted, 'student_id': student_id, 'teacher_id': teacher_id}
+        for (entity, id), (deleted, student_id, teacher_id) in marks.items()
+    ])
+
+
+def _visible(user_id, role):
+    owner = changes.c.student_id if role == 'student' else changes.c.teacher_id
+    return or_(changes.c.entity == 'lesson', owner == user_id)
+
+
+def _lessons(criterion):
+    return Lesson.query.options(
+        selectinload(Lesson.teacher),
+        selectinload(Lesson.enrollments).selectinload(Enrollment.student).selectinload(Student.lesson_credit_history),
+    ).filter(criterion)
+
+
+def _enrollments(criterion):
+    return Enrollment.query.options(
+        selectinload(Enrollment.student).selectinload(Student.lesson_credit_history),
+        selectinload(Enrollment.lesson).selectinload(Lesson.teacher),
+    ).filter(criterion)
+
+
+def _credit_history(criterion):
+    return LessonCreditHistory.query.options(selectinload(LessonCreditHistory.student)).filter(criterion)
+
+
+def _feedback(criterion):
+    return Feedback.query.filter(criterion)
+
+
+LOADERS = {
+    'lesson': (_lessons, Lesson.id),
+    'enrollment': (_enrollments, Enrollment.id),
+    'credit_history': (_credit_history, LessonCreditHistory.id),
+    'feedback': (_feedback, Feedback.id),
+}
+
+
+def _snapshot(user_id, role):
+    if role == 'student':
+        return {
+            'lesson': true(),
+            'enrollment': Enrollment.student_id == user_id,
+            'credit_history': LessonCreditHistory.student_id == user_id,
+            'feedback': Feedback.student_id == user_id,
+        }
+    return {
+        'lesson': true(),
+        'enrollment': Enrollment.lesson.has(teacher_id=user_id),
+        'credit_history': false(),
+        'feedback': Feedback.lesson.has(teacher_id=user_id),
+    }
+
+
+def parse_cursor(raw):
+    # "<seq>" for a delta, or "<seq>:<entity>:<id>" part way through a first
+    # sync: the rows after <id> of <entity>, then the entities after it
+    parts = raw.split(':')
+    if len(parts) == 1 and raw.isdigit():
+        return int(raw)
+    if len(parts) == 3 and parts[0].isdigit() and parts[1] in COLLECTIONS and parts[2].isdigit():
+        return int(parts[0]), parts[1], int(parts[2])
+    raise ValueError(raw)
+
+
+def _snapshot_page(user_id, role, head, entity, after, limit):
+    # Every visible row, a page at a time in (entity, id) order. The cursor
+    # keeps the head read by the first page, so the deltas that follow the
+    # last page include whatever changed while the client was paging.
+    criteria = _snapshot(user_id, role)
+    entities = list(COLLECTIONS)
+    loaded, left = {}, limit
+    for entity in entities[entities.index(entity):]:
+        loader, id_column = LOADERS[entity]
+        rows = loader(and_(criteria[entity], id_column > after)).order_by(id_column).limit(left + 1).all()
+        loaded[entity] = rows[:left]
+        if len(rows) > left:
+            last = loaded[entity][-1].id if loaded[entity] else after
+            return loaded, f'{head}:{entity}:{last}', True
+        left -= len(rows)
+        after = 0
+    return loaded, head, False
+
+
+def changes_since(user_id, role, since, limit):
+    # The cursor is read before any data. SQLite allows one writer at a time,
+    # so sequence numbers commit in order and every change up to the cursor is
+    # visible to the reads below. pysqlite runs those reads outside a
+    # transaction, so they may also see rows committed after the cursor was
+    # read; those changes sit above the cursor and are sent again next poll.
+    deleted = {entity: [] for entity in COLLECTIONS}
+
+    if isinstance(since, tuple):
+        loaded, cursor, has_more = _snapshot_page(user_id, role, *since, limit)
+    elif since:
+        head = db.session.scalar(select(func.coalesce(func.max(changes.c.seq), 0)))
+        upserts = {entity: [] for entity in COLLECTIONS}
+        rows = db.session.execute(
+            select(changes.c.seq, changes.c.entity, changes.c.entity_id, changes.c.deleted)
+            .where(changes.c.seq > since, changes.c.seq <= head, _visible(user_id, role))
+            .order_by(changes.c.seq)
+            .limit(limit + 1)
+        ).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        cursor = rows[-1].seq if has_more else head
+        for row in rows:
+            (deleted if row.deleted else upserts)[row.entity].append(row.entity_id)
+        loaded = {entity: LOADERS[entity][0](LOADERS[entity][1].in_(ids)).all()
+                  for entity, ids in upserts.items() if ids}
+    else:
+        # a first sync gets every visible row, including ones written before
+        # the change log existed or outside the ORM
+        head = db.session.scalar(select(func.coalesce(func.max(changes.c.seq), 0)))
+        loaded, cursor, has_more = _snapshot_page(user_id, role, head, 'lesson', 0, limit)
+
+    return {
+        'cursor': cursor,
+        'has_more': has_more,
+        'changes': {COLLECTIONS[entity]: [obj.to_dict() for obj in loaded.get(entity, [])] for entity in COLLECTIONS},
+        'deleted': {COLLECTIONS[entity]: ids for entity, ids in deleted.items()},
+    }
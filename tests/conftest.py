@@ -0,0 +1,23 @@
+import os
+
+import pytest
+from flask_migrate import upgrade
+
+from app import create_app, init_migrate
+from config import TestingConfig, db
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture
+def app(tmp_path):
+    # a file database built by the real migrations, so triggers and table
+    # options match production
+    config = type('MigratedConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+    })
+    app = init_migrate(create_app(config))
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        yield app
+        db.session.remove()
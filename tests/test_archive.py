@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from archive import archive
+from config import db
+from models import Teacher, Student, Lesson, Enrollment, ArchivedLesson
+from sync import changes_since
+
+NOW = datetime(2026, 1, 1, 12)
+
+
+def add_lesson(teacher, start):
+    lesson = Lesson(title='Oolong', description='Tasting', level=1, start=start,
+                    end=start + timedelta(hours=1), capacity=3, price=30, teacher=teacher)
+    db.session.add(lesson)
+    db.session.commit()
+    return lesson.id
+
+
+def test_ids_are_not_reused_after_archival(app):
+    teacher = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    old = [add_lesson(teacher, NOW - timedelta(days=400 + n)) for n in range(2)]
+    recent = add_lesson(teacher, NOW + timedelta(days=1))
+
+    assert sum(archive(days=365, now=NOW)) == 2
+    db.session.delete(db.session.get(Lesson, recent))
+    db.session.commit()
+
+    # with max(id) + 1 this would be 1, the id of an archived lesson
+    new = add_lesson(teacher, NOW - timedelta(days=500))
+    assert new not in old + [recent]
+
+    assert sum(archive(days=365, now=NOW)) == 1
+    assert sorted(db.session.scalars(db.select(ArchivedLesson.id))) == sorted(old + [new])
+
+
+def test_archived_rows_leave_tombstones(app):
+    teacher = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    student = Student(username='mei', email='mei@example.com', first_name='Mei', last_name='Mei')
+    lesson = add_lesson(teacher, NOW - timedelta(days=400))
+    enrollment = Enrollment(lesson_id=lesson, student=student, cost=30, status='registered')
+    db.session.add(enrollment)
+    db.session.commit()
+    enrollment_id = enrollment.id
+    cursor = changes_since(student.id, 'student', 0, 500)['cursor']
+
+    assert sum(archive(days=365, now=NOW)) == 1
+    deleted = changes_since(student.id, 'student', cursor, 500)['deleted']
+    assert deleted['lessons'] == [lesson]
+    assert deleted['enrollments'] == [enrollment_id]
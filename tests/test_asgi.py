@@ -0,0 +1,128 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from flask_migrate import upgrade
+
+import availability
+import gateway
+from app import create_app, init_migrate
+from asgi import ASGIAdapter
+from config import TestingConfig, db
+from metrics import registry
+from models import Teacher, Lesson
+from tests.conftest import MIGRATIONS
+
+
+def scope(method, path, query=b'', headers=()):
+    return {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+            'headers': [(k.encode(), v.encode()) for k, v in headers]}
+
+
+def call(adapter, scope, body=b''):
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(adapter(scope, receive, send))
+    start = sent[0]
+    return start['status'], dict(start['headers']), b''.join(m.get('body', b'') for m in sent[1:])
+
+
+def cookie(app, user_id, role):
+    return 'session=' + app.session_interface.get_signing_serializer(app).dumps({'user_id': user_id, 'role': role})
+
+
+def test_checkout_runs_through_flask(app, monkeypatch):
+    monkeypatch.setattr(gateway, 'create_checkout_session',
+                        lambda **kwargs: SimpleNamespace(url='https://checkout.example.com/1'))
+    adapter = ASGIAdapter(app)
+    bridged = []
+    wsgi = adapter.wsgi
+
+    async def record(scope, body, send):
+        bridged.append(scope['path'])
+        await wsgi(scope, body, send)
+
+    adapter.wsgi = record
+    key = ('http_requests_total', (('endpoint', 'views.create_checkout_session'), ('status', '200')))
+    before = registry.counters.get(key, 0)
+
+    status, headers, body = call(adapter, scope('POST', '/create-checkout-session',
+                                                headers=[('content-type', 'application/json'),
+                                                         ('origin', 'https://school.example.com')]),
+                                 json.dumps({'price': 'price_1', 'quantity': 1}).encode())
+    assert status == 200
+    assert json.loads(body) == {'url': 'https://checkout.example.com/1'}
+    # flask's hooks ran: the request was counted and flask-cors answered
+    assert registry.counters[key] == before + 1
+    assert headers[b'access-control-allow-origin'] == b'https://school.example.com'
+
+    # the stream never touches the WSGI bridge
+    status, _, _ = call(adapter, scope('GET', '/lessons/stream'))
+    assert status == 401
+    assert bridged == ['/create-checkout-session']
+
+
+def test_stream_cors_headers_match_flask_cors(tmp_path):
+    config = type('CorsConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'CORS_ORIGINS': ['https://school.example.com'],
+        'CORS_SUPPORTS_CREDENTIALS': True,
+    })
+    app = init_migrate(create_app(config))
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+    adapter = ASGIAdapter(app)
+    client = app.test_client()
+
+    for origin in ('https://school.example.com', 'https://elsewhere.example.com'):
+        flask_headers = {k.lower(): v for k, v in client.get('/teachers', headers={'Origin': origin}).headers.items()
+                         if k.lower().startswith('access-control-')}
+        status, headers, _ = call(adapter, scope('GET', '/lessons/stream', headers=[('origin', origin)]))
+        assert status == 401
+        assert {k.decode(): v.decode() for k, v in headers.items()
+                if k.startswith(b'access-control-')} == flask_headers
+    assert flask_headers == {}
+
+
+def test_stream_passes_events_through(app, monkeypatch):
+    monkeypatch.setattr(availability, '_notifier', None)
+    teacher = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    start = datetime.now() + timedelta(days=2)
+    lesson = Lesson(title='Oolong', description='Tasting', level=1, start=start,
+                    end=start + timedelta(hours=1), capacity=3, price=30, teacher=teacher)
+    db.session.add(lesson)
+    db.session.commit()
+    adapter = ASGIAdapter(app)
+    update = {'lesson_id': lesson.id, 'seats_left': 0, 'is_full': True, 'waitlist': 2}
+    inbox = asyncio.Queue()
+    chunks = []
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            chunks.append(message)
+            return
+        chunks.append(message['body'].decode())
+        if len(chunks) == 2:
+            availability.hub.publish([update])
+        elif len(chunks) == 3:
+            inbox.put_nowait({'type': 'http.disconnect'})
+
+    async def run():
+        await adapter(scope('GET', '/lessons/stream', query=f'ids={lesson.id}'.encode(),
+                            headers=[('cookie', cookie(app, 1, 'student'))]), inbox.get, send)
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+
+    start, initial, event = chunks[:3]
+    assert start['status'] == 200
+    assert (b'content-type', b'text/event-stream; charset=utf-8') in start['headers']
+    assert json.loads(initial.removeprefix('data: '))['lesson_id'] == lesson.id
+    assert event == f'data: {json.dumps(update)}\n\n'
+    assert len(availability.hub) == 0
@@ -0,0 +1,41 @@
+import sqlite3
+
+import cache
+import events
+from cache import TaggedCache
+from config import db
+from dashboard import dashboards, teacher_dashboard
+from models import Teacher
+
+
+def test_tagged_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    entries = TaggedCache(ttl=10)
+    entries.set('key', 'value', tags=[('teacher', 1)])
+    now[0] += 9
+    assert entries.get('key') == 'value'
+    now[0] += 2
+    assert entries.get('key') is None
+
+
+def test_changes_from_other_processes_invalidate(app, monkeypatch):
+    monkeypatch.setattr(events, '_cursor', None)
+    monkeypatch.setattr(events, 'POLL_INTERVAL', 0)
+    teacher = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    db.session.add(teacher)
+    db.session.commit()
+
+    events.poll_changes()
+    teacher_dashboard(teacher.id)
+    assert dashboards.get((teacher.id, 'month')) is not None
+
+    # another worker's commit, as it lands in the change log
+    other = sqlite3.connect(db.engine.url.database)
+    other.execute("INSERT INTO syncchanges (entity, entity_id, deleted, teacher_id) VALUES ('lesson', 7, 0, ?)",
+                  (teacher.id,))
+    other.commit()
+    other.close()
+
+    events.poll_changes()
+    assert dashboards.get((teacher.id, 'month')) is None
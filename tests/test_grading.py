@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from config import db
+from models import Teacher, Student, Lesson, Enrollment, LessonCreditHistory
+
+
+@pytest.fixture
+def lesson(app):
+    teacher = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    start = datetime.now() + timedelta(days=2)
+    lesson = Lesson(title='Oolong', description='Tasting', level=1, start=start,
+                    end=start + timedelta(hours=1), capacity=1, price=30, teacher=teacher)
+    for name, credit, status in (('mei', 0, 'registered'), ('wen', 50, 'waitlisted'), ('jun', 10, 'waitlisted')):
+        student = Student(username=name, email=f'{name}@example.com', first_name=name, last_name=name,
+                          lesson_credit=Decimal(credit))
+        db.session.add(Enrollment(student=student, lesson=lesson, status=status, cost=Decimal(30)))
+    lesson.is_full = True
+    db.session.add(lesson)
+    db.session.commit()
+    return lesson
+
+
+def grade(app, lesson, items):
+    cookie = app.session_interface.get_signing_serializer(app).dumps({'user_id': lesson.teacher_id, 'role': 'teacher'})
+    return app.test_client(use_cookies=False).patch(
+        f'/lessons/{lesson.id}/enrollments', json={'enrollments': items}, headers={'Cookie': f'session={cookie}'})
+
+
+def enrollment(name):
+    db.session.expire_all()
+    return Enrollment.query.join(Student).filter(Student.username == name).one()
+
+
+def test_refunds_free_seats_before_promotions(app, lesson):
+    mei, wen = enrollment('mei'), enrollment('wen')
+
+    # the promotion is listed first but still gets the seat the refund frees
+    response = grade(app, lesson, [{'id': wen.id, 'status': 'registered'}, {'id': mei.id, 'status': 'waitlisted'}])
+
+    assert response.status_code == 200
+    assert [(result['id'], result['status'], result['body']['status']) for result in response.get_json()['results']] \
+        == [(wen.id, 200, 'registered'), (mei.id, 200, 'waitlisted')]
+    assert enrollment('mei').student.lesson_credit == 30
+    assert enrollment('wen').student.lesson_credit == 20
+    assert LessonCreditHistory.query.count() == 2
+
+
+def test_one_failing_item_rolls_back_the_whole_request(app, lesson):
+    mei, jun = enrollment('mei'), enrollment('jun')
+
+    response = grade(app, lesson, [{'id': mei.id, 'status': 'waitlisted', 'comment': 'Next time'},
+                                   {'id': jun.id, 'status': 'registered'}])
+
+    assert response.status_code == 400
+    assert [(result['id'], result['status'], result['body']) for result in response.get_json()['results']] == [
+        (mei.id, 424, {'error': 'Not applied because another item failed'}),
+        (jun.id, 400, {'error': 'Insufficient credit'}),
+    ]
+    mei = enrollment('mei')
+    assert (mei.status, mei.comment, mei.student.lesson_credit) == ('registered', 'No feedback provided yet!', 0)
+    assert enrollment('jun').status == 'waitlisted'
+    assert LessonCreditHistory.query.count() == 0
+
+
+@pytest.mark.parametrize('bad, error', [
+    ('same', (400, 'Enrollment listed more than once')),
+    (9999, (404, 'Enrollment not found')),
+    ([1], (400, 'Enrollment id must be an integer')),
+    ({'id': 1}, (400, 'Enrollment id must be an integer')),
+    (True, (400, 'Enrollment id must be an integer')),
+])
+def test_invalid_ids_are_reported_per_item(app, lesson, bad, error):
+    mei = enrollment('mei')
+    bad = mei.id if bad == 'same' else bad
+
+    response = grade(app, lesson, [{'id': mei.id, 'comment': 'Lovely'}, {'id': bad, 'comment': 'Again'}])
+
+    assert response.status_code == 400
+    first, second = response.get_json()['results']
+    assert first['status'] == 424
+    assert (second['status'], second['body']['error']) == error
+    assert enrollment('mei').comment == 'No feedback provided yet!'
@@ -0,0 +1,51 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module: (budget in ms, modules it must not import)
+BUDGETS = {
+    'models': (800, ['flask_restful', 'flask_migrate', 'alembic', 'stripe', 'requests', 'faker', 'assets']),
+    'app': (1500, ['stripe', 'requests', 'faker', 'alembic', 'assets']),
+    'wsgi': (1500, ['stripe', 'requests', 'faker', 'alembic', 'assets']),
+}
+
+LINE = re.compile(r'import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)')
+
+# timings depend on the machine, so the budgets only run when asked for,
+# e.g. IMPORTTIME_BUDGET=1.5 to allow 50% over on a slow runner
+BUDGET_SCALE = float(os.getenv('IMPORTTIME_BUDGET', 0))
+
+
+def import_time(module):
+    # a fresh interpreter, so nothing the test run already imported counts
+    env = dict(os.environ, SECRET_KEY=os.getenv('SECRET_KEY', 'importtime'))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    cumulative, imported = None, set()
+    for match in LINE.finditer(result.stderr):
+        microseconds, indent, name = match.groups()
+        imported.add(name.split('.')[0])
+        if not indent and name == module:
+            cumulative = int(microseconds) / 1000
+    return cumulative, imported
+
+
+@pytest.mark.parametrize('module', list(BUDGETS))
+def test_entry_point_does_not_import_lazy_dependencies(module):
+    _, imported = import_time(module)
+    assert sorted(name for name in BUDGETS[module][1] if name in imported) == []
+
+
+@pytest.mark.skipif(not BUDGET_SCALE, reason='set IMPORTTIME_BUDGET to check import-time budgets')
+@pytest.mark.parametrize('module', list(BUDGETS))
+def test_entry_point_imports_within_budget(module):
+    median = statistics.median(import_time(module)[0] for _ in range(5))
+    assert median <= BUDGETS[module][0] * BUDGET_SCALE
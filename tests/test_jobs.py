@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+import jobs
+from config import db
+from models import JobState, SchedulerLock, Teacher, Lesson
+from sync import changes_since
+
+
+def test_job_does_not_commit_after_losing_the_lease(app, monkeypatch):
+    def slow_job(now):
+        db.session.add(Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu'))
+        # meanwhile the lease ran out and another scheduler took it
+        db.session.execute(update(SchedulerLock).values(holder='other', expires_at=datetime.now() + timedelta(minutes=1)))
+        return 'done'
+
+    monkeypatch.setattr(jobs, 'jobs', {'slow': jobs.Job('slow', timedelta(minutes=5), slow_job)})
+    results = jobs.run_pending('me')
+
+    assert results == [('slow', False, 'scheduler lease lost')]
+    assert Teacher.query.count() == 0
+    assert db.session.get(JobState, 'slow') is None
+
+
+def test_lease_is_renewed_between_jobs(app, monkeypatch):
+    seen = []
+
+    def job(now):
+        seen.append(db.session.get(SchedulerLock, 'scheduler').expires_at)
+        return 'ok'
+
+    monkeypatch.setattr(jobs, 'jobs', {
+        'first': jobs.Job('first', timedelta(minutes=5), job),
+        'second': jobs.Job('second', timedelta(minutes=5), job),
+    })
+    assert [ok for _, ok, _ in jobs.run_pending('me', now=datetime.now() - timedelta(minutes=10))] == [True, True]
+    assert all(expires_at > datetime.now() for expires_at in seen)
+
+
+def test_completed_lessons_are_synced(app):
+    now = datetime(2026, 1, 1, 12)
+    teacher = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    lesson = Lesson(title='Oolong', description='Tasting', level=1, start=now - timedelta(hours=2),
+                    end=now - timedelta(hours=1), capacity=3, price=30, teacher=teacher)
+    db.session.add(lesson)
+    db.session.commit()
+    cursor = changes_since(teacher.id, 'teacher', 0, 500)['cursor']
+
+    assert jobs.complete_lessons(now) == '1 lessons completed'
+    db.session.commit()
+    synced = changes_since(teacher.id, 'teacher', cursor, 500)['changes']['lessons']
+    assert [(row['id'], row['completed_at']) for row in synced] == [(lesson.id, str(now))]
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import db
+from models import Teacher, Student, Lesson, Enrollment
+from nplusone import NPlusOneError
+
+
+def test_lazy_loads_per_row_fail_the_request(app):
+    teacher = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    student = Student(username='mei', email='mei@example.com', first_name='Mei', last_name='Mei')
+    start = datetime.now() + timedelta(days=2)
+    for day in range(6):
+        lesson = Lesson(title=f'Oolong {day}', description='Tasting', level=1, start=start + timedelta(days=day),
+                        end=start + timedelta(days=day, hours=1), capacity=3, price=30, teacher=teacher)
+        db.session.add(Enrollment(student=student, lesson=lesson))
+    db.session.commit()
+    cookie = app.session_interface.get_signing_serializer(app).dumps({'user_id': student.id, 'role': 'student'})
+
+    with pytest.raises(NPlusOneError) as raised:
+        app.test_client(use_cookies=False).get('/check_session', headers={'Cookie': f'session={cookie}'})
+
+    message = str(raised.value)
+    assert message.startswith('repeated queries in GET check_session:')
+    assert '6 x SELECT ... FROM lessons WHERE lessons.id = ?\n    via Enrollment.lesson' in message
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import recommendations
+from config import db
+from models import Teacher, Student, Lesson, Enrollment, LessonRecommendation, RecommendationRefresh
+
+
+def test_requeue_during_refresh_is_kept(app, monkeypatch):
+    teacher = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    student = Student(username='mei', email='mei@example.com', first_name='Mei', last_name='Mei')
+    start = datetime.now() + timedelta(days=3)
+    lesson = Lesson(title='Oolong', description='Tasting', level=1, start=start,
+                    end=start + timedelta(hours=1), capacity=3, price=30, teacher=teacher)
+    db.session.add_all([lesson, student])
+    db.session.commit()
+    refresh_lessons = recommendations.refresh_lessons
+
+    def enroll_meanwhile(lesson_ids, now=None):
+        refresh_lessons(lesson_ids, now)
+        # a write that lands while the refresh runs queues the lesson again
+        db.session.add(Enrollment(lesson=lesson, student=student, cost=30, status='registered'))
+        db.session.flush()
+
+    monkeypatch.setattr(recommendations, 'refresh_lessons', enroll_meanwhile)
+    recommendations.process_queue()
+    db.session.commit()
+
+    queued = {(row.kind, row.ref_id) for row in RecommendationRefresh.query}
+    assert queued == {('lesson', lesson.id), ('student', student.id)}
+
+
+def stored():
+    return {(row.student_id, row.lesson_id): round(row.score, 4) for row in LessonRecommendation.query}
+
+
+def test_queued_refresh_matches_a_full_refresh(app, monkeypatch):
+    monkeypatch.setattr(recommendations, 'TOP_K', 3)
+    lu = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    wen = Teacher(username='wen', email='wen@example.com', first_name='Wen', last_name='Wen')
+    students = [Student(username=name, email=f'{name}@example.com', first_name=name, last_name=name)
+                for name in ('mei', 'jun', 'hua', 'ping')]
+    start = datetime.now() + timedelta(days=3)
+    titles = ['Oolong roasting', 'Matcha whisking', 'Sencha steaming', 'Puer storage', 'Oolong brewing',
+              'Matcha sweets', 'Gongfu brewing', 'Black tea blending']
+    lessons = [Lesson(title=title, description='Tasting', level=1 + i % 5, start=start + timedelta(days=i),
+                      end=start + timedelta(days=i, hours=1), capacity=3, price=30, teacher=(lu, wen)[i % 2])
+               for i, title in enumerate(titles)]
+    db.session.add_all(lessons + students)
+    for student, lesson in zip(students, lessons):
+        db.session.add(Enrollment(student=student, lesson=lesson, cost=30, status='registered'))
+    db.session.commit()
+    recommendations.refresh_all()
+    assert RecommendationRefresh.query.count() == 0
+
+    # a lesson fills up, one is added, a student enrolls
+    top = max(stored().items(), key=lambda item: item[1])[0][1]
+    db.session.get(Lesson, top).is_full = True
+    db.session.add(Lesson(title='Herbal infusions', description='Tisanes', level=5, start=start + timedelta(days=30),
+                          end=start + timedelta(days=30, hours=1), capacity=3, price=30, teacher=wen))
+    db.session.add(Enrollment(student=students[1], lesson=lessons[5], cost=30, status='registered'))
+    db.session.commit()
+
+    assert recommendations.process_queue()[0] == 1
+    db.session.commit()
+    queued = stored()
+    assert all(lesson_id != top for _, lesson_id in queued)
+
+    recommendations.refresh_all()
+    assert queued == stored()
@@ -0,0 +1,91 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import rollups
+from config import db
+from models import (Teacher, Student, Lesson, Enrollment, Payment, DailyTeacherRollup, DailyLevelRollup,
+                    DailyCreditRollup)
+
+DAY = date(2026, 1, 5)
+
+
+def test_revenue_report_only_shows_the_teachers_own_revenue(app):
+    lu = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    wen = Teacher(username='wen', email='wen@example.com', first_name='Wen', last_name='Wen')
+    db.session.add_all([lu, wen])
+    db.session.flush()
+    db.session.add_all([
+        DailyTeacherRollup(day=DAY, teacher_id=lu.id, registered=2, waitlisted=0, revenue=Decimal(60)),
+        DailyTeacherRollup(day=DAY, teacher_id=wen.id, registered=5, waitlisted=1, revenue=Decimal(200)),
+        DailyLevelRollup(day=DAY, level=1, registered=7, waitlisted=1, revenue=Decimal(260)),
+    ])
+    db.session.commit()
+    cookie = app.session_interface.get_signing_serializer(app).dumps({'user_id': lu.id, 'role': 'teacher'})
+
+    response = app.test_client(use_cookies=False).get(
+        '/reports/revenue?start=2026-01-01&end=2026-01-31', headers={'Cookie': f'session={cookie}'})
+
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['by_teacher'] == [{'teacher_id': lu.id, 'registered': 2, 'waitlisted': 0, 'revenue': '60.00'}]
+    assert report['by_day'] == [{'day': '2026-01-05', 'registered': 2, 'waitlisted': 0, 'revenue': '60.00'}]
+    assert 'by_level' not in report
+
+
+def rollup_rows():
+    rows = {}
+    for model, key in ((DailyTeacherRollup, 'teacher_id'), (DailyLevelRollup, 'level')):
+        for row in model.query:
+            if row.registered or row.waitlisted or row.revenue:
+                rows[model.__tablename__, row.day, getattr(row, key)] = (
+                    row.registered, row.waitlisted, Decimal(row.revenue).quantize(Decimal('0.01')))
+    for row in DailyCreditRollup.query:
+        rows['credit', row.day] = (row.purchases, Decimal(row.purchased).quantize(Decimal('0.01')))
+    return rows
+
+
+def test_incremental_rollups_match_a_rebuild(app):
+    lu = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    wen = Teacher(username='wen', email='wen@example.com', first_name='Wen', last_name='Wen')
+    students = [Student(username=name, email=f'{name}@example.com', first_name=name, last_name=name)
+                for name in ('mei', 'jun', 'hua')]
+    start = datetime.now() + timedelta(days=3)
+    lessons = [Lesson(title=f'Oolong {i}', description='Tasting', level=1 + i, start=start + timedelta(days=i),
+                      end=start + timedelta(days=i, hours=1), capacity=3, price=30 + i, teacher=(lu, wen)[i % 2])
+               for i in range(3)]
+    db.session.add_all(lessons + students)
+    db.session.commit()
+
+    # enroll
+    for student in students:
+        for lesson in lessons:
+            status = 'waitlisted' if student is students[2] else 'registered'
+            db.session.add(Enrollment(student=student, lesson=lesson, cost=lesson.price, status=status))
+    db.session.add(Payment(student=students[0], lesson_credit=Decimal('120.50')))
+    db.session.commit()
+    enrollments = {(e.student.username, e.lesson_id): e for e in Enrollment.query}
+
+    # grade: promote, demote, change the cost
+    enrollments['hua', lessons[0].id].status = 'registered'
+    enrollments['mei', lessons[1].id].status = 'waitlisted'
+    enrollments['jun', lessons[2].id].cost = Decimal('12.25')
+    db.session.commit()
+    # drop
+    db.session.delete(enrollments['jun', lessons[0].id])
+    db.session.commit()
+    # the lesson changes price (no effect), level and teacher
+    lessons[1].price = 45
+    lessons[1].level = 5
+    lessons[1].teacher = lu
+    db.session.commit()
+    # delete a lesson with its enrollments
+    db.session.delete(lessons[2])
+    db.session.add(Payment(student=students[1], lesson_credit=Decimal(60)))
+    db.session.commit()
+
+    incremental = rollup_rows()
+    assert incremental
+    today = datetime.now(timezone.utc).date()
+    rollups.rebuild(today - timedelta(days=1), today + timedelta(days=1))
+    db.session.commit()
+    assert rollup_rows() == incremental
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import db
+from models import Teacher, Lesson
+from search import search_lessons
+
+
+def add_lesson(teacher, title, description, day=0):
+    start = datetime.now() + timedelta(days=2 + day)
+    lesson = Lesson(title=title, description=description, level=1, start=start,
+                    end=start + timedelta(hours=1), capacity=3, price=30, teacher=teacher)
+    db.session.add(lesson)
+    return lesson
+
+
+@pytest.fixture
+def teachers(app):
+    return [Teacher(username=name, email=f'{name}@example.com', first_name=name.title(), last_name='Lin')
+            for name in ('lu', 'wen', 'jun', 'mei', 'hua', 'ping')]
+
+
+def titles(q, per_page=20):
+    return [lesson.title for lesson in search_lessons(q, 1, per_page)[0]]
+
+
+def test_search_ranks_title_matches_first_and_filters_by_prefix(app, teachers):
+    add_lesson(teachers[0], 'Oolong tasting', 'Rolled leaves and a little matcha to finish', 0)
+    add_lesson(teachers[1], 'Matcha whisking', 'Bamboo whisks and chashaku', 1)
+    add_lesson(teachers[2], 'Puer storage', 'Cakes, bricks and humidity', 2)
+    db.session.commit()
+
+    assert titles('matcha') == ['Matcha whisking', 'Oolong tasting']
+    assert titles('chash') == ['Matcha whisking']
+    assert titles('whisk bamboo') == ['Matcha whisking']
+    # FTS5 syntax in the query is matched as plain words, all of them required
+    assert titles('"matcha" OR puer') == []
+    assert search_lessons('matcha', 2, 1)[0][0].title == 'Oolong tasting'
+    assert search_lessons('matcha', 2, 1)[1] == 2
+    assert search_lessons('!!!', 1, 20) == ([], 0)
+
+
+def test_search_index_follows_lesson_writes(app, teachers):
+    lesson = add_lesson(teachers[0], 'Oolong tasting', 'Rolled leaves')
+    db.session.commit()
+    assert titles('oolong') == ['Oolong tasting']
+
+    lesson.title = 'Sencha steaming'
+    db.session.commit()
+    assert titles('oolong') == []
+    assert titles('sencha') == ['Sencha steaming']
+
+    lesson.description = 'Deep steamed leaves'
+    db.session.commit()
+    assert titles('rolled') == []
+    assert titles('deep') == ['Sencha steaming']
+
+    db.session.delete(lesson)
+    db.session.commit()
+    assert titles('sencha') == []
+    assert db.session.execute(db.text("SELECT count(*) FROM lessons_fts WHERE lessons_fts MATCH 'steamed'")).scalar() == 0
+
+
+def test_search_loads_teachers_with_the_page(app, teachers):
+    for day, teacher in enumerate(teachers):
+        add_lesson(teacher, f'Matcha {day}', 'Whisking', day)
+    db.session.commit()
+    cookie = app.session_interface.get_signing_serializer(app).dumps({'user_id': 1, 'role': 'student'})
+
+    # N+1 detection is on in tests, so a lazy load per hit would raise here
+    response = app.test_client(use_cookies=False).get('/lessons/search?q=matcha',
+                                                      headers={'Cookie': f'session={cookie}'})
+
+    assert response.status_code == 200
+    assert sorted(result['teacher']['first_name'] for result in response.get_json()['results']) \
+        == sorted(teacher.first_name for teacher in teachers)
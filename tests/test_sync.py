@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from config import db
+from models import Teacher, Student, Lesson, Enrollment, LessonCreditHistory, Feedback
+
+
+@pytest.fixture
+def student(app):
+    teacher = Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu')
+    student = Student(username='mei', email='mei@example.com', first_name='Mei', last_name='Mei')
+    start = datetime.now() + timedelta(days=2)
+    for day in range(4):
+        lesson = Lesson(title=f'Oolong {day}', description='Tasting', level=1, start=start + timedelta(days=day),
+                        end=start + timedelta(days=day, hours=1), capacity=3, price=30, teacher=teacher)
+        db.session.add(Enrollment(student=student, lesson=lesson, cost=30))
+        db.session.add(Feedback(student=student, lesson=lesson, message='Lovely'))
+    db.session.add(LessonCreditHistory(student=student, old_credit=Decimal(0), new_credit=Decimal(60), memo='Top-up'))
+    db.session.commit()
+    return student
+
+
+def sync(app, student, since=None, limit=None):
+    cookie = app.session_interface.get_signing_serializer(app).dumps({'user_id': student.id, 'role': 'student'})
+    query = {key: value for key, value in (('since', since), ('limit', limit)) if value is not None}
+    response = app.test_client(use_cookies=False).get('/sync', query_string=query,
+                                                      headers={'Cookie': f'session={cookie}'})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def ids(page):
+    return {(name, row['id']) for name, rows in page['changes'].items() for row in rows}
+
+
+def test_first_sync_pages_by_limit_and_continues_with_deltas(app, student):
+    everything = sync(app, student)
+    assert not everything['has_more']
+    assert len(ids(everything)) == 13
+
+    pages, cursor = [], 0
+    while True:
+        page = sync(app, student, since=cursor, limit=3)
+        assert sum(len(rows) for rows in page['changes'].values()) <= 3
+        pages.append(page)
+        if len(pages) == 2:
+            # a write between pages is picked up by the deltas after the last one
+            db.session.get(Lesson, 1).description = 'Roasted'
+            db.session.commit()
+        cursor = page['cursor']
+        if not page['has_more']:
+            break
+
+    assert len(pages) == 5
+    seen = [pair for page in pages for pair in ids(page)]
+    assert len(seen) == len(set(seen)) and set(seen) == ids(everything)
+    assert isinstance(cursor, int) and cursor == everything['cursor']
+
+    delta = sync(app, student, since=cursor)
+    assert [(row['id'], row['description']) for row in delta['changes']['lessons']] == [(1, 'Roasted')]
+    assert sync(app, student, since=delta['cursor'])['changes']['lessons'] == []
+
+
+def test_delete_leaves_a_tombstone(app, student):
+    cursor = sync(app, student)['cursor']
+    enrollment = Enrollment.query.filter_by(lesson_id=2).one()
+    db.session.delete(enrollment)
+    db.session.commit()
+
+    delta = sync(app, student, since=cursor)
+    assert delta['deleted']['enrollments'] == [enrollment.id]
+    assert delta['changes']['enrollments'] == []
+    # the lesson embeds its enrollments, so it is sent again too
+    assert [row['id'] for row in delta['changes']['lessons']] == [2]
+
+
+def test_deltas_page_by_limit(app, student):
+    cursor = sync(app, student)['cursor']
+    for lesson in Lesson.query:
+        lesson.description = 'Roasted'
+    db.session.commit()
+
+    first = sync(app, student, since=cursor, limit=3)
+    second = sync(app, student, since=first['cursor'], limit=3)
+
+    assert first['has_more'] and not second['has_more']
+    assert len(first['changes']['lessons']) == 3 and len(second['changes']['lessons']) == 1
+    assert ids(first).isdisjoint(ids(second))
+
+
+def test_malformed_cursor_is_rejected(app, student):
+    cookie = app.session_interface.get_signing_serializer(app).dumps({'user_id': student.id, 'role': 'student'})
+    for since in ('abc', '1:lessons:2', '1:lesson', '-1'):
+        response = app.test_client(use_cookies=False).get(f'/sync?since={since}',
+                                                          headers={'Cookie': f'session={cookie}'})
+        assert response.status_code == 400
@@ -0,0 +1,120 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import uow
+from config import db
+from metrics import registry
+from models import Student, Teacher
+from uow import unit_of_work
+
+SIGNUP = {'username': 'mei', 'email': 'mei@example.com', 'first_name': 'Mei', 'last_name': 'Mei',
+          'password': 'secret', 'role': 'student'}
+
+
+def test_failed_commit_does_not_log_the_user_in(app, monkeypatch):
+    def commit():
+        raise OperationalError('COMMIT', {}, sqlite3.OperationalError('disk I/O error'))
+
+    monkeypatch.setattr(db.session, 'commit', commit)
+    # answer with a 500, as production does, instead of raising into the test
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    client = app.test_client()
+    assert client.post('/signup', json=SIGNUP).status_code == 500
+    monkeypatch.undo()
+
+    assert Student.query.count() == 0
+    assert client.get_cookie('session') is None
+
+
+def test_signup_logs_the_user_in_after_commit(app):
+    client = app.test_client()
+    assert client.post('/signup', json=SIGNUP).status_code == 201
+    with client.session_transaction() as session:
+        assert session['user_id'] == Student.query.one().id
+
+
+def locked():
+    return OperationalError('INSERT', {}, sqlite3.OperationalError('database is locked'))
+
+
+def run_handler(app, handler):
+    # runs the handler as a request would and reports what was committed
+    with app.test_request_context():
+        try:
+            result = unit_of_work(handler)()
+        finally:
+            db.session.remove()
+    return result, [teacher.username for teacher in Teacher.query]
+
+
+def add_teacher(status=201):
+    db.session.add(Teacher(username='lu', email='lu@example.com', first_name='Lu', last_name='Lu'))
+    db.session.flush()
+    return {'id': 1}, status
+
+
+def test_success_commits(app):
+    assert run_handler(app, add_teacher) == (({'id': 1}, 201), ['lu'])
+
+
+@pytest.mark.parametrize('status', [400, 404, 409, 500])
+def test_error_response_rolls_back(app, status):
+    assert run_handler(app, lambda: add_teacher(status)) == (({'id': 1}, status), [])
+
+
+def test_exception_rolls_back(app):
+    def fail():
+        add_teacher()
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        run_handler(app, fail)
+    assert Teacher.query.count() == 0
+
+
+def test_locked_database_is_retried(app, monkeypatch):
+    sleeps, attempts = [], []
+    monkeypatch.setattr(uow.time, 'sleep', sleeps.append)
+
+    def busy_twice():
+        attempts.append(add_teacher())
+        if len(attempts) < 3:
+            raise locked()
+        return attempts[-1]
+
+    key = ('db_lock_retries_total', (('endpoint', busy_twice.__qualname__),))
+    before = registry.counters.get(key, 0)
+    assert run_handler(app, busy_twice) == (({'id': 1}, 201), ['lu'])
+    assert len(attempts) == 3 and len(sleeps) == 2
+    assert registry.counters[key] == before + 2
+
+
+def test_gives_up_with_503_after_max_attempts(app, monkeypatch):
+    monkeypatch.setattr(uow, 'MAX_ATTEMPTS', 3)
+    monkeypatch.setattr(uow.time, 'sleep', lambda seconds: None)
+    attempts = []
+
+    def always_busy():
+        attempts.append(add_teacher())
+        raise locked()
+
+    key = ('db_lock_failures_total', (('endpoint', always_busy.__qualname__),))
+    before = registry.counters.get(key, 0)
+    result, committed = run_handler(app, always_busy)
+    assert result == ({'error': 'The database is busy, please try again'}, 503, {'Retry-After': '1'})
+    assert committed == [] and len(attempts) == 3
+    assert registry.counters[key] == before + 1
+
+
+def test_other_database_errors_are_not_retried(app):
+    attempts = []
+
+    def broken():
+        attempts.append(add_teacher())
+        raise OperationalError('INSERT', {}, sqlite3.OperationalError('disk I/O error'))
+
+    with pytest.raises(OperationalError):
+        run_handler(app, broken)
+    assert len(attempts) == 1 and Teacher.query.count() == 0
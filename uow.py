@@ -0,0 +1,70 @@
+from functools import wraps
+import os
+import random
+import time
+
+from flask import Response, request, session
+from sqlalchemy.exc import OperationalError
+
+from config import db
+from metrics import registry
+
+MAX_ATTEMPTS = int(os.getenv('UOW_MAX_ATTEMPTS', 4))
+BACKOFF = float(os.getenv('UOW_BACKOFF', 0.05))
+MAX_BACKOFF = 1.0
+LOCKED = ('database is locked', 'database table is locked')
+
+
+def _locked(error):
+    return any(message in str(error.orig) for message in LOCKED)
+
+
+def _status(result):
+    if isinstance(result, Response):
+        return result.status_code
+    if isinstance(result, tuple) and len(result) > 1 and isinstance(result[1], int):
+        return result[1]
+    return 200
+
+
+def unit_of_work(method):
+    # Runs a handler as one transaction: the handler flushes, and its writes
+    # are committed only if it returns a success status. Anything else, an
+    # error response or an exception, is rolled back so the session is clean
+    # for whatever runs next. When SQLite reports the database as locked the
+    # whole handler runs again from a clean session, after a jittered
+    # exponential backoff, up to MAX_ATTEMPTS times. Changes the handler made
+    # to the login session are undone with the transaction, so a cookie never
+    # refers to a row that was not committed.
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        saved = dict(session)
+
+        def rollback():
+            db.session.rollback()
+            if dict(session) != saved:
+                session.clear()
+                session.update(saved)
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                result = method(*args, **kwargs)
+                if _status(result) < 400:
+                    db.session.commit()
+                else:
+                    rollback()
+                return result
+            except OperationalError as e:
+                rollback()
+                if not _locked(e):
+                    raise
+                endpoint = request.endpoint or method.__qualname__
+                if attempt == MAX_ATTEMPTS:
+                    registry.inc('db_lock_failures_total', endpoint=endpoint)
+                    return {'error': 'The database is busy, please try again'}, 503, {'Retry-After': '1'}
+                registry.inc('db_lock_retries_total', endpoint=endpoint)
+                time.sleep(random.uniform(0, min(MAX_BACKOFF, BACKOFF * 2 ** (attempt - 1))))
+            except Exception:
+                rollback()
+                raise
+    return wrapper